@@ -0,0 +1,121 @@
+"""
+库存预警
+- 每个 (用户, 商品, 预警类型) 只有一条预警记录，按商品ID去重，不再按通知标题模糊匹配
+- 状态流转：raised(已触发) -> acknowledged(已确认，通知已读) -> cleared(库存恢复后解除)，
+  解除后再次低于最低库存时重新触发并创建新通知；已触发或已确认期间不重复通知
+- evaluate 对一批商品统一评估：一次查询读取已有预警，新增预警和通知批量写入，新通知在提交后推送
+以上函数只修改会话，由调用方提交事务
+"""
+from datetime import datetime
+
+from sqlalchemy import insert, update
+
+from db import StockAlert, SystemNotification
+import events
+
+LOW_STOCK = 'low_stock'
+
+RAISED = 'raised'
+ACKNOWLEDGED = 'acknowledged'
+CLEARED = 'cleared'
+
+def is_low_stock(product) -> bool:
+    """库存是否低于（含等于）最低库存"""
+    return (product.stock or 0) <= (product.min_stock or 0)
+
+def _notification(user_id: int, product) -> dict:
+    """库存预警通知内容"""
+    return {
+        'user_id': user_id,
+        'type': 'warning',
+        'title': f'商品 {product.name} 库存预警',
+        'content': f'商品 {product.name} 当前库存为 {product.stock}，已低于最低库存 {product.min_stock}，请及时补货！'
+    }
+
+def evaluate(db, user_id: int, products):
+    """
+    评估一批商品的库存预警
+    返回本次新建的通知字段列表（含 id），无新预警时为空
+    """
+    products = {p.id: p for p in products}
+    if not products:
+        return []
+    existing = {
+        alert.product_id: alert for alert in db.query(StockAlert).filter(
+            StockAlert.user_id == user_id,
+            StockAlert.alert_type == LOW_STOCK,
+            StockAlert.product_id.in_(products.keys())
+        )
+    }
+    now = datetime.utcnow()
+    to_raise = []
+    for product in products.values():
+        alert = existing.get(product.id)
+        if is_low_stock(product):
+            if alert is None or alert.state == CLEARED:
+                to_raise.append(product)
+            else:
+                alert.stock = product.stock
+                alert.min_stock = product.min_stock
+        elif alert is not None and alert.state != CLEARED:
+            alert.state = CLEARED
+            alert.stock = product.stock
+            alert.min_stock = product.min_stock
+            alert.cleared_at = now
+    if not to_raise:
+        return []
+
+    notifications = [dict(_notification(user_id, p), created_at=now) for p in to_raise]
+    notification_ids = db.execute(
+        insert(SystemNotification).returning(SystemNotification.id, sort_by_parameter_order=True),
+        notifications
+    ).scalars().all()
+    new_alerts = []
+    for product, notification, notification_id in zip(to_raise, notifications, notification_ids):
+        notification['id'] = notification_id
+        values = {
+            'state': RAISED,
+            'stock': product.stock,
+            'min_stock': product.min_stock,
+            'notification_id': notification_id,
+            'raised_at': now,
+            'acknowledged_at': None,
+            'cleared_at': None
+        }
+        alert = existing.get(product.id)
+        if alert is not None:
+            for key, value in values.items():
+                setattr(alert, key, value)
+        else:
+            new_alerts.append({'user_id': user_id, 'product_id': product.id, 'alert_type': LOW_STOCK, **values})
+    if new_alerts:
+        db.execute(insert(StockAlert), new_alerts)
+    events.emit(db, user_id, 'notification', [{
+        'id': n['id'],
+        'type': n['type'],
+        'title': n['title'],
+        'content': n['content'],
+        'is_read': False,
+        'created_at': now.isoformat()
+    } for n in notifications])
+    return notifications
+
+def acknowledge(db, user_id: int, notification_ids=None, alert_ids=None):
+    """
+    确认已触发的预警（通知标记已读时调用），两个参数都为空时确认该用户全部已触发预警
+    返回确认的预警数量
+    """
+    conditions = [StockAlert.user_id == user_id, StockAlert.state == RAISED]
+    if notification_ids is not None:
+        conditions.append(StockAlert.notification_id.in_(notification_ids))
+    if alert_ids is not None:
+        conditions.append(StockAlert.id.in_(alert_ids))
+    now = datetime.utcnow()
+    result = db.execute(
+        update(StockAlert).where(*conditions).values(state=ACKNOWLEDGED, acknowledged_at=now, updated_at=now)
+    )
+    return result.rowcount
+
+def remove_product(db, product_id: int):
+    """删除商品时删除其预警记录"""
+    db.query(StockAlert).filter(StockAlert.product_id == product_id).delete(synchronize_session=False)
@@ -0,0 +1,39 @@
+"""
+异步数据库访问（SQLAlchemy asyncio）
+- 与 db.py 中的同步引擎共用同一数据库和模型，按 DATABASE_URL 换成对应的异步驱动：
+  SQLite 使用 aiosqlite，PostgreSQL 使用 asyncpg（需另行安装 asyncpg）
+- 高频只读接口（登录、仪表盘、通知列表）使用异步会话，查询期间不占用线程池线程；
+  其余接口仍为同步 def，由 FastAPI 在线程池中执行
+"""
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
+
+from db import DATABASE_URL, engine_options, set_sqlite_pragmas
+
+# 同步驱动名 -> 异步驱动名
+ASYNC_DRIVERS = {
+    'sqlite': 'sqlite+aiosqlite',
+    'postgresql': 'postgresql+asyncpg',
+}
+
+def to_async_url(url: str):
+    """将同步数据库URL转换为异步驱动URL（已是异步驱动时原样返回）"""
+    url = make_url(url)
+    backend = url.get_backend_name()
+    if backend not in ASYNC_DRIVERS:
+        raise ValueError(f'不支持的异步数据库: {backend}')
+    if url.get_driver_name() in ('aiosqlite', 'asyncpg'):
+        return url
+    return url.set(drivername=ASYNC_DRIVERS[backend])
+
+async_engine = create_async_engine(to_async_url(DATABASE_URL), **engine_options(DATABASE_URL))
+if async_engine.dialect.name == 'sqlite':
+    event.listen(async_engine.sync_engine, 'connect', set_sqlite_pragmas)
+# 提交后不过期对象，避免在协程中访问属性时触发隐式IO
+AsyncSessionLocal = async_sessionmaker(async_engine, class_=AsyncSession, autoflush=False, expire_on_commit=False)
+
+async def get_async_db():
+    """获取异步数据库会话"""
+    async with AsyncSessionLocal() as db:
+        yield db
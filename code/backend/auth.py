@@ -1,17 +1,56 @@
+import os
+import time
 from datetime import datetime, timedelta
 from jose import JWTError, jwt
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
+from sqlalchemy import event, select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
-from db import User, SessionLocal
+from db import User, SessionLocal, get_db
+from async_db import get_async_db
+from cache import TTLCache
+from context import set_user
 
 # 密钥和算法
 SECRET_KEY = "your_secret_key_here"
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 60
 
+# 已认证用户缓存：token -> 轻量用户身份，避免每个请求都查询用户表
+AUTH_CACHE_SIZE = int(os.environ.get('ERP_AUTH_CACHE_SIZE', '10000'))
+AUTH_CACHE_TTL = int(os.environ.get('ERP_AUTH_CACHE_TTL', '300'))
+
+# 实时推送连接凭证（只能用于建立SSE连接）的有效期（秒）
+EVENT_TOKEN_EXPIRE_SECONDS = int(os.environ.get('ERP_EVENT_TOKEN_TTL', '60'))
+EVENT_TOKEN_SCOPE = 'events'
+
+# 管理员用户名（逗号分隔），可访问运维接口；未配置时运维接口不可用
+ADMIN_USERS = {name.strip() for name in os.environ.get('ERP_ADMIN_USERS', '').split(',') if name.strip()}
+
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/api/token")
 
+class AuthUser:
+    """已认证用户的轻量身份（不绑定数据库会话，可安全缓存）"""
+    __slots__ = ('id', 'username', 'email')
+
+    def __init__(self, id: int, username: str, email: str = None):
+        self.id = id
+        self.username = username
+        self.email = email
+
+user_cache = TTLCache(maxsize=AUTH_CACHE_SIZE, ttl=AUTH_CACHE_TTL)
+
+def invalidate_user(user_id: int):
+    """清除指定用户的全部缓存身份（用户信息变更或删除时调用）"""
+    user_cache.delete_where(lambda token, user: user.id == user_id)
+
+@event.listens_for(User, 'after_update')
+@event.listens_for(User, 'after_delete')
+def _on_user_changed(mapper, connection, target):
+    """用户记录变更时自动清除缓存"""
+    invalidate_user(target.id)
+
 def create_access_token(data: dict, expires_delta: timedelta = None):
     to_encode = data.copy()
     if expires_delta:
@@ -22,27 +61,88 @@ def create_access_token(data: dict, expires_delta: timedelta = None):
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
-
-def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
-    credentials_exception = HTTPException(
+def _credentials_exception():
+    return HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="无法验证凭据",
         headers={"WWW-Authenticate": "Bearer"},
     )
+
+def _decode_token(token: str, scope: str = None) -> dict:
+    """解码token，返回payload（须含用户名，且用途与 scope 一致：登录token不带 scope）"""
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        username: str = payload.get("sub")
-        if username is None:
-            raise credentials_exception
     except JWTError:
-        raise credentials_exception
-    user = db.query(User).filter(User.username == username).first()
-    if user is None:
-        raise credentials_exception
-    return user 
\ No newline at end of file
+        raise _credentials_exception()
+    if payload.get("sub") is None or payload.get("scope") != scope:
+        raise _credentials_exception()
+    return payload
+
+def _remember(token: str, payload: dict, row) -> AuthUser:
+    """用户查询结果转换为缓存身份，缓存有效期不超过token剩余有效期"""
+    if row is None:
+        raise _credentials_exception()
+    user = AuthUser(row.id, row.username, row.email)
+    ttl = AUTH_CACHE_TTL
+    exp = payload.get("exp")
+    if exp is not None:
+        ttl = min(ttl, exp - time.time())
+    user_cache.set(token, user, ttl=ttl)
+    set_user(user.id)
+    return user
+
+def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
+    # 命中缓存直接返回，不解码token也不查询数据库
+    cached = user_cache.get(token)
+    if cached is not None:
+        set_user(cached.id)
+        return cached
+    payload = _decode_token(token)
+    row = db.query(User.id, User.username, User.email).filter(User.username == payload["sub"]).first()
+    return _remember(token, payload, row)
+
+async def get_current_user_async(token: str = Depends(oauth2_scheme), db: AsyncSession = Depends(get_async_db)):
+    """get_current_user 的异步版本（异步接口使用，与同步版本共用缓存）"""
+    cached = user_cache.get(token)
+    if cached is not None:
+        set_user(cached.id)
+        return cached
+    payload = _decode_token(token)
+    row = (await db.execute(
+        select(User.id, User.username, User.email).where(User.username == payload["sub"])
+    )).first()
+    return _remember(token, payload, row)
+
+def get_admin_user(current_user: AuthUser = Depends(get_current_user)):
+    """运维接口（如慢查询日志）权限：用户名须在 ERP_ADMIN_USERS 中"""
+    if current_user.username not in ADMIN_USERS:
+        raise HTTPException(status_code=403, detail='需要管理员权限')
+    return current_user
+
+def create_event_token(user: AuthUser, access_token: str) -> str:
+    """
+    签发实时推送连接凭证：有效期 EVENT_TOKEN_EXPIRE_SECONDS，只能用于建立SSE连接，不能访问其他接口
+    EventSource 无法设置请求头，凭证经URL参数传递，会出现在访问日志和代理日志中，因此不使用登录token；
+    连接建立后的有效期仍以登录token为准（session_exp）
+    """
+    return create_access_token({
+        "sub": user.username,
+        "scope": EVENT_TOKEN_SCOPE,
+        "session_exp": jwt.get_unverified_claims(access_token).get("exp"),
+    }, timedelta(seconds=EVENT_TOKEN_EXPIRE_SECONDS))
+
+def authenticate_event_token(token: str):
+    """
+    校验实时推送连接凭证并返回 (用户身份, 登录token过期时间戳)
+    使用独立的短会话，校验完成即关闭；凭证不写入身份缓存，避免被当作登录token使用
+    """
+    payload = _decode_token(token, scope=EVENT_TOKEN_SCOPE)
+    db = SessionLocal()
+    try:
+        row = db.query(User.id, User.username, User.email).filter(User.username == payload["sub"]).first()
+    finally:
+        db.close()
+    if row is None:
+        raise _credentials_exception()
+    set_user(row.id)
+    return AuthUser(row.id, row.username, row.email), payload.get("session_exp")
@@ -0,0 +1,442 @@
+"""
+接口压测
+用 bench.seed 生成指定规模的 SQLite 数据库，通过 httpx 按场景并发请求真实的 FastAPI 应用
+（默认在本进程内经 ASGI 调用，--server uvicorn 时启动本机 uvicorn 进程经 HTTP 调用），
+输出每个场景的 p50/p95/p99 延迟、吞吐量和服务进程峰值内存；
+可保存结果作为基线，之后与基线对比，p95 或吞吐量劣化超过阈值时以退出码1结束，用于发布前检查
+
+场景：login、dashboard（仪表盘4个接口轮询）、product_query（关键词/分类/游标分页查询）、
+order_create（3行订单）、stock_adjust（入库/出库）、export（CSV导出商品）、import（导入1000行Excel）
+
+运行（在 code/backend 目录下，需安装 httpx）：
+    python -m bench.load --preset small                          # 小数据量快速检查
+    python -m bench.load --db /tmp/erp_bench.db                  # 默认规模（10万商品、200万库存流水），库文件已存在时复用
+    python -m bench.load --db /tmp/erp_bench.db --server uvicorn --concurrency 16
+    python -m bench.load --db /tmp/erp_bench.db --save baseline.json
+    python -m bench.load --db /tmp/erp_bench.db --baseline baseline.json --threshold 0.2
+进程内模式的峰值内存包含压测客户端本身；导入场景调用即时导入接口，Excel 解析在服务进程的线程池中执行，
+计入峰值内存（导入场景的峰值内存主要来自解析）
+"""
+import argparse
+import asyncio
+import io
+import json
+import math
+import os
+import platform
+import random
+import resource
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+# 数据规模预设（数量均为全部用户合计）
+PRESETS = {
+    'small': dict(users=4, categories=20, products=5000, stock_logs=50000, orders=10000, notifications=2000),
+    'full': dict(users=10, categories=50, products=100000, stock_logs=2000000, orders=300000, notifications=50000),
+}
+# 场景及其默认请求数（为空时使用 --requests）
+SCENARIOS = {
+    'login': None,
+    'dashboard': None,
+    'product_query': None,
+    'order_create': None,
+    'stock_adjust': None,
+    'export': 5,
+    'import': 3,
+}
+# 压测前将商品库存设为足够大的值，避免下单和出库因库存不足失败
+BENCH_STOCK = 10 ** 8
+IMPORT_ROWS = 1000
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='ERP接口压测')
+    parser.add_argument('--db', help='SQLite 数据库文件，默认在临时目录中新建')
+    parser.add_argument('--reseed', action='store_true', help='数据库文件已存在时删除后重新生成')
+    parser.add_argument('--preset', choices=PRESETS, default='full')
+    for name in PRESETS['full']:
+        parser.add_argument('--' + name.replace('_', '-'), type=int, help='覆盖预设的数据量')
+    parser.add_argument('--scenarios', default=','.join(SCENARIOS), help='逗号分隔的场景列表')
+    parser.add_argument('--requests', type=int, default=200, help='每个场景的请求数')
+    parser.add_argument('--concurrency', type=int, default=8, help='并发请求数')
+    parser.add_argument('--warmup', type=int, default=5, help='每个场景正式计时前的预热请求数')
+    parser.add_argument('--server', choices=['inprocess', 'uvicorn'], default='inprocess')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--save', help='结果保存为JSON文件')
+    parser.add_argument('--baseline', help='与基线结果JSON对比')
+    parser.add_argument('--threshold', type=float, default=0.2, help='允许的劣化比例')
+    parser.add_argument('--seed', type=int, default=42, help='随机数种子')
+    args = parser.parse_args()
+    args.volumes = dict(PRESETS[args.preset])
+    for name in args.volumes:
+        value = getattr(args, name)
+        if value is not None:
+            args.volumes[name] = value
+    args.scenarios = [s for s in args.scenarios.split(',') if s]
+    unknown = set(args.scenarios) - set(SCENARIOS)
+    if unknown:
+        parser.error(f'未知场景: {", ".join(sorted(unknown))}')
+    return args
+
+# ================================
+# 数据准备
+# ================================
+
+def prepare_database(path: str, volumes: dict, reseed: bool) -> bool:
+    """生成基准数据（库文件已存在且未指定 --reseed 时复用），返回是否新生成"""
+    if os.path.exists(path):
+        if not reseed:
+            return False
+        for suffix in ('', '-wal', '-shm'):
+            if os.path.exists(path + suffix):
+                os.remove(path + suffix)
+    from db import Base, engine
+    from bench.seed import seed
+    Base.metadata.create_all(engine)
+    seed(engine, **volumes)
+    return True
+
+def upgrade_database():
+    """执行迁移（全文索引、预警初始化）并初始化销售汇总和库存汇总，与服务启动时相同"""
+    import migrate
+    import rollup
+    import stock_summary
+    migrate.upgrade()
+    rollup.ensure_built()
+    stock_summary.ensure_built()
+
+def load_context(users: int, rnd: random.Random):
+    """读取各用户的商品和分类ID，并放大库存"""
+    from sqlalchemy import select, update
+    from db import Category, Product, engine
+    import stock_summary
+    with engine.begin() as conn:
+        conn.execute(update(Product).values(stock=BENCH_STOCK))
+        # 绕过ORM修改了库存，重建库存汇总（复用的数据库也需要）
+        stock_summary.rebuild(conn)
+        products, categories = {}, {}
+        for pid, uid in conn.execute(select(Product.id, Product.user_id)):
+            products.setdefault(uid, []).append(pid)
+        for cid, uid in conn.execute(select(Category.id, Category.user_id)):
+            categories.setdefault(uid, []).append(cid)
+    user_ids = sorted(u for u in products if u <= users)
+    return {'users': user_ids, 'products': products, 'categories': categories, 'rnd': rnd, 'tokens': {}}
+
+def import_workbook(rnd: random.Random) -> bytes:
+    """生成导入场景使用的Excel文件"""
+    from openpyxl import Workbook
+    wb = Workbook()
+    ws = wb.active
+    ws.append(['商品名称*', '销售价格*', '成本价格', '当前库存*', '最低库存', '单位', '分类名称', '商品描述'])
+    for i in range(IMPORT_ROWS):
+        price = round(rnd.uniform(1, 500), 2)
+        ws.append([f'导入商品{i}', price, round(price * 0.6, 2), rnd.randrange(0, 200), 10, '件', '压测导入', ''])
+    output = io.BytesIO()
+    wb.save(output)
+    return output.getvalue()
+
+# ================================
+# 场景
+# ================================
+
+def _auth(ctx, user_id: int) -> dict:
+    return {'Authorization': 'Bearer ' + ctx['tokens'][user_id]}
+
+async def scenario_login(client, ctx):
+    user_id = ctx['rnd'].choice(ctx['users'])
+    return await client.post('/api/token', data={'username': f'bench{user_id}', 'password': 'bench'})
+
+async def scenario_dashboard(client, ctx):
+    user_id = ctx['rnd'].choice(ctx['users'])
+    path = ctx['rnd'].choice([
+        '/api/dashboard/stats',
+        '/api/dashboard/sales-trend?days=30',
+        '/api/dashboard/category-sales',
+        '/api/dashboard/stock-status',
+    ])
+    return await client.get(path, headers=_auth(ctx, user_id))
+
+async def scenario_product_query(client, ctx):
+    rnd = ctx['rnd']
+    user_id = rnd.choice(ctx['users'])
+    kind = rnd.randrange(3)
+    if kind == 0:
+        body = {'name': f'商品{rnd.randrange(1, 1000)}', 'sort_by': 'relevance'}
+    elif kind == 1:
+        body = {
+            'category_id': rnd.choice(ctx['categories'].get(user_id) or [None]),
+            'sort_by': 'price',
+            'sort_order': 'asc',
+            'page': rnd.randrange(1, 6)
+        }
+    else:
+        body = {'paging': 'cursor', 'sort_by': 'created_at', 'min_price': rnd.randrange(0, 250)}
+    return await client.post('/api/products/query', json=body, headers=_auth(ctx, user_id))
+
+async def scenario_order_create(client, ctx):
+    rnd = ctx['rnd']
+    user_id = rnd.choice(ctx['users'])
+    products = ctx['products'][user_id]
+    return await client.post('/api/sales-orders', json={
+        'customer_name': '压测客户',
+        'customer_phone': '13800000000',
+        'items': [
+            {'product_id': p, 'quantity': rnd.randrange(1, 4), 'unit_price': 10.0}
+            for p in rnd.sample(products, min(3, len(products)))
+        ]
+    }, headers=_auth(ctx, user_id))
+
+async def scenario_stock_adjust(client, ctx):
+    rnd = ctx['rnd']
+    user_id = rnd.choice(ctx['users'])
+    return await client.post('/api/stock', json={
+        'product_id': rnd.choice(ctx['products'][user_id]),
+        'change': rnd.randrange(1, 10),
+        'type': rnd.choice(['入库', '出库'])
+    }, headers=_auth(ctx, user_id))
+
+async def scenario_export(client, ctx):
+    user_id = ctx['rnd'].choice(ctx['users'])
+    return await client.get('/api/export/products', params={'format': 'csv'}, headers=_auth(ctx, user_id))
+
+async def scenario_import(client, ctx):
+    user_id = ctx['rnd'].choice(ctx['users'])
+    return await client.post('/api/import/products', files={'file': ('bench.xlsx', ctx['import_file'])},
+                             headers=_auth(ctx, user_id))
+
+SCENARIO_FUNCS = {
+    'login': scenario_login,
+    'dashboard': scenario_dashboard,
+    'product_query': scenario_product_query,
+    'order_create': scenario_order_create,
+    'stock_adjust': scenario_stock_adjust,
+    'export': scenario_export,
+    'import': scenario_import,
+}
+
+# ================================
+# 统计
+# ================================
+
+def percentile(values, pct: float) -> float:
+    """百分位数（最近秩法）"""
+    if not values:
+        return 0.0
+    values = sorted(values)
+    index = max(0, min(len(values) - 1, math.ceil(pct * len(values) / 100) - 1))
+    return values[index]
+
+def reset_peak_rss(pid: int):
+    """重置进程的峰值内存记录（仅 Linux）"""
+    try:
+        with open(f'/proc/{pid}/clear_refs', 'w') as f:
+            f.write('5')
+    except OSError:
+        pass
+
+def peak_rss_mb(pid: int):
+    """进程峰值内存（MB），无法获取时返回 None"""
+    try:
+        with open(f'/proc/{pid}/status') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    if pid == os.getpid():
+        # 非 Linux 时为整个进程生命周期的峰值，macOS 单位为字节
+        rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return rss / 1024 / 1024 if sys.platform == 'darwin' else rss / 1024
+    return None
+
+async def run_scenario(client, ctx, func, requests: int, concurrency: int, warmup: int, server_pid: int):
+    """并发执行一个场景，返回统计结果"""
+    for _ in range(warmup):
+        await func(client, ctx)
+
+    latencies = []
+    errors = []
+    remaining = requests
+
+    async def worker():
+        nonlocal remaining
+        while remaining > 0:
+            remaining -= 1
+            begin = time.perf_counter()
+            try:
+                response = await func(client, ctx)
+            except Exception as e:
+                errors.append(repr(e))
+                continue
+            elapsed = time.perf_counter() - begin
+            if response.status_code >= 400:
+                errors.append(f'{response.status_code} {response.text[:200]}')
+            else:
+                latencies.append(elapsed * 1000)
+
+    reset_peak_rss(server_pid)
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(min(concurrency, requests))))
+    elapsed = time.perf_counter() - start
+    return {
+        'requests': requests,
+        'errors': len(errors),
+        'first_error': errors[0] if errors else None,
+        'elapsed': elapsed,
+        'throughput': len(latencies) / elapsed if elapsed else 0.0,
+        'p50': percentile(latencies, 50),
+        'p95': percentile(latencies, 95),
+        'p99': percentile(latencies, 99),
+        'max': max(latencies) if latencies else 0.0,
+        'peak_rss_mb': peak_rss_mb(server_pid),
+    }
+
+def print_results(results: dict):
+    print(f"\n{'场景':<16}{'请求':>6}{'失败':>6}{'吞吐(req/s)':>13}{'p50(ms)':>10}{'p95(ms)':>10}"
+          f"{'p99(ms)':>10}{'max(ms)':>10}{'峰值内存(MB)':>14}")
+    for name, r in results.items():
+        rss = f"{r['peak_rss_mb']:.0f}" if r['peak_rss_mb'] is not None else '-'
+        print(f"{name:<16}{r['requests']:>6}{r['errors']:>6}{r['throughput']:>13.1f}{r['p50']:>10.1f}"
+              f"{r['p95']:>10.1f}{r['p99']:>10.1f}{r['max']:>10.1f}{rss:>14}")
+    if 'import' in results:
+        print('注：导入场景的 Excel 解析在服务进程内执行，其峰值内存包含解析占用')
+    for name, r in results.items():
+        if r['first_error']:
+            print(f'[{name}] 首个错误: {r["first_error"]}')
+
+def compare(results: dict, baseline: dict, threshold: float):
+    """与基线对比，返回劣化项列表"""
+    regressions = []
+    print(f'\n与基线对比（阈值 {threshold:.0%}）：')
+    for name, r in results.items():
+        base = baseline.get(name)
+        if not base:
+            continue
+        p95_change = r['p95'] / base['p95'] - 1 if base['p95'] else 0.0
+        throughput_change = r['throughput'] / base['throughput'] - 1 if base['throughput'] else 0.0
+        flags = []
+        if p95_change > threshold:
+            flags.append('p95变慢')
+        if throughput_change < -threshold:
+            flags.append('吞吐下降')
+        if r['errors'] > base.get('errors', 0):
+            flags.append('失败增加')
+        print(f"{name:<16}p95 {base['p95']:.1f} -> {r['p95']:.1f}ms ({p95_change:+.0%})  "
+              f"吞吐 {base['throughput']:.1f} -> {r['throughput']:.1f} ({throughput_change:+.0%})"
+              + (f"  <- {', '.join(flags)}" if flags else ''))
+        if flags:
+            regressions.append((name, flags))
+    return regressions
+
+# ================================
+# 运行
+# ================================
+
+def start_uvicorn(port: int):
+    """启动本机 uvicorn 服务进程（单 worker），环境变量与压测进程相同"""
+    return subprocess.Popen(
+        [sys.executable, '-m', 'uvicorn', 'main:app', '--host', '127.0.0.1', '--port', str(port), '--log-level', 'warning'],
+        cwd=BACKEND_DIR
+    )
+
+async def wait_ready(client, timeout: float = 60):
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            if (await client.get('/openapi.json')).status_code == 200:
+                return
+        except Exception:
+            pass
+        if time.monotonic() > deadline:
+            raise RuntimeError('服务启动超时')
+        await asyncio.sleep(0.5)
+
+async def run(args, ctx, server_pid: int, client):
+    await wait_ready(client)
+    for user_id in ctx['users']:
+        response = await client.post('/api/token', data={'username': f'bench{user_id}', 'password': 'bench'})
+        response.raise_for_status()
+        ctx['tokens'][user_id] = response.json()['access_token']
+    results = {}
+    for name in args.scenarios:
+        requests = SCENARIOS[name] or args.requests
+        warmup = min(args.warmup, requests) if name not in ('export', 'import') else 0
+        print(f'运行场景 {name}（{requests} 个请求，并发 {args.concurrency}）...', flush=True)
+        results[name] = await run_scenario(client, ctx, SCENARIO_FUNCS[name], requests,
+                                           args.concurrency, warmup, server_pid)
+    return results
+
+def main():
+    args = parse_args()
+    import httpx
+
+    workdir = tempfile.mkdtemp(prefix='erp_bench_')
+    path = os.path.abspath(args.db or os.path.join(workdir, 'bench.db'))
+    # 须在导入 db 之前设置
+    os.environ['ERP_DATABASE_URL'] = 'sqlite:///' + path
+    os.environ.setdefault('ERP_JOB_DIR', os.path.join(workdir, 'jobs'))
+    sys.path.insert(0, BACKEND_DIR)
+
+    start = time.perf_counter()
+    seeded = prepare_database(path, args.volumes, args.reseed)
+    upgrade_database()
+    print(f"数据库 {path}（{'新生成' if seeded else '复用'}，{time.perf_counter() - start:.1f}s）")
+
+    rnd = random.Random(args.seed)
+    ctx = load_context(args.volumes['users'], rnd)
+    ctx['import_file'] = import_workbook(rnd)
+
+    timeout = httpx.Timeout(300)
+    if args.server == 'uvicorn':
+        server = start_uvicorn(args.port)
+        try:
+            async def go():
+                async with httpx.AsyncClient(base_url=f'http://127.0.0.1:{args.port}', timeout=timeout) as client:
+                    return await run(args, ctx, server.pid, client)
+            results = asyncio.run(go())
+        finally:
+            server.terminate()
+            server.wait()
+    else:
+        import main as app_main
+        app_main.on_startup()
+        try:
+            async def go():
+                transport = httpx.ASGITransport(app=app_main.app)
+                async with httpx.AsyncClient(transport=transport, base_url='http://bench', timeout=timeout) as client:
+                    return await run(args, ctx, os.getpid(), client)
+            results = asyncio.run(go())
+        finally:
+            app_main.on_shutdown()
+
+    print_results(results)
+    if args.save:
+        with open(args.save, 'w', encoding='utf-8') as f:
+            json.dump({
+                'meta': {
+                    'time': datetime.now().isoformat(timespec='seconds'),
+                    'server': args.server,
+                    'concurrency': args.concurrency,
+                    'volumes': args.volumes,
+                    'python': platform.python_version(),
+                    'sqlite': sqlite3.sqlite_version,
+                },
+                'results': results
+            }, f, ensure_ascii=False, indent=2)
+        print(f'\n结果已保存到 {args.save}')
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as f:
+            baseline = json.load(f)['results']
+        regressions = compare(results, baseline, args.threshold)
+        if regressions:
+            print(f'\n{len(regressions)} 个场景劣化超过阈值')
+            sys.exit(1)
+        print('\n未发现劣化')
+
+if __name__ == '__main__':
+    main()
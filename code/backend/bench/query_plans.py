@@ -0,0 +1,110 @@
+"""
+索引迁移前后的查询计划与耗时对比
+在临时SQLite数据库中按旧版结构（无复合索引）生成数据，输出高频查询的
+EXPLAIN QUERY PLAN 和平均耗时，执行迁移后再次输出
+
+运行（在 code/backend 目录下）：
+    python -m bench.query_plans --products 20000 --stock-logs 200000 --orders 50000
+"""
+import argparse
+import os
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import create_engine, select, func, desc
+
+import migrate
+from db import Base, Product, StockLog, SalesOrder, SalesOrderItem, SystemNotification
+from filters import product_conditions, sales_order_conditions, stock_log_conditions
+from bench.seed import seed
+
+def hot_queries(user_id: int):
+    """main.py 中高频接口使用的查询（筛选条件与接口一致）"""
+    month_ago = datetime.utcnow() - timedelta(days=30)
+    return [
+        ('商品计数', select(func.count(Product.id)).where(*product_conditions(user_id))),
+        ('分类商品', select(Product.id, Product.name).where(*product_conditions(user_id, category_id=1))),
+        ('库存流水分页', select(StockLog).where(*stock_log_conditions(user_id)).order_by(desc(StockLog.timestamp)).limit(20)),
+        ('订单时间筛选', select(SalesOrder).where(
+            *sales_order_conditions(user_id, start_time=month_ago)
+        ).order_by(desc(SalesOrder.created_at)).limit(20)),
+        ('订单明细', select(SalesOrderItem).where(SalesOrderItem.order_id.in_(list(range(1, 21))))),
+        ('商品销售明细', select(func.sum(SalesOrderItem.quantity)).where(SalesOrderItem.product_id == user_id)),
+        ('未读通知', select(SystemNotification).where(
+            SystemNotification.user_id == user_id,
+            SystemNotification.is_read == False
+        ).order_by(desc(SystemNotification.created_at)).limit(50)),
+    ]
+
+def explain(conn, stmt):
+    """返回查询计划文本"""
+    sql = str(stmt.compile(conn, compile_kwargs={'literal_binds': True}))
+    if conn.dialect.name == 'sqlite':
+        rows = conn.exec_driver_sql(f'EXPLAIN QUERY PLAN {sql}').all()
+        return ' | '.join(row[-1] for row in rows)
+    rows = conn.exec_driver_sql(f'EXPLAIN ANALYZE {sql}').all()
+    return ' | '.join(row[0] for row in rows)
+
+def measure(conn, stmt, repeat: int):
+    """平均执行耗时（毫秒）"""
+    start = time.perf_counter()
+    for _ in range(repeat):
+        conn.execute(stmt).all()
+    return (time.perf_counter() - start) / repeat * 1000
+
+def drop_migration_indexes(engine):
+    """删除迁移负责创建的索引，模拟旧版数据库结构"""
+    names = {
+        'ix_products_user_category', 'ix_stock_logs_user_timestamp', 'ix_stock_logs_product_id',
+        'ix_sales_orders_user_created', 'ix_sales_order_items_order_id', 'ix_sales_order_items_product_id',
+        'ix_system_notifications_user_read_created', 'ix_categories_user_name',
+    }
+    with engine.begin() as conn:
+        for table in Base.metadata.sorted_tables:
+            for index in table.indexes:
+                if index.name in names:
+                    index.drop(conn, checkfirst=True)
+
+def report(engine, user_id: int, repeat: int):
+    """输出各查询的计划和耗时"""
+    results = {}
+    with engine.connect() as conn:
+        for name, stmt in hot_queries(user_id):
+            results[name] = (explain(conn, stmt), measure(conn, stmt, repeat))
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description='索引迁移前后查询计划对比')
+    parser.add_argument('--users', type=int, default=5)
+    parser.add_argument('--products', type=int, default=20000)
+    parser.add_argument('--stock-logs', type=int, default=200000)
+    parser.add_argument('--orders', type=int, default=50000)
+    parser.add_argument('--repeat', type=int, default=20, help='每个查询执行次数')
+    args = parser.parse_args()
+
+    path = os.path.join(tempfile.mkdtemp(), 'bench.db')
+    engine = create_engine(f'sqlite:///{path}')
+    Base.metadata.create_all(engine)
+    drop_migration_indexes(engine)
+
+    start = time.perf_counter()
+    seed(engine, users=args.users, products=args.products, stock_logs=args.stock_logs, orders=args.orders)
+    print(f'数据生成完成：{path}（{time.perf_counter() - start:.1f}s）')
+
+    before = report(engine, 1, args.repeat)
+    start = time.perf_counter()
+    migrate.upgrade(engine)
+    print(f'迁移完成（{time.perf_counter() - start:.1f}s）\n')
+    after = report(engine, 1, args.repeat)
+
+    for name in before:
+        plan_before, ms_before = before[name]
+        plan_after, ms_after = after[name]
+        print(f'[{name}] {ms_before:.2f}ms -> {ms_after:.2f}ms')
+        print(f'  迁移前: {plan_before}')
+        print(f'  迁移后: {plan_after}')
+    engine.dispose()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,143 @@
+"""
+基准测试数据生成
+使用 db.py 中的模型表结构，按指定规模批量写入用户、分类、商品、库存流水、订单及明细
+"""
+import random
+from datetime import datetime, timedelta
+
+from sqlalchemy import insert
+
+from db import User, Category, Product, StockLog, SystemNotification, SalesOrder, SalesOrderItem
+
+BATCH_SIZE = 5000
+
+def _insert_batches(conn, table, rows):
+    """分批 executemany 写入"""
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= BATCH_SIZE:
+            conn.execute(insert(table), batch)
+            batch = []
+    if batch:
+        conn.execute(insert(table), batch)
+
+def seed(engine, users: int = 5, categories: int = 20, products: int = 20000,
+         stock_logs: int = 200000, orders: int = 50000, items_per_order: int = 3,
+         notifications: int = 20000, days: int = 365, random_seed: int = 42):
+    """
+    生成基准数据，数量均为全部用户合计，按用户平均分配
+    用户名为 bench1..benchN，密码为 bench
+    """
+    rnd = random.Random(random_seed)
+    now = datetime.utcnow()
+    start = now - timedelta(days=days)
+    span = int((now - start).total_seconds())
+
+    def random_time():
+        return start + timedelta(seconds=rnd.randrange(span))
+
+    with engine.begin() as conn:
+        _insert_batches(conn, User.__table__, (
+            {'id': u, 'username': f'bench{u}', 'password': 'bench', 'email': None}
+            for u in range(1, users + 1)
+        ))
+        _insert_batches(conn, Category.__table__, (
+            {'id': c, 'user_id': (c - 1) % users + 1, 'name': f'分类{c}', 'created_at': now, 'updated_at': now}
+            for c in range(1, categories + 1)
+        ))
+        user_categories = {u: [c for c in range(1, categories + 1) if (c - 1) % users + 1 == u] for u in range(1, users + 1)}
+
+        product_user = {}
+        product_price = {}
+
+        def product_rows():
+            for p in range(1, products + 1):
+                u = (p - 1) % users + 1
+                price = round(rnd.uniform(1, 500), 2)
+                product_user[p] = u
+                product_price[p] = price
+                cats = user_categories[u]
+                yield {
+                    'id': p,
+                    'user_id': u,
+                    'name': f'商品{p}',
+                    'description': f'基准测试商品 {p}',
+                    'price': price,
+                    'cost_price': round(price * 0.6, 2),
+                    'stock': rnd.randrange(0, 200),
+                    'min_stock': 10,
+                    'unit': '件',
+                    'category_id': rnd.choice(cats) if cats and rnd.random() < 0.9 else None,
+                    'sku': f'SKU{p:08d}',
+                    'created_at': random_time(),
+                    'updated_at': now,
+                    'sales_count': 0,
+                }
+        _insert_batches(conn, Product.__table__, product_rows())
+        user_products = {u: [p for p, pu in product_user.items() if pu == u] for u in range(1, users + 1)}
+
+        def stock_log_rows():
+            types = ['入库', '出库', '调整', '销售']
+            for i in range(1, stock_logs + 1):
+                p = rnd.randrange(1, products + 1)
+                change = rnd.randrange(1, 50)
+                before = rnd.randrange(0, 200)
+                yield {
+                    'id': i,
+                    'product_id': p,
+                    'user_id': product_user[p],
+                    'change': change,
+                    'type': rnd.choice(types),
+                    'before_stock': before,
+                    'after_stock': before + change,
+                    'reference_no': None,
+                    'timestamp': random_time(),
+                }
+        _insert_batches(conn, StockLog.__table__, stock_log_rows())
+
+        order_items = []
+
+        def order_rows():
+            item_id = 0
+            for o in range(1, orders + 1):
+                u = (o - 1) % users + 1
+                total = 0.0
+                for p in rnd.sample(user_products[u], min(items_per_order, len(user_products[u]))):
+                    item_id += 1
+                    quantity = rnd.randrange(1, 10)
+                    order_items.append({
+                        'id': item_id,
+                        'order_id': o,
+                        'product_id': p,
+                        'quantity': quantity,
+                        'unit_price': product_price[p],
+                        'total_price': quantity * product_price[p],
+                    })
+                    total += quantity * product_price[p]
+                yield {
+                    'id': o,
+                    'user_id': u,
+                    'order_no': f'SOBENCH{o:010d}',
+                    'customer_name': f'客户{rnd.randrange(1000)}',
+                    'customer_phone': f'138{rnd.randrange(10 ** 8):08d}',
+                    'total_amount': total,
+                    'status': rnd.choice(['pending', 'completed', 'completed', 'cancelled']),
+                    'notes': None,
+                    'created_at': random_time(),
+                }
+        _insert_batches(conn, SalesOrder.__table__, order_rows())
+        _insert_batches(conn, SalesOrderItem.__table__, order_items)
+
+        _insert_batches(conn, SystemNotification.__table__, (
+            {
+                'id': n,
+                'user_id': (n - 1) % users + 1,
+                'type': 'warning',
+                'title': f'商品 商品{n} 库存预警',
+                'content': '库存不足',
+                'is_read': rnd.random() < 0.8,
+                'created_at': random_time(),
+            }
+            for n in range(1, notifications + 1)
+        ))
@@ -0,0 +1,113 @@
+"""
+列表接口序列化耗时对比
+在临时SQLite数据库中生成数据，预先加载各列表接口一页的ORM对象，
+分别经 FastAPI 路由按两种方式返回，只比较序列化部分的耗时：
+- legacy：逐行 model_validate，再由 FastAPI 按 response_model 校验并输出（原实现）
+- fast：serializers.serialize_many 直接转为字典，FastJSONResponse（orjson）输出
+- fast-json：同 fast，但强制使用标准库 json（未安装 orjson 时的回退路径）
+同时校验两种方式输出的JSON内容一致
+
+运行（在 code/backend 目录下）：
+    python -m bench.serialization --repeat 200
+"""
+import argparse
+import os
+import tempfile
+import time
+from typing import List
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy.orm import sessionmaker, joinedload
+
+import migrate
+import serializers
+from db import Category, Product, StockLog, SalesOrder, SalesOrderItem, SystemNotification, create_db_engine
+from models import CategoryOut, ProductOut, SalesOrderOut, StockLogOut, NotificationOut
+from serializers import FastJSONResponse, serialize_many
+from bench.seed import seed
+
+def load_cases(db, page_size: int):
+    """各列表接口一页的数据：名称 -> (输出模型, ORM对象列表, 是否分页响应)"""
+    orders = db.query(SalesOrder).options(
+        joinedload(SalesOrder.order_items).joinedload(SalesOrderItem.product).joinedload(Product.category)
+    ).order_by(SalesOrder.id).limit(page_size).all()
+    logs = db.query(StockLog).options(
+        joinedload(StockLog.product).joinedload(Product.category)
+    ).order_by(StockLog.id).limit(page_size).all()
+    products = db.query(Product).options(joinedload(Product.category)).order_by(Product.id).limit(page_size).all()
+    notifications = db.query(SystemNotification).order_by(SystemNotification.id).limit(50).all()
+    categories = db.query(Category).order_by(Category.id).all()
+    return {
+        'sales-orders': (SalesOrderOut, orders, True),
+        'stock_logs': (StockLogOut, logs, True),
+        'products': (ProductOut, products, True),
+        'notifications': (NotificationOut, notifications, False),
+        'categories': (CategoryOut, categories, False),
+    }
+
+def page(items) -> dict:
+    return {"items": items, "total": len(items), "page": 1, "page_size": len(items), "total_pages": 1}
+
+def build_app(cases) -> FastAPI:
+    """每个数据集注册 legacy 与 fast 两个路由"""
+    app = FastAPI()
+
+    def routes(model, objects, paged):
+        # 数据通过闭包传入，不能作为路由函数的默认参数（会被当作请求参数解析）
+        def legacy():
+            items = [model.model_validate(o) for o in objects]
+            return page(items) if paged else items
+
+        def fast():
+            items = serialize_many(model, objects)
+            return FastJSONResponse(page(items) if paged else items)
+        return legacy, fast
+
+    for name, (model, objects, paged) in cases.items():
+        legacy, fast = routes(model, objects, paged)
+        app.add_api_route(f'/legacy/{name}', legacy, response_model=dict if paged else List[model])
+        app.add_api_route(f'/fast/{name}', fast, response_model=dict if paged else List[model])
+    return app
+
+def measure(client, path: str, repeat: int):
+    """返回 (平均耗时毫秒, 响应字节数, 响应内容)"""
+    response = client.get(path)
+    start = time.perf_counter()
+    for _ in range(repeat):
+        client.get(path)
+    return (time.perf_counter() - start) * 1000 / repeat, len(response.content), response.json()
+
+def main():
+    parser = argparse.ArgumentParser(description='列表接口序列化耗时对比')
+    parser.add_argument('--page-size', type=int, default=100, help='每页行数')
+    parser.add_argument('--repeat', type=int, default=100, help='每个路由的请求次数')
+    args = parser.parse_args()
+
+    url = 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'serialization.db')
+    engine = create_db_engine(url)
+    migrate.upgrade(engine)
+    seed(engine, users=1, categories=10, products=2000, stock_logs=5000, orders=2000, notifications=200)
+    db = sessionmaker(bind=engine)()
+    cases = load_cases(db, args.page_size)
+    client = TestClient(build_app(cases))
+    orjson_module = serializers.orjson
+
+    print(f"每页 {args.page_size} 行，每个路由 {args.repeat} 次，orjson {'已安装' if orjson_module else '未安装'}\n")
+    print(f"{'接口':<16}{'行数':>6}{'KB':>8}{'legacy(ms)':>12}{'fast(ms)':>10}{'fast-json(ms)':>15}{'加速':>8}  内容一致")
+    for name, (_, objects, _) in cases.items():
+        legacy_ms, size, legacy_body = measure(client, f'/legacy/{name}', args.repeat)
+        fast_ms, _, fast_body = measure(client, f'/fast/{name}', args.repeat)
+        serializers.orjson = None
+        try:
+            json_ms, _, json_body = measure(client, f'/fast/{name}', args.repeat)
+        finally:
+            serializers.orjson = orjson_module
+        same = legacy_body == fast_body == json_body
+        print(f'{name:<16}{len(objects):>6}{size / 1024:>8.1f}{legacy_ms:>12.2f}{fast_ms:>10.2f}{json_ms:>15.2f}'
+              f'{legacy_ms / fast_ms:>7.1f}x  {"是" if same else "否"}')
+    db.close()
+    engine.dispose()
+
+if __name__ == '__main__':
+    main()
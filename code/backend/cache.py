@@ -0,0 +1,61 @@
+"""
+进程内缓存工具
+TTLCache：有容量上限的LRU缓存，每个条目带过期时间，线程安全
+"""
+import threading
+import time
+from collections import OrderedDict
+
+class TTLCache:
+    """带过期时间的LRU缓存"""
+
+    def __init__(self, maxsize: int = 1024, ttl: float = 60):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        """获取缓存值，不存在或已过期返回 default"""
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return default
+            expires_at, value = item
+            if expires_at <= time.monotonic():
+                del self._data[key]
+                return default
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl: float = None):
+        """写入缓存，ttl 为空时使用默认过期时间"""
+        ttl = self.ttl if ttl is None else ttl
+        if ttl <= 0:
+            return
+        with self._lock:
+            self._data[key] = (time.monotonic() + ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        """删除缓存条目"""
+        with self._lock:
+            self._data.pop(key, None)
+
+    def delete_where(self, predicate):
+        """删除满足 predicate(key, value) 的所有条目，返回删除数量"""
+        with self._lock:
+            keys = [k for k, (_, v) in self._data.items() if predicate(k, v)]
+            for k in keys:
+                del self._data[k]
+            return len(keys)
+
+    def clear(self):
+        """清空缓存"""
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
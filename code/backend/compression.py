@@ -0,0 +1,88 @@
+"""
+响应压缩（ASGI中间件）
+- 按 Accept-Encoding 选择 br（需安装 brotli）或 gzip，只压缩一次性返回的 JSON/文本响应，
+  且大小不低于 ERP_COMPRESS_MIN_SIZE（默认1024字节）
+- 分块发送的流式响应（导出文件、SSE 推送）原样透传，不缓冲
+- ERP_COMPRESSION=0 时不启用
+"""
+import gzip
+import os
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+COMPRESSION_ENABLED = os.environ.get('ERP_COMPRESSION', '1').lower() in ('1', 'true', 'yes')
+COMPRESS_MIN_SIZE = int(os.environ.get('ERP_COMPRESS_MIN_SIZE', '1024'))
+GZIP_LEVEL = int(os.environ.get('ERP_GZIP_LEVEL', '6'))
+BROTLI_QUALITY = int(os.environ.get('ERP_BROTLI_QUALITY', '4'))
+
+COMPRESSIBLE_TYPES = ('application/json', 'text/plain', 'text/html', 'text/csv')
+
+def choose_encoding(accept_encoding: str):
+    """按客户端支持的编码选择压缩方式，优先 br"""
+    accepted = set()
+    for part in accept_encoding.lower().split(','):
+        name, _, params = part.strip().partition(';')
+        if params.strip().replace(' ', '') in ('q=0', 'q=0.0'):
+            continue
+        accepted.add(name.strip())
+    if brotli is not None and 'br' in accepted:
+        return 'br'
+    if 'gzip' in accepted:
+        return 'gzip'
+    return None
+
+def compress(body: bytes, encoding: str) -> bytes:
+    if encoding == 'br':
+        return brotli.compress(body, quality=BROTLI_QUALITY)
+    return gzip.compress(body, compresslevel=GZIP_LEVEL)
+
+class CompressionMiddleware:
+    """压缩较大的一次性响应"""
+
+    def __init__(self, app, min_size: int = COMPRESS_MIN_SIZE):
+        self.app = app
+        self.min_size = min_size
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            return await self.app(scope, receive, send)
+        headers = dict(scope['headers'])
+        encoding = choose_encoding(headers.get(b'accept-encoding', b'').decode('latin-1'))
+        if encoding is None:
+            return await self.app(scope, receive, send)
+
+        start = None
+
+        async def send_compressed(message):
+            nonlocal start
+            if message['type'] == 'http.response.start':
+                response_headers = message.get('headers', [])
+                content_type = next((v for k, v in response_headers if k.lower() == b'content-type'), b'').decode('latin-1')
+                already_encoded = any(k.lower() == b'content-encoding' for k, _ in response_headers)
+                if already_encoded or not content_type.startswith(COMPRESSIBLE_TYPES):
+                    return await send(message)
+                # 等第一段响应体确定是否为一次性响应后再发送响应头
+                start = message
+                return
+            if start is None:
+                return await send(message)
+            response_start, start = start, None
+            body = message.get('body', b'')
+            if message.get('more_body', False) or len(body) < self.min_size:
+                await send(response_start)
+                return await send(message)
+            body = compress(body, encoding)
+            response_start['headers'] = [
+                (k, v) for k, v in response_start.get('headers', []) if k.lower() != b'content-length'
+            ] + [
+                (b'content-encoding', encoding.encode('latin-1')),
+                (b'content-length', str(len(body)).encode('latin-1')),
+                (b'vary', b'Accept-Encoding'),
+            ]
+            await send(response_start)
+            await send({'type': 'http.response.body', 'body': body})
+
+        await self.app(scope, receive, send_compressed)
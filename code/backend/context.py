@@ -0,0 +1,54 @@
+"""
+请求上下文
+RequestContextMiddleware 为每个请求创建 RequestContext 并放入 contextvars，
+线程池中执行的同步接口、依赖和SQL引擎事件都能读取到同一对象
+（慢查询日志据此记录路由和用户，监控据此累计SQL统计和剖析）
+"""
+import contextvars
+from collections import Counter
+
+class RequestContext:
+    """当前请求的方法、路径、路由模板、已认证用户、缓存响应头和监控统计"""
+
+    def __init__(self, scope):
+        self.scope = scope
+        self.method = scope['method']
+        self.path = scope['path']
+        self.user_id = None
+        # 条件请求依赖计算的 ETag 等响应头（见 httpcache）
+        self.cache_headers = None
+        # SQL统计与性能剖析（见 metrics，未启用监控时不使用）
+        self.sql_count = 0
+        self.sql_time = 0.0
+        self.statements = Counter()
+        self.profile = False
+        self.profiler = None
+
+    @property
+    def route(self) -> str:
+        """路由模板（如 /api/products/{product_id}），路由匹配前为请求路径"""
+        route = self.scope.get('route')
+        return getattr(route, 'path', None) or self.path
+
+current_request = contextvars.ContextVar('erp_request_context', default=None)
+
+def set_user(user_id: int):
+    """记录当前请求的用户（认证成功后调用）"""
+    ctx = current_request.get()
+    if ctx is not None:
+        ctx.user_id = user_id
+
+class RequestContextMiddleware:
+    """为每个HTTP请求设置请求上下文（ASGI中间件，须位于最外层，其他中间件读取同一上下文）"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            return await self.app(scope, receive, send)
+        token = current_request.set(RequestContext(scope))
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            current_request.reset(token)
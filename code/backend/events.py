@@ -0,0 +1,93 @@
+"""
+实时事件推送（进程内发布/订阅）
+- 业务代码在事务中通过 emit 登记事件，会话提交成功后按用户分发给已连接的客户端，回滚则丢弃
+- 同一事务中同一用户的同类事件合并为一条，事件数据统一为 {"items": [...]}
+- 事件类型：notification(新通知)、stock(库存变化)、order(订单创建/状态变化)
+- 客户端消费过慢、队列写满时清空队列并发送 resync，客户端收到后重新拉取数据
+多进程部署（多个 uvicorn worker）时各进程只推送本进程内产生的事件
+"""
+import asyncio
+import itertools
+import os
+import threading
+from collections import OrderedDict
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+# 每个连接的待发送事件上限
+EVENT_QUEUE_SIZE = int(os.environ.get('ERP_EVENT_QUEUE_SIZE', '100'))
+
+class Subscriber:
+    """一个客户端连接的事件队列（在事件循环线程中读取）"""
+
+    def __init__(self, user_id: int, loop):
+        self.user_id = user_id
+        self.loop = loop
+        self.queue = asyncio.Queue(maxsize=EVENT_QUEUE_SIZE)
+
+    def put(self, item):
+        """写入事件，队列已满时改为发送 resync（须在事件循环线程中调用）"""
+        if self.queue.full():
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            item = (item[0], 'resync', {"items": []})
+        self.queue.put_nowait(item)
+
+class Broker:
+    """按用户分发事件，可在任意线程中发布"""
+
+    def __init__(self):
+        self._subscribers = {}
+        self._lock = threading.Lock()
+        self._ids = itertools.count(1)
+
+    def subscribe(self, user_id: int) -> Subscriber:
+        subscriber = Subscriber(user_id, asyncio.get_running_loop())
+        with self._lock:
+            self._subscribers.setdefault(user_id, set()).add(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber: Subscriber):
+        with self._lock:
+            subscribers = self._subscribers.get(subscriber.user_id)
+            if subscribers:
+                subscribers.discard(subscriber)
+                if not subscribers:
+                    del self._subscribers[subscriber.user_id]
+
+    def publish(self, user_id: int, event_type: str, data: dict):
+        """向该用户的所有连接发送事件"""
+        with self._lock:
+            subscribers = list(self._subscribers.get(user_id, ()))
+        if not subscribers:
+            return
+        item = (next(self._ids), event_type, data)
+        for subscriber in subscribers:
+            try:
+                subscriber.loop.call_soon_threadsafe(subscriber.put, item)
+            except RuntimeError:
+                # 事件循环已关闭
+                self.unsubscribe(subscriber)
+
+    def connection_count(self) -> int:
+        with self._lock:
+            return sum(len(s) for s in self._subscribers.values())
+
+broker = Broker()
+
+def emit(db, user_id: int, event_type: str, items):
+    """登记事件，会话提交后推送"""
+    pending = db.info.setdefault('pending_events', OrderedDict())
+    pending.setdefault((user_id, event_type), []).extend(items)
+
+@event.listens_for(Session, 'after_commit')
+def _publish_pending(session):
+    pending = session.info.pop('pending_events', None)
+    if pending:
+        for (user_id, event_type), items in pending.items():
+            broker.publish(user_id, event_type, {"items": items})
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_pending(session):
+    session.info.pop('pending_events', None)
@@ -0,0 +1,352 @@
+"""
+流式导出引擎
+- 按主键分页（keyset）从数据库读取列元组，不构建ORM对象和DataFrame；
+  每页查询读完即结束，不会在整个导出期间占用SQLite读锁阻塞写入
+- CSV 逐块编码输出，首字节无需等待全部数据
+- Excel 使用 openpyxl 只写模式写入临时文件，再分块输出
+内存占用与数据量无关。商品、订单、库存流水三类导出共用同一引擎，由 ExportRequest 驱动
+"""
+import csv
+import io
+import os
+import tempfile
+from datetime import datetime
+
+from fastapi import HTTPException
+from fastapi.responses import StreamingResponse
+from openpyxl import Workbook
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.styles import Font, PatternFill, Alignment
+from openpyxl.utils import get_column_letter
+from sqlalchemy import select
+
+from db import SessionLocal, Product, Category, StockLog, SalesOrder, SalesOrderItem
+from filters import product_conditions, sales_order_conditions, stock_log_conditions
+from models import ExportRequest
+
+# 每页从数据库读取的行数
+EXPORT_BATCH_SIZE = 1000
+# 文件分块输出大小
+FILE_CHUNK_SIZE = 64 * 1024
+
+EXCEL_MEDIA_TYPE = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+
+# 商品导出列：(表头, Excel列宽)
+PRODUCT_COLUMNS = [
+    ('商品编码', 15),
+    ('商品名称', 20),
+    ('商品描述', 30),
+    ('分类', 15),
+    ('销售价格', 12),
+    ('成本价格', 12),
+    ('当前库存', 12),
+    ('最低库存', 12),
+    ('单位', 10),
+    ('累计销量', 12),
+    ('创建时间', 20),
+]
+
+# 订单导出列（每个订单明细一行）
+ORDER_COLUMNS = [
+    ('订单号', 22),
+    ('客户名称', 15),
+    ('客户电话', 15),
+    ('订单状态', 10),
+    ('订单金额', 12),
+    ('商品编码', 15),
+    ('商品名称', 20),
+    ('数量', 10),
+    ('单价', 12),
+    ('小计', 12),
+    ('备注', 30),
+    ('创建时间', 20),
+]
+
+# 库存流水导出列
+STOCK_LOG_COLUMNS = [
+    ('时间', 20),
+    ('商品编码', 15),
+    ('商品名称', 20),
+    ('类型', 10),
+    ('变动数量', 12),
+    ('变动前库存', 12),
+    ('变动后库存', 12),
+    ('关联单号', 22),
+]
+
+def format_datetime(value):
+    """格式化时间字段"""
+    return value.strftime('%Y-%m-%d %H:%M:%S') if value else ''
+
+def iter_keyset(db, stmt, key_column, batch_size: int = EXPORT_BATCH_SIZE):
+    """
+    按键列分页读取查询结果（WHERE key > 上一页最后一个值 ORDER BY key LIMIT n）
+    key_column 必须唯一且非空，每页完整读取后再返回行
+    """
+    stmt = stmt.add_columns(key_column.label('row_key')).order_by(key_column).limit(batch_size)
+    last_key = None
+    while True:
+        page_stmt = stmt if last_key is None else stmt.where(key_column > last_key)
+        rows = db.execute(page_stmt).all()
+        yield from rows
+        if len(rows) < batch_size:
+            break
+        last_key = rows[-1].row_key
+
+def iter_product_rows(db, user_id: int, filters: dict = None):
+    """按批次读取商品导出行（仅查询需要的列）"""
+    filters = filters or {}
+    stmt = select(
+        Product.sku,
+        Product.name,
+        Product.description,
+        Category.name.label('category_name'),
+        Product.price,
+        Product.cost_price,
+        Product.stock,
+        Product.min_stock,
+        Product.unit,
+        Product.sales_count,
+        Product.created_at
+    ).outerjoin(
+        Category, Category.id == Product.category_id
+    ).where(
+        *product_conditions(
+            user_id,
+            name=filters.get('name'),
+            category_id=filters.get('category_id'),
+            stock_status=filters.get('stock_status')
+        )
+    )
+
+    for row in iter_keyset(db, stmt, Product.id):
+        yield [
+            row.sku or '',
+            row.name,
+            row.description or '',
+            row.category_name or '未分类',
+            row.price,
+            row.cost_price,
+            row.stock,
+            row.min_stock,
+            row.unit,
+            row.sales_count,
+            format_datetime(row.created_at)
+        ]
+
+def iter_order_rows(db, user_id: int, filters: dict = None):
+    """
+    按批次读取订单导出行：先按订单ID分页取出一批订单，
+    再用一次关联查询展开这批订单的明细和商品，避免N+1
+    """
+    filters = filters or {}
+    conditions = sales_order_conditions(
+        user_id,
+        status=filters.get('status'),
+        order_no=filters.get('order_no'),
+        customer=filters.get('customer'),
+        start_time=filters.get('start_time'),
+        end_time=filters.get('end_time')
+    )
+    lines = select(
+        SalesOrder.order_no,
+        SalesOrder.customer_name,
+        SalesOrder.customer_phone,
+        SalesOrder.status,
+        SalesOrder.total_amount,
+        SalesOrder.notes,
+        SalesOrder.created_at,
+        Product.sku,
+        Product.name.label('product_name'),
+        SalesOrderItem.quantity,
+        SalesOrderItem.unit_price,
+        SalesOrderItem.total_price
+    ).outerjoin(
+        SalesOrderItem, SalesOrderItem.order_id == SalesOrder.id
+    ).outerjoin(
+        Product, Product.id == SalesOrderItem.product_id
+    ).order_by(SalesOrder.id, SalesOrderItem.id)
+
+    order_ids = select(SalesOrder.id).where(*conditions)
+    batch = []
+    for order in iter_keyset(db, order_ids, SalesOrder.id):
+        batch.append(order.id)
+        if len(batch) >= EXPORT_BATCH_SIZE:
+            yield from _order_line_rows(db, lines, batch)
+            batch = []
+    if batch:
+        yield from _order_line_rows(db, lines, batch)
+
+def _order_line_rows(db, lines, order_ids):
+    """展开一批订单的明细行"""
+    for row in db.execute(lines.where(SalesOrder.id.in_(order_ids))).all():
+        yield [
+            row.order_no,
+            row.customer_name or '',
+            row.customer_phone or '',
+            row.status,
+            row.total_amount,
+            row.sku or '',
+            row.product_name or '',
+            row.quantity,
+            row.unit_price,
+            row.total_price,
+            row.notes or '',
+            format_datetime(row.created_at)
+        ]
+
+def iter_stock_log_rows(db, user_id: int, filters: dict = None):
+    """按批次读取库存流水导出行"""
+    filters = filters or {}
+    stmt = select(
+        StockLog.timestamp,
+        Product.sku,
+        Product.name.label('product_name'),
+        StockLog.type,
+        StockLog.change,
+        StockLog.before_stock,
+        StockLog.after_stock,
+        StockLog.reference_no
+    ).outerjoin(
+        Product, Product.id == StockLog.product_id
+    ).where(
+        *stock_log_conditions(
+            user_id,
+            product_name=filters.get('product_name'),
+            type=filters.get('type'),
+            start_time=filters.get('start_time'),
+            end_time=filters.get('end_time')
+        )
+    )
+
+    for row in iter_keyset(db, stmt, StockLog.id):
+        yield [
+            format_datetime(row.timestamp),
+            row.sku or '',
+            row.product_name or '',
+            row.type,
+            row.change,
+            row.before_stock,
+            row.after_stock,
+            row.reference_no or ''
+        ]
+
+# 导出类型注册表：export_type -> (文件名前缀, 工作表名, 列定义, 行读取函数)
+EXPORTERS = {
+    'products': ('products', '商品数据', PRODUCT_COLUMNS, iter_product_rows),
+    'orders': ('orders', '订单数据', ORDER_COLUMNS, iter_order_rows),
+    'stock_logs': ('stock_logs', '库存流水', STOCK_LOG_COLUMNS, iter_stock_log_rows),
+}
+
+def get_exporter(export_type: str):
+    """获取导出类型对应的 (文件名前缀, 工作表名, 列定义, 行读取函数)"""
+    if export_type not in EXPORTERS:
+        raise HTTPException(status_code=400, detail=f'不支持的导出类型: {export_type}')
+    return EXPORTERS[export_type]
+
+def csv_chunks(columns, rows):
+    """将行逐块转换为CSV文本，每 EXPORT_BATCH_SIZE 行输出一块"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    # 仅在开头输出一次BOM，保证Excel正确识别UTF-8
+    buffer.write('\ufeff')
+    writer.writerow([title for title, _ in columns])
+    count = 0
+    for row in rows:
+        writer.writerow(row)
+        count += 1
+        if count % EXPORT_BATCH_SIZE == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate(0)
+    yield buffer.getvalue()
+
+def iter_csv(columns, fetch_rows):
+    """
+    逐块生成CSV字节流
+    参数：columns - 列定义；fetch_rows - 接收数据库会话并返回行迭代器的函数
+    """
+    db = SessionLocal()
+    try:
+        for chunk in csv_chunks(columns, fetch_rows(db)):
+            yield chunk.encode('utf-8')
+    finally:
+        db.close()
+
+def write_csv(path: str, columns, rows):
+    """将行逐块写入CSV文件"""
+    with open(path, 'w', encoding='utf-8', newline='') as f:
+        for chunk in csv_chunks(columns, rows):
+            f.write(chunk)
+
+def write_excel(path: str, sheet_name: str, columns, rows):
+    """使用openpyxl只写模式将行写入Excel文件，行数据不在内存中累积"""
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet(title=sheet_name)
+
+    # 设置列宽（只写模式下需在写入数据前设置）
+    for index, (_, width) in enumerate(columns, start=1):
+        ws.column_dimensions[get_column_letter(index)].width = width
+
+    # 设置标题行样式
+    header_font = Font(bold=True, color="FFFFFF")
+    header_fill = PatternFill(start_color="366092", end_color="366092", fill_type="solid")
+    header_alignment = Alignment(horizontal="center", vertical="center")
+    header = []
+    for title, _ in columns:
+        cell = WriteOnlyCell(ws, value=title)
+        cell.font = header_font
+        cell.fill = header_fill
+        cell.alignment = header_alignment
+        header.append(cell)
+    ws.append(header)
+
+    count = 0
+    for row in rows:
+        ws.append(row)
+        count += 1
+    wb.save(path)
+    return count
+
+def iter_excel(sheet_name: str, columns, fetch_rows):
+    """生成Excel字节流：先写入临时文件，再分块输出并删除临时文件"""
+    fd, path = tempfile.mkstemp(suffix='.xlsx')
+    os.close(fd)
+    db = SessionLocal()
+    try:
+        write_excel(path, sheet_name, columns, fetch_rows(db))
+        db.close()
+        with open(path, 'rb') as f:
+            while True:
+                chunk = f.read(FILE_CHUNK_SIZE)
+                if not chunk:
+                    break
+                yield chunk
+    finally:
+        db.close()
+        os.remove(path)
+
+def export_response(request: ExportRequest, user_id: int):
+    """根据导出请求构建流式导出响应"""
+    filename_prefix, sheet_name, columns, iter_rows = get_exporter(request.export_type)
+    filters = request.filters or {}
+
+    def fetch_rows(db):
+        return iter_rows(db, user_id, filters)
+
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    if request.format == 'csv':
+        return StreamingResponse(
+            iter_csv(columns, fetch_rows),
+            media_type='text/csv',
+            headers={
+                'Content-Disposition': f'attachment; filename={filename_prefix}_{timestamp}.csv'
+            }
+        )
+    return StreamingResponse(
+        iter_excel(sheet_name, columns, fetch_rows),
+        media_type=EXCEL_MEDIA_TYPE,
+        headers={
+            'Content-Disposition': f'attachment; filename={filename_prefix}_{timestamp}.xlsx'
+        }
+    )
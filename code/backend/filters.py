@@ -0,0 +1,86 @@
+"""
+列表查询与导出共用的筛选条件
+返回SQLAlchemy条件列表，可同时用于 Query.filter 和 select().where，
+保证接口列表与导出的筛选语义一致并下推到SQL执行
+关键词搜索通过 search.py 走全文索引
+"""
+from typing import Optional
+
+from sqlalchemy import select
+
+from db import Product, StockLog, SalesOrder
+from search import product_search_condition, order_search_condition
+
+def product_conditions(
+    user_id: int,
+    name: Optional[str] = None,
+    category_id: Optional[int] = None,
+    stock_status: Optional[str] = None
+):
+    """
+    商品筛选条件
+    stock_status: sufficient(充足)/normal(正常)/warning(预警)/out(缺货)，与库存状态统计口径一致
+    """
+    conditions = [Product.user_id == user_id]
+    if name and name.strip():
+        conditions.append(product_search_condition(name))
+    if category_id:
+        conditions.append(Product.category_id == category_id)
+    if stock_status == 'sufficient':
+        conditions.append(Product.stock > Product.min_stock * 2)
+    elif stock_status == 'normal':
+        conditions.append(Product.stock > Product.min_stock)
+        conditions.append(Product.stock <= Product.min_stock * 2)
+    elif stock_status == 'warning':
+        conditions.append(Product.stock > 0)
+        conditions.append(Product.stock <= Product.min_stock)
+    elif stock_status == 'out':
+        conditions.append(Product.stock == 0)
+    return conditions
+
+def sales_order_conditions(
+    user_id: int,
+    status: Optional[str] = None,
+    order_no: Optional[str] = None,
+    customer: Optional[str] = None,
+    start_time: Optional[str] = None,
+    end_time: Optional[str] = None
+):
+    """销售订单筛选条件（与订单列表接口参数一致）"""
+    conditions = [SalesOrder.user_id == user_id]
+    if status:
+        conditions.append(SalesOrder.status == status)
+    if order_no and order_no.strip():
+        conditions.append(order_search_condition(order_no, ('order_no',)))
+    if customer and customer.strip():
+        conditions.append(order_search_condition(customer, ('customer_name', 'customer_phone')))
+    if start_time:
+        conditions.append(SalesOrder.created_at >= start_time)
+    if end_time:
+        conditions.append(SalesOrder.created_at <= end_time)
+    return conditions
+
+def stock_log_conditions(
+    user_id: int,
+    product_name: Optional[str] = None,
+    type: Optional[str] = None,
+    start_time: Optional[str] = None,
+    end_time: Optional[str] = None
+):
+    """库存流水筛选条件（与库存流水接口参数一致）"""
+    conditions = [StockLog.user_id == user_id]
+    if product_name and product_name.strip():
+        # 使用子查询按商品搜索，调用方无需关心是否已关联商品表
+        conditions.append(StockLog.product_id.in_(
+            select(Product.id).where(
+                Product.user_id == user_id,
+                product_search_condition(product_name)
+            )
+        ))
+    if type:
+        conditions.append(StockLog.type == type)
+    if start_time:
+        conditions.append(StockLog.timestamp >= start_time)
+    if end_time:
+        conditions.append(StockLog.timestamp <= end_time)
+    return conditions
@@ -0,0 +1,129 @@
+"""
+HTTP 条件请求（ETag / Last-Modified）
+- 按 (用户, 资源) 维护版本号，写接口提交后调用 bump 递增；分类为全部用户共用，记在 GLOBAL 下
+- 读接口声明依赖的资源（conditional），ETag 由路径、查询参数、用户和这些资源的版本计算，
+  请求的 If-None-Match（或 If-Modified-Since）与之一致时直接返回 304，不执行查询
+- 版本保存在进程内，ETag 含进程启动标识，重启后自然失效；多 worker 部署时各进程版本互不可见，
+  其他进程的写入不会使本进程的 ETag 失效，因此默认关闭，仅单进程部署时设置 ERP_HTTP_CACHE=1 启用
+"""
+import hashlib
+import itertools
+import os
+import threading
+import time
+import uuid
+from datetime import date, datetime
+from email.utils import formatdate, parsedate_to_datetime
+
+from fastapi import Depends, HTTPException, Request
+
+from auth import get_current_user
+from context import current_request
+from db import User
+
+HTTP_CACHE_ENABLED = os.environ.get('ERP_HTTP_CACHE', '0').lower() in ('1', 'true', 'yes')
+
+# 资源：categories(分类) products(商品及库存) orders(销售订单) notifications(通知)
+GLOBAL = 0
+# 全部用户共用的资源
+GLOBAL_RESOURCES = ('categories',)
+BOOT_ID = uuid.uuid4().hex[:8]
+BOOT_TIME = int(time.time())
+
+_versions = {}
+_counter = itertools.count(1)
+_lock = threading.Lock()
+
+def bump(user_id, *resources):
+    """写操作提交后递增资源版本（user_id 为 GLOBAL 时为全部用户共用的资源）"""
+    now = int(time.time())
+    with _lock:
+        for resource in resources:
+            _versions[(user_id, resource)] = (next(_counter), now)
+
+def version(user_id, resource):
+    """返回 (版本号, 最后修改时间戳)，未修改过时为 (0, 进程启动时间)"""
+    return _versions.get((user_id, resource), (0, BOOT_TIME))
+
+def _etag(request: Request, user_id, versions, daily: bool) -> str:
+    parts = [BOOT_ID, str(user_id), request.url.path, str(sorted(request.query_params.multi_items())), str(versions)]
+    if daily:
+        parts.append(date.today().isoformat())
+    return 'W/"' + hashlib.blake2b('|'.join(parts).encode('utf-8'), digest_size=12).hexdigest() + '"'
+
+def _not_modified(request: Request, etag: str, last_modified: int) -> bool:
+    """If-None-Match 优先；没有时按 If-Modified-Since 判断"""
+    if_none_match = request.headers.get('if-none-match')
+    if if_none_match is not None:
+        # 弱比较：忽略 W/ 前缀
+        tags = [t.strip().removeprefix('W/') for t in if_none_match.split(',')]
+        return '*' in tags or etag.removeprefix('W/') in tags
+    if_modified_since = request.headers.get('if-modified-since')
+    if if_modified_since:
+        try:
+            return last_modified <= parsedate_to_datetime(if_modified_since).timestamp()
+        except (TypeError, ValueError):
+            return False
+    return False
+
+def _check(request: Request, user_id, resources, daily: bool):
+    owners = [GLOBAL if resource in GLOBAL_RESOURCES else user_id for resource in resources]
+    versions = [version(owner, resource) for owner, resource in zip(owners, resources)]
+    last_modified = max(modified for _, modified in versions)
+    if daily:
+        # 按日期统计的结果在零点后变化
+        today = datetime.combine(date.today(), datetime.min.time()).timestamp()
+        last_modified = max(last_modified, int(today))
+    etag = _etag(request, user_id, [v for v, _ in versions], daily)
+    headers = {'ETag': etag, 'Cache-Control': 'private, no-cache'}
+    # Last-Modified 精确到秒，当前这一秒内修改过的资源不返回，避免同一秒内的后续修改被 If-Modified-Since 判为未修改
+    if last_modified < int(time.time()):
+        headers['Last-Modified'] = formatdate(last_modified, usegmt=True)
+    if _not_modified(request, etag, last_modified):
+        raise HTTPException(status_code=304, headers=headers)
+    ctx = current_request.get()
+    if ctx is not None:
+        ctx.cache_headers = headers
+
+def conditional(*resources, daily: bool = False, auth=get_current_user):
+    """
+    生成读接口的条件请求依赖（放在路由的 dependencies 中）
+    resources 为响应依赖的资源，daily 为真时ETag按日期变化（仪表盘按天统计）
+    auth 须与路由使用的鉴权依赖相同（同步接口 get_current_user，异步接口 get_current_user_async），
+    同一请求内鉴权和数据库会话只执行、创建一次
+    """
+    if not HTTP_CACHE_ENABLED:
+        async def disabled():
+            return None
+        return disabled
+
+    if all(resource in GLOBAL_RESOURCES for resource in resources):
+        async def check_global(request: Request):
+            _check(request, GLOBAL, resources, daily)
+        return check_global
+
+    async def check_user(request: Request, current_user: User = Depends(auth)):
+        _check(request, current_user.id, resources, daily)
+    return check_user
+
+class CacheHeadersMiddleware:
+    """为 200 响应加上 conditional 计算的 ETag/Last-Modified（ASGI中间件，需位于 RequestContextMiddleware 内层）"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http' or scope['method'] not in ('GET', 'HEAD'):
+            return await self.app(scope, receive, send)
+
+        async def send_with_headers(message):
+            if message['type'] == 'http.response.start' and message['status'] == 200:
+                ctx = current_request.get()
+                headers = ctx.cache_headers if ctx is not None else None
+                if headers:
+                    message['headers'] = list(message.get('headers', [])) + [
+                        (k.lower().encode('latin-1'), v.encode('latin-1')) for k, v in headers.items()
+                    ]
+            await send(message)
+
+        await self.app(scope, receive, send_with_headers)
@@ -0,0 +1,204 @@
+"""
+批量商品导入引擎
+- 按块读取工作表（xlsx 使用 openpyxl 只读模式逐行读取，不整体载入内存）
+- 每块使用 pandas 向量化校验和类型转换
+- 分类名称一次查询解析，缺失分类一次批量插入
+- 商品使用 insert() executemany 批量写入，同一事务内计入库存汇总
+"""
+import uuid
+from datetime import datetime
+
+import pandas as pd
+from fastapi import HTTPException
+from openpyxl import load_workbook
+from sqlalchemy import insert, select
+
+from db import Category, Product
+from models import ImportResult
+import stock_summary
+
+# 每块处理的行数
+IMPORT_CHUNK_SIZE = 1000
+
+REQUIRED_COLUMNS = ['商品名称*', '销售价格*', '当前库存*']
+OPTIONAL_COLUMNS = ['商品描述', '分类名称', '成本价格', '最低库存', '单位', '商品编码']
+
+def iter_xlsx_chunks(fileobj, chunk_size: int = IMPORT_CHUNK_SIZE):
+    """
+    按块读取xlsx文件
+    返回 (列名, DataFrame) 迭代器，DataFrame索引为Excel中的行号
+    """
+    wb = load_workbook(fileobj, read_only=True, data_only=True)
+    try:
+        rows = wb.worksheets[0].iter_rows(values_only=True)
+        header = next(rows, None)
+        columns = [str(c).strip() if c is not None else '' for c in (header or [])]
+        yield columns, None
+
+        records, line_numbers = [], []
+        for line_no, row in enumerate(rows, start=2):
+            # 跳过整行为空的数据
+            if row is None or all(v is None or (isinstance(v, str) and not v.strip()) for v in row):
+                continue
+            records.append(row[:len(columns)])
+            line_numbers.append(line_no)
+            if len(records) >= chunk_size:
+                yield columns, pd.DataFrame(records, columns=columns, index=line_numbers)
+                records, line_numbers = [], []
+        if records:
+            yield columns, pd.DataFrame(records, columns=columns, index=line_numbers)
+    finally:
+        wb.close()
+
+def iter_xls_chunks(fileobj, chunk_size: int = IMPORT_CHUNK_SIZE):
+    """按块读取xls文件（xlrd不支持流式读取，读取后分块处理）"""
+    df = pd.read_excel(fileobj)
+    df.columns = [str(c).strip() for c in df.columns]
+    df.index = df.index + 2
+    yield list(df.columns), None
+    for start in range(0, len(df), chunk_size):
+        yield list(df.columns), df.iloc[start:start + chunk_size]
+
+def validate_chunk(df: pd.DataFrame):
+    """
+    向量化校验并转换一块数据
+    返回：(合法行DataFrame, 错误信息列表)
+    """
+    for col in OPTIONAL_COLUMNS:
+        if col not in df.columns:
+            df[col] = None
+    df = df.astype(object).where(df.notna(), None)
+
+    def text(col):
+        return df[col].map(lambda v: (str(v).strip() or None) if v is not None else None)
+
+    name = text('商品名称*')
+    price_raw = df['销售价格*']
+    stock_raw = df['当前库存*']
+    cost_raw = df['成本价格']
+    min_stock_raw = df['最低库存']
+    price = pd.to_numeric(price_raw, errors='coerce')
+    stock = pd.to_numeric(stock_raw, errors='coerce')
+    cost = pd.to_numeric(cost_raw, errors='coerce')
+    min_stock = pd.to_numeric(min_stock_raw, errors='coerce')
+
+    # 每条规则：(不合法的行掩码, 错误信息)
+    rules = [
+        (name.isna(), '商品名称不能为空'),
+        (price.isna(), '销售价格必须为数字'),
+        (stock.isna(), '当前库存必须为数字'),
+        (cost_raw.notna() & cost.isna(), '成本价格必须为数字'),
+        (min_stock_raw.notna() & min_stock.isna(), '最低库存必须为数字'),
+    ]
+    invalid = pd.Series(False, index=df.index)
+    messages = pd.Series('', index=df.index)
+    for mask, message in rules:
+        # 每行只报告第一条错误
+        new = mask & ~invalid
+        messages[new] = message
+        invalid |= mask
+    errors = [f'第{line}行: {messages[line]}' for line in df.index[invalid]]
+
+    valid = ~invalid
+    sku = text('商品编码')[valid]
+    missing_sku = sku.isna()
+    if missing_sku.any():
+        prefix = f"SKU{datetime.now().strftime('%Y%m%d')}"
+        sku[missing_sku] = [f"{prefix}{uuid.uuid4().hex[:6].upper()}" for _ in range(int(missing_sku.sum()))]
+
+    result = pd.DataFrame({
+        'name': name[valid],
+        'description': text('商品描述')[valid].fillna(''),
+        'category_name': text('分类名称')[valid],
+        'price': price[valid].astype(float),
+        'cost_price': cost[valid].fillna(0).astype(float),
+        'stock': stock[valid].astype(int),
+        'min_stock': min_stock[valid].fillna(10).astype(int),
+        'unit': text('单位')[valid].fillna('件'),
+        'sku': sku,
+    })
+    return result, errors
+
+def resolve_categories(db, user_id: int, names, cache: dict):
+    """
+    解析分类名称为分类ID：一次查询已有分类，一次批量插入缺失分类
+    cache 在多个数据块之间复用
+    """
+    pending = {n for n in names if n not in cache}
+    if not pending:
+        return
+    existing = db.execute(
+        select(Category.id, Category.name).where(
+            Category.user_id == user_id,
+            Category.name.in_(pending)
+        ).order_by(Category.id)
+    ).all()
+    for category_id, name in existing:
+        cache.setdefault(name, category_id)
+    missing = [n for n in pending if n not in cache]
+    if missing:
+        now = datetime.now()
+        created = db.execute(
+            insert(Category).returning(Category.id, Category.name),
+            [{'user_id': user_id, 'name': n, 'created_at': now, 'updated_at': now} for n in missing]
+        ).all()
+        for category_id, name in created:
+            cache[name] = category_id
+
+def import_products(db, user_id: int, fileobj, filename: str, chunk_size: int = IMPORT_CHUNK_SIZE, on_chunk=None) -> ImportResult:
+    """
+    从Excel文件批量导入商品，默认全部数据在一个事务内提交
+    on_chunk: 可选回调 on_chunk(processed_rows, success_count, errors)，每块写入后调用
+    （后台任务用它更新进度并按块提交）
+    """
+    reader = iter_xls_chunks if filename.endswith('.xls') else iter_xlsx_chunks
+    try:
+        chunks = reader(fileobj, chunk_size)
+        columns, _ = next(chunks)
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=f'文件读取失败: {str(e)}')
+
+    # 验证必填字段
+    missing_columns = [col for col in REQUIRED_COLUMNS if col not in columns]
+    if missing_columns:
+        raise HTTPException(status_code=400, detail=f'缺少必填列: {", ".join(missing_columns)}')
+
+    processed_rows = 0
+    success_count = 0
+    errors = []
+    category_cache = {}
+    try:
+        for _, chunk in chunks:
+            processed_rows += len(chunk)
+            rows, chunk_errors = validate_chunk(chunk)
+            errors.extend(chunk_errors)
+            if rows.empty:
+                if on_chunk:
+                    on_chunk(processed_rows, success_count, errors)
+                continue
+            resolve_categories(db, user_id, rows['category_name'].dropna().unique(), category_cache)
+            records = rows.drop(columns=['category_name']).to_dict('records')
+            for record, category_name in zip(records, rows['category_name']):
+                record['user_id'] = user_id
+                record['category_id'] = category_cache.get(category_name)
+            db.execute(insert(Product), records)
+            stock_summary.add_inserted(db, records)
+            success_count += len(records)
+            if on_chunk:
+                on_chunk(processed_rows, success_count, errors)
+    except HTTPException:
+        db.rollback()
+        raise
+    except Exception as e:
+        db.rollback()
+        raise HTTPException(status_code=400, detail=f'导入失败: {str(e)}')
+
+    # 提交事务
+    if success_count > 0:
+        db.commit()
+
+    return ImportResult(
+        success_count=success_count,
+        error_count=len(errors),
+        errors=errors
+    )
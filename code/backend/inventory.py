@@ -0,0 +1,108 @@
+"""
+库存变动
+- 批量库存调整：一次查询加载并锁定全部商品，按行依次计算，批量写入库存流水
+- 调整后的商品统一评估库存预警（alerts.py）
+- 库存汇总（stock_summary.py）在会话 flush 时按商品库存变化自动维护
+以上函数只修改会话，由调用方统一提交事务
+"""
+from datetime import datetime
+
+from sqlalchemy import insert
+
+from db import Product, StockLog, lock_for_write
+import alerts
+import events
+import stock_summary  # noqa: F401  注册维护库存汇总的会话事件
+
+STOCK_TYPES = ('入库', '出库', '调整')
+
+def load_products(db, user_id: int, product_ids, lock: bool = True):
+    """按ID加载当前用户的商品（按ID顺序加锁，避免并发批量调整互相死锁），返回 {id: Product}"""
+    query = db.query(Product).filter(
+        Product.id.in_(set(product_ids)),
+        Product.user_id == user_id
+    ).order_by(Product.id)
+    if lock:
+        lock_for_write(db)
+        query = query.with_for_update()
+    return {p.id: p for p in query.all()}
+
+def next_stock(stock: int, type: str, change: int) -> int:
+    """计算变动后库存，不合法时抛出 ValueError"""
+    if type not in STOCK_TYPES:
+        raise ValueError(f'不支持的库存变动类型：{type}')
+    if change < 0:
+        raise ValueError('变动数量不能为负数')
+    if type == '入库':
+        return stock + change
+    if type == '出库':
+        if stock < change:
+            raise ValueError('库存不足')
+        return stock - change
+    return change
+
+def apply_stock_changes(db, user_id: int, changes, atomic: bool = True):
+    """
+    批量库存调整
+    changes: StockChange 列表，同一商品出现多次时按顺序累计
+    atomic: 为真时任一行失败则全部不执行
+    返回 (逐行结果列表, 是否有变更写入)
+    """
+    products = load_products(db, user_id, [c.product_id for c in changes])
+    stocks = {pid: p.stock for pid, p in products.items()}
+    results = []
+    for index, change in enumerate(changes):
+        result = {"index": index, "product_id": change.product_id, "type": change.type, "success": False}
+        results.append(result)
+        if change.product_id not in stocks:
+            result["error"] = '商品不存在'
+            continue
+        before = stocks[change.product_id]
+        try:
+            after = next_stock(before, change.type, change.change)
+        except ValueError as e:
+            result["error"] = str(e)
+            continue
+        stocks[change.product_id] = after
+        result.update(success=True, before_stock=before, after_stock=after)
+
+    failed = [r for r in results if not r["success"]]
+    applied = [(c, r) for c, r in zip(changes, results) if r["success"]]
+    if (atomic and failed) or not applied:
+        if atomic:
+            for r in results:
+                r["success"] = False
+        return results, False
+
+    now = datetime.utcnow()
+    # 失败的行不改变累计库存，只需写回成功行涉及的商品
+    touched = {c.product_id for c, _ in applied}
+    for pid in touched:
+        products[pid].stock = stocks[pid]
+        products[pid].updated_at = now
+
+    log_ids = db.execute(
+        insert(StockLog).returning(StockLog.id, sort_by_parameter_order=True),
+        [{
+            'product_id': c.product_id,
+            'user_id': user_id,
+            'change': c.change if c.type != '出库' else -c.change,
+            'type': c.type,
+            'before_stock': r["before_stock"],
+            'after_stock': r["after_stock"],
+            'reference_no': c.reference_no,
+            'timestamp': now
+        } for c, r in applied]
+    ).scalars().all()
+    for (_, r), log_id in zip(applied, log_ids):
+        r["log_id"] = log_id
+
+    events.emit(db, user_id, 'stock', [{
+        'product_id': c.product_id,
+        'type': c.type,
+        'change': c.change if c.type != '出库' else -c.change,
+        'stock': r["after_stock"],
+        'log_id': r["log_id"]
+    } for c, r in applied])
+    alerts.evaluate(db, user_id, [products[pid] for pid in touched])
+    return results, True
@@ -0,0 +1,336 @@
+"""
+后台任务子系统（大批量导入/导出）
+- 任务状态保存在 jobs 表中，接口提交后立即返回任务ID，前端轮询查询进度
+- 使用本地进程池执行任务，无需外部消息队列，单机即可运行
+- 导出文件保存在 JOB_DIR 目录下，任务完成后通过下载接口获取
+- 任务结束超过 JOB_RETENTION_HOURS 后删除其文件，导出任务标记为 expired；超过 JOB_HISTORY_DAYS 的任务记录删除
+  （服务启动和提交新任务时清理）
+"""
+import json
+import os
+import shutil
+import uuid
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime, timedelta
+
+from fastapi import HTTPException
+from fastapi.concurrency import run_in_threadpool
+
+from db import Job, SessionLocal
+from exporter import get_exporter, write_csv, write_excel
+from importer import import_products
+from models import ExportRequest, ImportResult, JobOut
+from pagination import invalidate_counts
+from stats import invalidate_dashboard
+import httpcache
+
+# 任务文件目录与进程池大小，可通过环境变量配置
+JOB_DIR = os.environ.get('ERP_JOB_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'job_files'))
+JOB_WORKERS = int(os.environ.get('ERP_JOB_WORKERS', '2'))
+# 任务文件保留小时数与任务记录保留天数
+JOB_RETENTION_HOURS = float(os.environ.get('ERP_JOB_RETENTION_HOURS', '24'))
+JOB_HISTORY_DAYS = float(os.environ.get('ERP_JOB_HISTORY_DAYS', '30'))
+# 导出任务每处理多少行更新一次进度
+PROGRESS_INTERVAL = 1000
+# 任务表中最多保存的错误信息条数（错误总数仍完整记录在 error_count 中）
+MAX_STORED_ERRORS = 1000
+
+_executor = None
+
+def get_executor():
+    """获取进程池（延迟创建，使用spawn方式避免继承父进程的数据库连接和线程）"""
+    global _executor
+    if _executor is None:
+        _executor = ProcessPoolExecutor(
+            max_workers=JOB_WORKERS,
+            mp_context=multiprocessing.get_context('spawn')
+        )
+    return _executor
+
+def shutdown_executor():
+    """关闭进程池"""
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
+
+def is_partial_import(job: Job) -> bool:
+    """导入任务失败时之前的数据块已提交（success_count 与数据在同一事务内提交）"""
+    return job.job_type == 'import' and job.status == 'failed' and (job.success_count or 0) > 0
+
+def _failure_message(job: Job, message: str) -> str:
+    if job.job_type == 'import' and (job.success_count or 0) > 0:
+        return f'部分导入：前 {job.processed_rows or 0} 行中已成功导入并保存 {job.success_count} 行，其余数据未导入。失败原因：{message}'
+    return message
+
+def recover_interrupted_jobs():
+    """服务启动时将上次未完成的任务标记为失败"""
+    db = SessionLocal()
+    try:
+        now = datetime.now()
+        for job in db.query(Job).filter(Job.status.in_(['pending', 'running'])):
+            job.status = 'failed'
+            job.message = _failure_message(job, '服务重启，任务已中断')
+            job.finished_at = now
+        db.commit()
+    finally:
+        db.close()
+
+def _remove_file(path):
+    if path and os.path.exists(path):
+        os.remove(path)
+
+def cleanup_expired_jobs():
+    """删除过期的任务文件（导出任务标记为 expired）和过期的任务记录，返回 (过期文件数, 删除记录数)"""
+    db = SessionLocal()
+    try:
+        now = datetime.now()
+        expired = db.query(Job).filter(
+            Job.status.in_(['completed', 'failed']),
+            Job.file_path.isnot(None),
+            Job.finished_at < now - timedelta(hours=JOB_RETENTION_HOURS)
+        ).all()
+        for job in expired:
+            _remove_file(job.file_path)
+            job.file_path = None
+            if job.job_type == 'export' and job.status == 'completed':
+                job.status = 'expired'
+                job.message = '导出文件已过期删除，请重新导出'
+        # 进行中的任务不删除
+        stale = db.query(Job).filter(
+            Job.status.notin_(['pending', 'running']),
+            Job.created_at < now - timedelta(days=JOB_HISTORY_DAYS)
+        ).all()
+        for job in stale:
+            _remove_file(job.file_path)
+            db.delete(job)
+        db.commit()
+        return len(expired), len(stale)
+    finally:
+        db.close()
+
+def job_to_out(job: Job) -> JobOut:
+    """任务记录转换为输出模型"""
+    return JobOut(
+        id=job.id,
+        job_type=job.job_type,
+        target=job.target,
+        format=job.format,
+        status=job.status,
+        processed_rows=job.processed_rows or 0,
+        success_count=job.success_count or 0,
+        error_count=job.error_count or 0,
+        errors=json.loads(job.errors) if job.errors else [],
+        partial=is_partial_import(job),
+        file_name=job.file_name,
+        message=job.message,
+        created_at=job.created_at,
+        finished_at=job.finished_at
+    )
+
+def get_user_job(db, job_id: str, user_id: int) -> Job:
+    """获取当前用户的任务"""
+    job = db.query(Job).filter(Job.id == job_id, Job.user_id == user_id).first()
+    if not job:
+        raise HTTPException(status_code=404, detail='任务不存在')
+    return job
+
+def _submit(job_id: str, func, on_finished=None):
+    """提交任务到进程池，任务进程异常退出时标记任务失败；on_finished 在任务结束后于主进程中调用"""
+    global _executor
+    try:
+        future = get_executor().submit(func, job_id)
+    except BrokenProcessPool:
+        # 进程池中有进程异常退出后进程池不可再用，重建后重新提交
+        _executor = None
+        future = get_executor().submit(func, job_id)
+
+    def on_done(f):
+        error = f.exception()
+        if error is not None:
+            _finish_job(job_id, 'failed', message=f'任务执行失败: {error}')
+        if on_finished is not None:
+            on_finished()
+
+    future.add_done_callback(on_done)
+
+def save_upload(upload, name: str) -> str:
+    """将上传的Excel文件保存到 JOB_DIR，返回文件路径"""
+    os.makedirs(JOB_DIR, exist_ok=True)
+    ext = '.xls' if upload.filename.endswith('.xls') else '.xlsx'
+    path = os.path.join(JOB_DIR, f'{name}_upload{ext}')
+    with open(path, 'wb') as f:
+        shutil.copyfileobj(upload.file, f)
+    return path
+
+def submit_import_job(db, user_id: int, upload) -> Job:
+    """保存上传文件并提交商品导入任务"""
+    cleanup_expired_jobs()
+    job_id = uuid.uuid4().hex
+    path = save_upload(upload, job_id)
+
+    job = Job(
+        id=job_id,
+        user_id=user_id,
+        job_type='import',
+        target='products',
+        format='excel',
+        status='pending',
+        file_path=path,
+        file_name=upload.filename
+    )
+    db.add(job)
+    db.commit()
+
+    def on_finished():
+        # 导入在工作进程中写入，缓存和条件请求版本在主进程中更新
+        invalidate_dashboard(user_id)
+        invalidate_counts(user_id)
+        httpcache.bump(user_id, 'products', 'notifications')
+        httpcache.bump(httpcache.GLOBAL, 'categories')
+
+    _submit(job_id, run_import_job, on_finished)
+    return job
+
+def _import_upload(user_id: int, upload) -> ImportResult:
+    db = SessionLocal()
+    try:
+        return import_products(db, user_id, upload.file, upload.filename)
+    finally:
+        db.close()
+
+async def import_in_thread(user_id: int, upload) -> ImportResult:
+    """
+    即时导入：解析与写入在线程池中执行，不阻塞事件循环
+    （pandas/openpyxl 的大部分计算会释放GIL；即时导入的文件较小，启动任务进程的开销远大于导入本身，
+    大批量导入应提交后台任务，在进程池中执行）
+    """
+    return await run_in_threadpool(_import_upload, user_id, upload)
+
+def submit_export_job(db, user_id: int, request: ExportRequest) -> Job:
+    """提交导出任务"""
+    # 提前校验导出类型，不支持的类型直接返回400
+    get_exporter(request.export_type)
+    cleanup_expired_jobs()
+
+    job = Job(
+        id=uuid.uuid4().hex,
+        user_id=user_id,
+        job_type='export',
+        target=request.export_type,
+        format='csv' if request.format == 'csv' else 'excel',
+        params=json.dumps(request.filters or {}, ensure_ascii=False),
+        status='pending'
+    )
+    db.add(job)
+    db.commit()
+    _submit(job.id, run_export_job)
+    return job
+
+def _finish_job(job_id: str, status: str, message: str = None, **fields):
+    """使用独立会话写入任务最终状态"""
+    db = SessionLocal()
+    try:
+        job = db.get(Job, job_id)
+        if job is None or job.status in ('completed', 'failed', 'expired'):
+            return
+        for key, value in fields.items():
+            setattr(job, key, value)
+        job.status = status
+        job.message = _failure_message(job, message) if status == 'failed' else message
+        job.finished_at = datetime.now()
+        db.commit()
+    finally:
+        db.close()
+
+def run_import_job(job_id: str):
+    """
+    在任务进程中执行商品导入，每块数据写入后提交并更新进度
+    进度与该块数据在同一事务内提交，中途失败时已提交的块保留，任务标记为失败并注明部分导入的行数
+    """
+    db = SessionLocal()
+    upload_path = None
+    try:
+        job = db.get(Job, job_id)
+        upload_path = job.file_path
+        job.status = 'running'
+        db.commit()
+
+        def on_chunk(processed_rows, success_count, errors):
+            job.processed_rows = processed_rows
+            job.success_count = success_count
+            job.error_count = len(errors)
+            job.errors = json.dumps(errors[:MAX_STORED_ERRORS], ensure_ascii=False)
+            db.commit()
+
+        with open(upload_path, 'rb') as f:
+            result = import_products(db, job.user_id, f, upload_path, on_chunk=on_chunk)
+
+        job.status = 'completed'
+        job.success_count = result.success_count
+        job.error_count = result.error_count
+        job.errors = json.dumps(result.errors[:MAX_STORED_ERRORS], ensure_ascii=False)
+        job.message = f'导入完成：成功 {result.success_count} 行，失败 {result.error_count} 行'
+        job.file_path = None
+        job.finished_at = datetime.now()
+        db.commit()
+    except Exception as e:
+        db.rollback()
+        detail = e.detail if isinstance(e, HTTPException) else str(e)
+        _finish_job(job_id, 'failed', message=detail)
+    finally:
+        db.close()
+        # 导入完成后删除上传的临时文件
+        if upload_path and os.path.exists(upload_path):
+            os.remove(upload_path)
+
+def run_export_job(job_id: str):
+    """在任务进程中执行导出，文件写入 JOB_DIR，按批次更新进度"""
+    db = SessionLocal()
+    path = None
+    try:
+        job = db.get(Job, job_id)
+        job.status = 'running'
+        db.commit()
+
+        filename_prefix, sheet_name, columns, iter_rows = get_exporter(job.target)
+        filters = json.loads(job.params) if job.params else {}
+        ext = 'csv' if job.format == 'csv' else 'xlsx'
+        os.makedirs(JOB_DIR, exist_ok=True)
+        path = os.path.join(JOB_DIR, f'{job_id}.{ext}')
+
+        def counted(rows):
+            # 导出读取按页完成，页与页之间提交进度不会与读查询冲突
+            count = 0
+            for row in rows:
+                yield row
+                count += 1
+                if count % PROGRESS_INTERVAL == 0:
+                    job.processed_rows = count
+                    db.commit()
+            job.processed_rows = count
+
+        rows = counted(iter_rows(db, job.user_id, filters))
+        if ext == 'csv':
+            write_csv(path, columns, rows)
+        else:
+            write_excel(path, sheet_name, columns, rows)
+
+        job.status = 'completed'
+        job.success_count = job.processed_rows
+        job.file_path = path
+        job.file_name = f'{filename_prefix}_{datetime.now().strftime("%Y%m%d_%H%M%S")}.{ext}'
+        job.message = f'导出完成：共 {job.processed_rows} 行'
+        job.finished_at = datetime.now()
+        db.commit()
+    except Exception as e:
+        db.rollback()
+        # 删除未写完的导出文件
+        if path and os.path.exists(path):
+            os.remove(path)
+        detail = e.detail if isinstance(e, HTTPException) else str(e)
+        _finish_job(job_id, 'failed', message=detail)
+    finally:
+        db.close()
@@ -1,16 +1,45 @@
-from fastapi import FastAPI, Depends, HTTPException, Query, UploadFile, File
-from fastapi.responses import StreamingResponse
-from sqlalchemy.orm import Session, joinedload
-from sqlalchemy import and_, or_, desc, asc, func
-from db import User, Category, Product, StockLog, SystemNotification, SalesOrder, SalesOrderItem, SessionLocal
+from fastapi import FastAPI, Depends, HTTPException, Query, UploadFile, File, Request
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse, FileResponse, Response
+from sqlalchemy.orm import Session, joinedload, selectinload
+from sqlalchemy import and_, or_, desc, asc, func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from db import User, Category, Product, StockLog, SystemNotification, SalesOrder, SalesOrderItem, Job, DailySales, DailyProductSales, StockAlert, SessionLocal, engine, get_db, lock_for_write
+from async_db import async_engine, get_async_db
 from models import *
 from fastapi.middleware.cors import CORSMiddleware
-from typing import List, Optional
+from typing import List, Optional, Union
 from datetime import datetime, timedelta, date
 from fastapi.security import OAuth2PasswordRequestForm
-from auth import create_access_token, get_current_user
+from auth import (
+    create_access_token, get_current_user, get_current_user_async, get_admin_user, oauth2_scheme,
+    create_event_token, authenticate_event_token, EVENT_TOKEN_EXPIRE_SECONDS
+)
+from exporter import export_response
+import migrate
+import rollup
+import stock_summary
+from stats import product_stock_summary, order_sales_summary, cached_async, invalidate_dashboard
+from jobs import import_in_thread, submit_import_job, submit_export_job, get_user_job, job_to_out, recover_interrupted_jobs, cleanup_expired_jobs, shutdown_executor
+from filters import product_conditions, sales_order_conditions, stock_log_conditions
+from search import order_products_by_relevance, order_orders_by_relevance
+from inventory import apply_stock_changes
+import alerts
+import events
+import metrics
+import slowlog
+import httpcache
+from compression import CompressionMiddleware, COMPRESSION_ENABLED
+from context import RequestContextMiddleware
+from orders import create_order, create_orders, generate_order_nos, summarize_orders, ORDER_SUMMARY_COLUMNS
+from pagination import keyset_paginate, cursor_page, cached_count, count_rows, invalidate_counts
+from serializers import FastJSONResponse, serialize_many, columns_for, rows_to_dicts
 import pandas as pd
+import asyncio
 import io
+import json
+import os
+import time
 import uuid
 from openpyxl import Workbook
 from openpyxl.styles import Font, PatternFill, Alignment
@@ -26,38 +55,41 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-def get_db():
-    """获取数据库会话"""
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
+# 条件请求的 ETag/Last-Modified 响应头（须在请求上下文内层）
+app.add_middleware(httpcache.CacheHeadersMiddleware)
+
+# 较大的 JSON 响应按 Accept-Encoding 压缩（br/gzip）
+if COMPRESSION_ENABLED:
+    app.add_middleware(CompressionMiddleware)
+
+# 请求耗时与SQL监控（ERP_METRICS=1 时启用，须在声明路由之前安装）
+if metrics.METRICS_ENABLED:
+    metrics.install(app, [engine, async_engine.sync_engine])
+
+# 请求上下文（路由、用户、SQL统计），供慢查询日志、监控等读取；最后添加，位于最外层
+app.add_middleware(RequestContextMiddleware)
+
+# 慢查询日志（ERP_SLOW_QUERY_LOG=1 时启用）
+if slowlog.SLOW_QUERY_LOG_ENABLED:
+    slowlog.install([engine, async_engine.sync_engine])
+
+@app.on_event("startup")
+def on_startup():
+    """服务启动：执行数据库迁移，清理上次中断和过期的后台任务，必要时初始化销售汇总和库存汇总"""
+    migrate.upgrade()
+    recover_interrupted_jobs()
+    cleanup_expired_jobs()
+    rollup.ensure_built()
+    stock_summary.ensure_built()
+
+@app.on_event("shutdown")
+def on_shutdown():
+    """服务关闭：停止后台任务进程池"""
+    shutdown_executor()
 
 def generate_order_no():
-    """生成订单号"""
-    return f"SO{datetime.now().strftime('%Y%m%d%H%M%S')}{uuid.uuid4().hex[:4].upper()}"
-
-def check_and_create_notification(db: Session, user_id: int, product: Product):
-    """检查库存并创建预警通知"""
-    if product.stock <= product.min_stock:
-        # 检查是否已有未读的同类通知
-        existing = db.query(SystemNotification).filter(
-            SystemNotification.user_id == user_id,
-            SystemNotification.type == 'warning',
-            SystemNotification.title.contains(product.name),
-            SystemNotification.is_read == False
-        ).first()
-        
-        if not existing:
-            notification = SystemNotification(
-                user_id=user_id,
-                type='warning',
-                title=f'商品 {product.name} 库存预警',
-                content=f'商品 {product.name} 当前库存为 {product.stock}，已低于最低库存 {product.min_stock}，请及时补货！'
-            )
-            db.add(notification)
-            db.commit()
+    """生成订单号（由编号序列分配，不会重复）"""
+    return generate_order_nos(1)[0]
 
 # ================================
 # 用户认证相关接口
@@ -82,12 +114,14 @@ def register(user: UserCreate, db: Session = Depends(get_db)):
     return {"msg": "注册成功", "user_id": db_user.id}
 
 @app.post('/api/token', summary="用户登录")
-async def login(form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(get_db)):
-    """用户登录接口，返回JWT token"""
-    db_user = db.query(User).filter(
-        User.username == form_data.username, 
-        User.password == form_data.password
-    ).first()
+async def login(form_data: OAuth2PasswordRequestForm = Depends(), db: AsyncSession = Depends(get_async_db)):
+    """用户登录接口，返回JWT token（异步查询，不阻塞事件循环）"""
+    db_user = (await db.execute(
+        select(User.id, User.username).where(
+            User.username == form_data.username,
+            User.password == form_data.password
+        )
+    )).first()
     
     if not db_user:
         raise HTTPException(
@@ -108,14 +142,15 @@ async def login(form_data: OAuth2PasswordRequestForm = Depends(), db: Session =
 # 分类管理接口（仅一级分类）
 # ================================
 
-@app.get('/api/categories', response_model=List[CategoryOut], summary="获取分类列表")
+@app.get('/api/categories', response_model=List[CategoryOut], summary="获取分类列表",
+         dependencies=[Depends(httpcache.conditional('categories'))])
 def get_categories(db: Session = Depends(get_db)):
     """
     获取所有商品分类（一级分类，平铺结构）
     返回：分类列表
     """
-    categories = db.query(Category).order_by(Category.id).all()
-    return [CategoryOut.model_validate(c) for c in categories]
+    categories = db.query(*columns_for(CategoryOut, Category)).order_by(Category.id).all()
+    return FastJSONResponse(rows_to_dicts(categories))
 
 @app.post('/api/categories', response_model=CategoryOut, summary="创建分类")
 def create_category(category: CategoryCreate, db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
@@ -131,6 +166,9 @@ def create_category(category: CategoryCreate, db: Session = Depends(get_db), cur
     )
     db.add(db_category)
     db.commit()
+    invalidate_dashboard()
+    invalidate_counts()
+    httpcache.bump(httpcache.GLOBAL, 'categories')
     db.refresh(db_category)
     return CategoryOut.model_validate(db_category)
 
@@ -148,6 +186,9 @@ def update_category(category_id: int, category: CategoryUpdate, db: Session = De
     db_category.description = category.description
     db_category.updated_at = datetime.now()
     db.commit()
+    invalidate_dashboard()
+    invalidate_counts()
+    httpcache.bump(httpcache.GLOBAL, 'categories')
     db.refresh(db_category)
     return CategoryOut.model_validate(db_category)
 
@@ -167,6 +208,9 @@ def delete_category(category_id: int, db: Session = Depends(get_db)):
         raise HTTPException(status_code=400, detail=f'该分类下还有 {product_count} 个商品，无法删除')
     db.delete(db_category)
     db.commit()
+    invalidate_dashboard()
+    invalidate_counts()
+    httpcache.bump(httpcache.GLOBAL, 'categories')
     return {"msg": "删除成功"}
 
 @app.get('/api/categories/{category_id}/stats', response_model=CategoryStats, summary="获取分类统计")
@@ -184,40 +228,39 @@ def get_category_stats(
     if not category:
         raise HTTPException(status_code=404, detail='分类不存在')
     
-    # 统计该分类下的商品
-    stats = db.query(
-        func.count(Product.id).label('product_count'),
-        func.sum(Product.stock).label('total_stock'),
-        func.sum(Product.stock * Product.price).label('total_value')
-    ).filter(
-        Product.category_id == category_id,
-        Product.user_id == current_user.id
-    ).first()
+    # 读取库存汇总表，不扫描商品
+    stats = stock_summary.totals(db, current_user.id, category_id)
     
     return CategoryStats(
         category_name=category.name,
-        product_count=stats.product_count or 0,
-        total_stock=stats.total_stock or 0,
-        total_value=stats.total_value or 0
+        product_count=stats.product_count,
+        total_stock=stats.total_stock,
+        total_value=stats.stock_value,
+        total_cost_value=stats.cost_value,
+        sufficient=stats.sufficient_count,
+        normal=stats.normal_count,
+        warning=stats.warning_count,
+        out_of_stock=stats.out_of_stock_count
     )
 
 
 
+# 允许游标分页的排序字段（非空字段，保证顺序稳定）
+PRODUCT_CURSOR_SORTS = ('created_at', 'updated_at', 'name', 'price', 'stock', 'id')
+ORDER_CURSOR_SORTS = ('created_at', 'total_amount', 'order_no', 'id')
+STOCK_LOG_CURSOR_SORTS = ('timestamp', 'change', 'id')
+
 @app.post('/api/products/query', response_model=dict, summary="高级商品查询")
 def query_products(
     query: ProductQuery,
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
-    """高级商品查询接口，支持多条件筛选和排序"""
-    # 构建查询
-    q = db.query(Product).filter(Product.user_id == current_user.id)
+    """高级商品查询接口，支持多条件筛选和排序；paging=cursor 时使用游标分页"""
+    # 构建查询（名称关键词走全文索引，匹配名称、描述、SKU）
+    q = db.query(Product).filter(*product_conditions(current_user.id, query.name, query.category_id))
     
     # 应用筛选条件
-    if query.name:
-        q = q.filter(Product.name.contains(query.name))
-    if query.category_id:
-        q = q.filter(Product.category_id == query.category_id)
     if query.min_price is not None:
         q = q.filter(Product.price >= query.min_price)
     if query.max_price is not None:
@@ -227,11 +270,24 @@ def query_products(
     if query.max_stock is not None:
         q = q.filter(Product.stock <= query.max_stock)
     
-    # 获取总数
-    total = q.count()
+    # 游标分页
+    if query.paging == 'cursor' or query.cursor:
+        products, next_cursor = keyset_paginate(
+            q.options(joinedload(Product.category)), Product, query.sort_by or 'created_at',
+            query.sort_order, query.cursor, query.page_size, PRODUCT_CURSOR_SORTS
+        )
+        total = count_rows(q) if query.with_total else None
+        return FastJSONResponse(cursor_page(serialize_many(ProductOut, products), next_cursor, query.page_size, total))
+
+    # 获取总数（翻页时复用第一页的统计结果）
+    count_key = ('products', current_user.id, query.name, query.category_id, query.min_price,
+                 query.max_price, query.min_stock, query.max_stock)
+    total = cached_count(count_key, q, refresh=query.page <= 1)
     
-    # 应用排序
-    if query.sort_by:
+    # 应用排序（relevance 按搜索相关度）
+    if query.sort_by == 'relevance':
+        q = order_products_by_relevance(q, query.name)
+    elif query.sort_by:
         order_column = getattr(Product, query.sort_by, Product.created_at)
         if query.sort_order == 'asc':
             q = q.order_by(asc(order_column))
@@ -242,26 +298,96 @@ def query_products(
     offset = (query.page - 1) * query.page_size
     products = q.options(joinedload(Product.category)).offset(offset).limit(query.page_size).all()
     
-    return {
-        "items": [ProductOut.model_validate(p) for p in products],
+    return FastJSONResponse({
+        "items": serialize_many(ProductOut, products),
         "total": total,
         "page": query.page,
         "page_size": query.page_size,
         "total_pages": (total + query.page_size - 1) // query.page_size
-    }
+    })
+
+# 商品列表可选返回字段（fields 参数），只查询所需的列
+PRODUCT_LIST_FIELDS = {
+    'id': Product.id,
+    'name': Product.name,
+    'sku': Product.sku,
+    'description': Product.description,
+    'price': Product.price,
+    'cost_price': Product.cost_price,
+    'stock': Product.stock,
+    'min_stock': Product.min_stock,
+    'unit': Product.unit,
+    'category_id': Product.category_id,
+    'category_name': Category.name,
+    'sales_count': Product.sales_count,
+    'created_at': Product.created_at,
+    'updated_at': Product.updated_at,
+}
 
-@app.get('/api/products', response_model=List[ProductOut], summary="获取商品列表")
+def parse_product_fields(fields: str):
+    """解析 fields 参数为字段名列表"""
+    names = list(dict.fromkeys(f.strip() for f in fields.split(',') if f.strip()))
+    unknown = [f for f in names if f not in PRODUCT_LIST_FIELDS]
+    if unknown or not names:
+        raise HTTPException(
+            status_code=400,
+            detail=f'不支持的字段: {", ".join(unknown) or fields}，可选：{", ".join(PRODUCT_LIST_FIELDS)}'
+        )
+    return names
+
+@app.get('/api/products', response_model=dict, summary="获取商品列表",
+         dependencies=[Depends(httpcache.conditional('products', 'categories'))])
 def get_products(
     name: str = Query(None),
+    category_id: Optional[int] = None,
+    in_stock: bool = Query(False, description="只返回有库存的商品"),
+    fields: Optional[str] = Query(None, description="逗号分隔的返回字段，如 id,name,sku,stock,price；为空时返回完整商品信息"),
+    sort_by: Optional[str] = Query(None, description="排序字段，带 name 时默认 relevance（相关度），否则默认 id"),
+    sort_order: str = Query('asc'),
+    cursor: Optional[str] = Query(None, description="上一页返回的 next_cursor"),
+    page: int = Query(1, ge=1, description="按相关度排序时的页码"),
+    page_size: int = Query(50, ge=1, le=1000),
+    with_total: bool = False,
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
-  
-    query = db.query(Product).filter(Product.user_id == current_user.id)
-    if name:
-        query = query.filter(Product.name.contains(name))
-    products = query.options(joinedload(Product.category)).all()
-    return [ProductOut.model_validate(p) for p in products]
+    """
+    分页获取商品列表（下拉框、选择器使用）
+    指定 fields 时只查询这些列并直接返回字典，不加载ORM对象；否则返回完整商品信息（含分类）
+    按字段排序使用游标分页，按相关度排序使用页码分页
+    """
+    conditions = product_conditions(current_user.id, name, category_id)
+    if in_stock:
+        conditions.append(Product.stock > 0)
+    sort_by = sort_by or ('relevance' if name and name.strip() else 'id')
+    if sort_by == 'relevance' and not (name and name.strip()):
+        raise HTTPException(status_code=400, detail='按相关度排序需要提供 name')
+
+    if fields:
+        names = parse_product_fields(fields)
+        # 游标需要 id 和排序字段，未请求时也一并查询
+        selected = list(dict.fromkeys(names + ['id'] + ([sort_by] if sort_by in PRODUCT_LIST_FIELDS else [])))
+        query = db.query(*[PRODUCT_LIST_FIELDS[f].label(f) for f in selected])
+        if 'category_name' in selected:
+            query = query.outerjoin(Category, Category.id == Product.category_id)
+        query = query.filter(*conditions)
+
+        def serialize(rows):
+            return [{f: getattr(row, f) for f in names} for row in rows]
+    else:
+        query = db.query(Product).filter(*conditions).options(joinedload(Product.category))
+
+        def serialize(rows):
+            return serialize_many(ProductOut, rows)
+
+    total = count_rows(db.query(Product.id).filter(*conditions)) if with_total else None
+    if sort_by == 'relevance':
+        rows = order_products_by_relevance(query, name).offset((page - 1) * page_size).limit(page_size + 1).all()
+        result = cursor_page(serialize(rows[:page_size]), None, page_size, total)
+        result.update(has_more=len(rows) > page_size, page=page)
+        return FastJSONResponse(result)
+    rows, next_cursor = keyset_paginate(query, Product, sort_by, sort_order, cursor, page_size, PRODUCT_CURSOR_SORTS)
+    return FastJSONResponse(cursor_page(serialize(rows), next_cursor, page_size, total))
 
 @app.post('/api/products', response_model=ProductOut, summary="创建商品")
 def create_product(
@@ -279,12 +405,15 @@ def create_product(
         user_id=current_user.id
     )
     db.add(db_product)
+    db.flush()
+    # 检查库存预警，与商品在同一事务内提交
+    alerts.evaluate(db, current_user.id, [db_product])
     db.commit()
+    invalidate_dashboard(current_user.id)
+    invalidate_counts(current_user.id)
+    httpcache.bump(current_user.id, 'products', 'notifications')
     db.refresh(db_product)
     
-    # 检查库存预警
-    check_and_create_notification(db, current_user.id, db_product)
-    
     return db_product
 
 @app.put('/api/products/{product_id}', response_model=ProductOut, summary="更新商品")
@@ -295,24 +424,32 @@ def update_product(
     current_user: User = Depends(get_current_user)
 ):
     """更新商品信息"""
+    lock_for_write(db)
     db_product = db.query(Product).filter(
         Product.id == product_id,
         Product.user_id == current_user.id
-    ).first()
+    ).with_for_update().first()
     
     if not db_product:
         raise HTTPException(status_code=404, detail='商品不存在')
     
+    old_category_id = db_product.category_id
     for key, value in product.dict().items():
         setattr(db_product, key, value)
     
+    # 分类变更时同步销售汇总中的分类
+    if db_product.category_id != old_category_id:
+        rollup.move_product_category(db, db_product.id, db_product.category_id)
+    
     db_product.updated_at = datetime.utcnow()
+    # 检查库存预警，与商品修改在同一事务内提交
+    alerts.evaluate(db, current_user.id, [db_product])
     db.commit()
+    invalidate_dashboard(current_user.id)
+    invalidate_counts(current_user.id)
+    httpcache.bump(current_user.id, 'products', 'notifications')
     db.refresh(db_product)
     
-    # 检查库存预警
-    check_and_create_notification(db, current_user.id, db_product)
-    
     return db_product
 
 @app.delete('/api/products/{product_id}', summary="删除商品")
@@ -330,15 +467,20 @@ def delete_product(
     if not db_product:
         raise HTTPException(status_code=404, detail='商品不存在')
     
+    rollup.remove_product(db, db_product.id)
+    alerts.remove_product(db, db_product.id)
     db.delete(db_product)
     db.commit()
+    invalidate_dashboard(current_user.id)
+    invalidate_counts(current_user.id)
+    httpcache.bump(current_user.id, 'products', 'notifications')
     return {"msg": "删除成功"}
 
 # ================================
 # 销售订单管理接口
 # ================================
 
-@app.get('/api/sales-orders', response_model=dict, summary="获取销售订单列表")
+@app.get('/api/sales-orders', response_model=Union[SalesOrderPage, SalesOrderSummaryPage], summary="获取销售订单列表")
 def get_sales_orders(
     status: Optional[str] = None,
     order_no: Optional[str] = None,
@@ -349,36 +491,75 @@ def get_sales_orders(
     sort_order: str = 'desc',
     page: int = 1,
     page_size: int = 20,
+    paging: str = Query('page', description="分页方式：page 页码分页，cursor 游标分页"),
+    cursor: Optional[str] = Query(None, description="游标分页时传入上一页返回的 next_cursor"),
+    with_total: bool = Query(False, description="游标分页时是否统计总数"),
+    view: str = Query('full', description="full 完整订单（明细含商品信息），summary 订单头和明细摘要"),
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
-    """获取销售订单列表，支持多条件搜索、排序、分页"""
-    query = db.query(SalesOrder).filter(SalesOrder.user_id == current_user.id)
-    if status:
-        query = query.filter(SalesOrder.status == status)
-    if order_no:
-        query = query.filter(SalesOrder.order_no.contains(order_no))
-    if customer:
-        query = query.filter(or_(SalesOrder.customer_name.contains(customer), SalesOrder.customer_phone.contains(customer)))
-    if start_time:
-        query = query.filter(SalesOrder.created_at >= start_time)
-    if end_time:
-        query = query.filter(SalesOrder.created_at <= end_time)
-    total = query.count()
+    """
+    获取销售订单列表，支持多条件搜索、排序、分页
+    view=summary 时订单头按列查询，明细只返回商品ID、名称、编码、数量和价格（一次查询加载），
+    完整信息通过 GET /api/sales-orders/{order_id} 获取
+    """
+    if view not in ('full', 'summary'):
+        raise HTTPException(status_code=400, detail='view 只支持 full 或 summary')
+    conditions = sales_order_conditions(current_user.id, status, order_no, customer, start_time, end_time)
+    if view == 'summary':
+        query = db.query(*ORDER_SUMMARY_COLUMNS).filter(*conditions)
+        full_graph = []
+
+        def serialize(orders):
+            return summarize_orders(db, orders)
+    else:
+        query = db.query(SalesOrder).filter(*conditions)
+        full_graph = [joinedload(SalesOrder.order_items).joinedload(SalesOrderItem.product).joinedload(Product.category)]
+
+        def serialize(orders):
+            return serialize_many(SalesOrderOut, orders)
+
+    if paging == 'cursor' or cursor:
+        orders, next_cursor = keyset_paginate(
+            query.options(*full_graph), SalesOrder, sort_by, sort_order, cursor, page_size, ORDER_CURSOR_SORTS
+        )
+        total = count_rows(query) if with_total else None
+        return FastJSONResponse(cursor_page(serialize(orders), next_cursor, page_size, total))
+    count_key = ('sales_orders', current_user.id, status, order_no, customer, start_time, end_time)
+    total = cached_count(count_key, query, refresh=page <= 1)
     order_column = getattr(SalesOrder, sort_by, SalesOrder.created_at)
-    if sort_order == 'asc':
+    if sort_by == 'relevance':
+        query = order_orders_by_relevance(query, order_no, customer)
+    elif sort_order == 'asc':
         query = query.order_by(asc(order_column))
     else:
         query = query.order_by(desc(order_column))
     offset = (page - 1) * page_size
-    orders = query.options(joinedload(SalesOrder.order_items).joinedload(SalesOrderItem.product)).offset(offset).limit(page_size).all()
-    return {
-        "items": [SalesOrderOut.model_validate(order) for order in orders],
+    orders = query.options(*full_graph).offset(offset).limit(page_size).all()
+    return FastJSONResponse({
+        "items": serialize(orders),
         "total": total,
         "page": page,
         "page_size": page_size,
         "total_pages": (total + page_size - 1) // page_size
-    }
+    })
+
+@app.get('/api/sales-orders/{order_id}', response_model=SalesOrderOut, summary="获取销售订单详情")
+def get_sales_order(
+    order_id: int,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """获取订单完整信息（明细含商品及分类）"""
+    order = db.query(SalesOrder).filter(
+        SalesOrder.id == order_id,
+        SalesOrder.user_id == current_user.id
+    ).options(
+        joinedload(SalesOrder.order_items).joinedload(SalesOrderItem.product).joinedload(Product.category)
+    ).first()
+    if not order:
+        raise HTTPException(status_code=404, detail='订单不存在')
+    return FastJSONResponse(serialize_many(SalesOrderOut, [order])[0])
 
 @app.post('/api/sales-orders', response_model=SalesOrderOut, summary="创建销售订单")
 def create_sales_order(
@@ -386,84 +567,55 @@ def create_sales_order(
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
-    """创建销售订单"""
+    """创建销售订单（商品一次查询加锁，明细与流水批量写入，整单一次提交）"""
     try:
-        # 生成订单号
-        order_no = generate_order_no()
-        
-        # 创建订单
-        db_order = SalesOrder(
-            user_id=current_user.id,
-            order_no=order_no,
-            customer_name=order.customer_name,
-            customer_phone=order.customer_phone,
-            notes=order.notes,
-            status='pending',
-            total_amount=0
-        )
-        db.add(db_order)
-        db.flush()
-        
-        total_amount = 0
-        
-        # 创建订单明细并更新库存
-        for item in order.items:
-            # 获取商品信息
-            product = db.query(Product).filter(
-                Product.id == item.product_id,
-                Product.user_id == current_user.id
-            ).with_for_update().first()
-            
-            if not product:
-                raise HTTPException(status_code=404, detail=f'商品ID {item.product_id} 不存在')
-            
-            if product.stock < item.quantity:
-                raise HTTPException(status_code=400, detail=f'商品 {product.name} 库存不足，当前库存：{product.stock}')
-            
-            # 创建订单明细
-            order_item = SalesOrderItem(
-                order_id=db_order.id,
-                product_id=item.product_id,
-                quantity=item.quantity,
-                unit_price=item.unit_price,
-                total_price=item.quantity * item.unit_price
-            )
-            db.add(order_item)
-            
-            total_amount += order_item.total_price
-            
-            # 更新商品库存和销量
-            before_stock = product.stock
-            product.stock -= item.quantity
-            product.sales_count += item.quantity
-            
-            # 记录库存流水
-            stock_log = StockLog(
-                product_id=product.id,
-                user_id=current_user.id,
-                change=-item.quantity,
-                type='销售',
-                before_stock=before_stock,
-                after_stock=product.stock,
-                reference_no=order_no,
-                timestamp=datetime.utcnow()
-            )
-            db.add(stock_log)
-            
-            # 检查库存预警
-            check_and_create_notification(db, current_user.id, product)
-        
-        # 更新订单总金额
-        db_order.total_amount = total_amount
-        
+        order_id = create_order(db, current_user.id, order, generate_order_no())
         db.commit()
-        db.refresh(db_order)
+        invalidate_dashboard(current_user.id)
+        invalidate_counts(current_user.id)
+        httpcache.bump(current_user.id, 'orders', 'products', 'notifications')
+        # 一次加载明细及商品，避免逐行懒加载
+        db_order = db.query(SalesOrder).options(
+            selectinload(SalesOrder.order_items).joinedload(SalesOrderItem.product).joinedload(Product.category)
+        ).filter(SalesOrder.id == order_id).one()
         
         return SalesOrderOut.model_validate(db_order)
     except Exception as e:
         db.rollback()
         raise HTTPException(status_code=400, detail=str(e))
 
+# 批量导入订单单次上限
+MAX_BULK_ORDERS = int(os.environ.get('ERP_MAX_BULK_ORDERS', '5000'))
+
+@app.post('/api/sales-orders/bulk', summary="批量导入销售订单")
+def create_sales_orders_bulk(
+    bulk: SalesOrderBulkCreate,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """批量创建销售订单：统一校验并预留库存，逐单返回结果，成功的订单一次提交"""
+    if not bulk.orders:
+        raise HTTPException(status_code=400, detail='订单列表不能为空')
+    if len(bulk.orders) > MAX_BULK_ORDERS:
+        raise HTTPException(status_code=400, detail=f'单次最多提交 {MAX_BULK_ORDERS} 个订单')
+    try:
+        results = create_orders(db, current_user.id, bulk.orders, generate_order_nos(len(bulk.orders)))
+        db.commit()
+    except Exception as e:
+        db.rollback()
+        raise HTTPException(status_code=400, detail=str(e))
+    success_count = sum(1 for r in results if r["success"])
+    if success_count:
+        invalidate_dashboard(current_user.id)
+        invalidate_counts(current_user.id)
+        httpcache.bump(current_user.id, 'orders', 'products', 'notifications')
+    return {
+        "msg": "批量导入完成",
+        "success_count": success_count,
+        "error_count": len(results) - success_count,
+        "results": results
+    }
+
 @app.put('/api/sales-orders/{order_id}', response_model=SalesOrderOut, summary="更新订单状态")
 def update_sales_order(
     order_id: int,
@@ -481,11 +633,23 @@ def update_sales_order(
         raise HTTPException(status_code=404, detail='订单不存在')
     
     if update.status:
+        # 取消或恢复订单时同步每日销售汇总
+        rollup.on_status_change(db, db_order, db_order.status, update.status)
         db_order.status = update.status
     if update.notes is not None:
         db_order.notes = update.notes
     
+    events.emit(db, current_user.id, 'order', [{
+        'id': db_order.id,
+        'order_no': db_order.order_no,
+        'customer_name': db_order.customer_name,
+        'total_amount': db_order.total_amount,
+        'status': db_order.status
+    }])
     db.commit()
+    invalidate_dashboard(current_user.id)
+    invalidate_counts(current_user.id)
+    httpcache.bump(current_user.id, 'orders', 'products', 'notifications')
     db.refresh(db_order)
     
     return db_order
@@ -499,55 +663,60 @@ def change_stock(
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
-    """库存调整（入库/出库/调整）"""
+    """库存调整（入库/出库/调整），与批量调整使用同一校验和写入逻辑"""
     try:
-        db_product = db.query(Product).filter(
-            Product.id == stock.product_id,
-            Product.user_id == current_user.id
-        ).with_for_update().first()
-        
-        if not db_product:
-            raise HTTPException(status_code=404, detail='商品不存在')
-        
-        # 记录变动前库存
-        before_stock = db_product.stock
-        
-        # 更新库存
-        if stock.type == '入库':
-            db_product.stock += stock.change
-        elif stock.type == '出库':
-            if db_product.stock < stock.change:
-                raise HTTPException(status_code=400, detail='库存不足')
-            db_product.stock -= stock.change
-        else:  # 调整
-            db_product.stock = stock.change
-        
-        # 记录库存流水
-        db_log = StockLog(
-            product_id=stock.product_id,
-            user_id=current_user.id,
-            change=stock.change if stock.type != '出库' else -stock.change,
-            type=stock.type,
-            before_stock=before_stock,
-            after_stock=db_product.stock,
-            reference_no=stock.reference_no,
-            timestamp=datetime.utcnow()
-        )
-        db.add(db_log)
-        
+        results, _ = apply_stock_changes(db, current_user.id, [stock])
+        result = results[0]
+        if "error" in result:
+            status_code = 404 if result["error"] == '商品不存在' else 400
+            raise HTTPException(status_code=status_code, detail=result["error"])
         db.commit()
-        
-        # 检查库存预警
-        check_and_create_notification(db, current_user.id, db_product)
-        
-        return {
-            "msg": f"{stock.type}成功", 
-            "current_stock": db_product.stock,
-            "log_id": db_log.id
-        }
+    except HTTPException:
+        db.rollback()
+        raise
+    except Exception as e:
+        db.rollback()
+        raise HTTPException(status_code=400, detail=str(e))
+    invalidate_dashboard(current_user.id)
+    invalidate_counts(current_user.id)
+    httpcache.bump(current_user.id, 'products', 'notifications')
+    return {
+        "msg": f"{stock.type}成功",
+        "current_stock": result["after_stock"],
+        "log_id": result["log_id"]
+    }
+
+@app.post('/api/stock/batch', summary="批量库存调整")
+def change_stock_batch(
+    batch: StockBatchChange,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """批量库存调整（入库/出库/调整），单个事务内完成，返回逐行结果"""
+    if not batch.items:
+        raise HTTPException(status_code=400, detail='调整明细不能为空')
+    try:
+        results, changed = apply_stock_changes(db, current_user.id, batch.items, batch.atomic)
+        if changed:
+            db.commit()
+            invalidate_dashboard(current_user.id)
+            invalidate_counts(current_user.id)
+            httpcache.bump(current_user.id, 'products', 'notifications')
     except Exception as e:
         db.rollback()
         raise HTTPException(status_code=400, detail=str(e))
+    failed = sum(1 for r in results if "error" in r)
+    if batch.atomic and failed:
+        raise HTTPException(status_code=400, detail={
+            "msg": f"{failed}行调整失败，全部未执行",
+            "results": results
+        })
+    return {
+        "msg": "批量调整完成",
+        "success_count": len(results) - failed,
+        "error_count": failed,
+        "results": results
+    }
 
 @app.get('/api/stock_logs', response_model=dict, summary="获取库存流水")
 def get_stock_logs(
@@ -559,98 +728,103 @@ def get_stock_logs(
     sort_order: str = 'desc',
     page: int = 1,
     page_size: int = 20,
+    paging: str = Query('page', description="分页方式：page 页码分页，cursor 游标分页"),
+    cursor: Optional[str] = Query(None, description="游标分页时传入上一页返回的 next_cursor"),
+    with_total: bool = Query(False, description="游标分页时是否统计总数"),
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
     """获取库存流水记录，支持多条件搜索、排序、分页"""
-    query = db.query(StockLog).filter(StockLog.user_id == current_user.id)
-    if product_name:
-        query = query.join(Product).filter(Product.name.contains(product_name))
-    if type:
-        query = query.filter(StockLog.type == type)
-    if start_time:
-        query = query.filter(StockLog.timestamp >= start_time)
-    if end_time:
-        query = query.filter(StockLog.timestamp <= end_time)
-    total = query.count()
+    query = db.query(StockLog).filter(
+        *stock_log_conditions(current_user.id, product_name, type, start_time, end_time)
+    )
+    if paging == 'cursor' or cursor:
+        logs, next_cursor = keyset_paginate(
+            query.options(joinedload(StockLog.product).joinedload(Product.category)),
+            StockLog, sort_by, sort_order, cursor, page_size, STOCK_LOG_CURSOR_SORTS
+        )
+        total = count_rows(query) if with_total else None
+        return FastJSONResponse(cursor_page(serialize_many(StockLogOut, logs), next_cursor, page_size, total))
+    count_key = ('stock_logs', current_user.id, product_name, type, start_time, end_time)
+    total = cached_count(count_key, query, refresh=page <= 1)
     order_column = getattr(StockLog, sort_by, StockLog.timestamp)
     if sort_order == 'asc':
         query = query.order_by(asc(order_column))
     else:
         query = query.order_by(desc(order_column))
     offset = (page - 1) * page_size
-    logs = query.options(joinedload(StockLog.product)).offset(offset).limit(page_size).all()
-    return {
-        "items": [StockLogOut.model_validate(log) for log in logs],
+    logs = query.options(joinedload(StockLog.product).joinedload(Product.category)).offset(offset).limit(page_size).all()
+    return FastJSONResponse({
+        "items": serialize_many(StockLogOut, logs),
         "total": total,
         "page": page,
         "page_size": page_size,
         "total_pages": (total + page_size - 1) // page_size
-    }
+    })
 
 # ================================
 # 统计分析接口
 # ================================
 
-@app.get('/api/dashboard/stats', response_model=DashboardStats, summary="获取仪表盘统计数据")
-def get_dashboard_stats(
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+# 仪表盘数据依赖的资源（条件请求版本）
+DASHBOARD_RESOURCES = ('products', 'orders', 'categories')
+
+@app.get('/api/dashboard/stats', response_model=DashboardStats, summary="获取仪表盘统计数据",
+         dependencies=[Depends(httpcache.conditional(*DASHBOARD_RESOURCES, daily=True, auth=get_current_user_async))])
+async def get_dashboard_stats(
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(get_current_user_async)
 ):
-    """获取仪表盘统计数据"""
+    """获取仪表盘统计数据（条件聚合查询，结果按用户短期缓存）"""
     try:
-        total_products = db.query(Product).filter(Product.user_id == current_user.id).count()
-        total_categories = db.query(Category).count()
-        total_orders = db.query(SalesOrder).filter(SalesOrder.user_id == current_user.id).count()
-        total_sales = db.query(func.coalesce(func.sum(SalesOrder.total_amount), 0)).filter(SalesOrder.user_id == current_user.id).scalar() or 0
-        low_stock_products = db.query(Product).filter(Product.user_id == current_user.id, Product.stock <= Product.min_stock).count()
-        today = datetime.now().date()
-        today_sales = db.query(func.coalesce(func.sum(SalesOrder.total_amount), 0)).filter(
-            SalesOrder.user_id == current_user.id,
-            func.date(SalesOrder.created_at) == today
-        ).scalar() or 0
-        month_start = datetime.now().replace(day=1).date()
-        month_sales = db.query(func.coalesce(func.sum(SalesOrder.total_amount), 0)).filter(
-            SalesOrder.user_id == current_user.id,
-            func.date(SalesOrder.created_at) >= month_start
-        ).scalar() or 0
-        recent_orders = db.query(SalesOrder).filter(SalesOrder.user_id == current_user.id).order_by(desc(SalesOrder.created_at)).limit(5).all()
-        return DashboardStats(
-            total_products=total_products,
-            total_categories=total_categories,
-            total_orders=total_orders,
-            total_sales=total_sales,
-            low_stock_products=low_stock_products,
-            today_sales=today_sales,
-            month_sales=month_sales,
-            recent_orders=[SalesOrderOut.model_validate(o) for o in recent_orders]
-        )
+        # 复用同步统计查询，通过 run_sync 在异步会话上执行
+        def compute(db):
+            products = product_stock_summary(db, current_user.id)
+            orders = order_sales_summary(db, current_user.id)
+            total_categories = db.query(func.count(Category.id)).scalar()
+            recent_orders = db.query(SalesOrder).filter(
+                SalesOrder.user_id == current_user.id
+            ).options(
+                selectinload(SalesOrder.order_items).joinedload(SalesOrderItem.product).joinedload(Product.category)
+            ).order_by(desc(SalesOrder.created_at)).limit(5).all()
+            return DashboardStats(
+                total_products=products.total,
+                total_categories=total_categories,
+                total_orders=orders.total_orders,
+                total_sales=orders.total_sales or 0,
+                low_stock_products=products.low_stock,
+                today_sales=orders.today_sales or 0,
+                month_sales=orders.month_sales or 0,
+                recent_orders=[SalesOrderOut.model_validate(o) for o in recent_orders]
+            )
+        return await cached_async(current_user.id, 'stats', lambda: db.run_sync(compute))
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(status_code=500, detail=f"获取统计数据失败: {str(e)}")
 
-@app.get('/api/dashboard/sales-trend', summary="获取销售趋势数据")
-def get_sales_trend(
+@app.get('/api/dashboard/sales-trend', summary="获取销售趋势数据",
+         dependencies=[Depends(httpcache.conditional(*DASHBOARD_RESOURCES, daily=True, auth=get_current_user_async))])
+async def get_sales_trend(
     days: int = Query(7, description="统计天数"),
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(get_current_user_async)
 ):
     """获取销售趋势数据"""
     try:
         end_date = date.today()
         start_date = end_date - timedelta(days=days-1)
-        # 查询每日销售数据
-        daily_sales = db.query(
-            func.date(SalesOrder.created_at).label('date'),
-            func.count(SalesOrder.id).label('order_count'),
-            func.coalesce(func.sum(SalesOrder.total_amount), 0.0).label('total_amount')
-        ).filter(
-            SalesOrder.user_id == current_user.id,
-            SalesOrder.created_at >= start_date,
-            SalesOrder.status != 'cancelled'
-        ).group_by(
-            func.date(SalesOrder.created_at)
-        ).all()
+        # 从每日销售汇总表读取
+        daily_sales = (await db.execute(
+            select(
+                DailySales.day.label('date'),
+                DailySales.order_count,
+                DailySales.amount.label('total_amount')
+            ).where(
+                DailySales.user_id == current_user.id,
+                DailySales.day >= start_date,
+                DailySales.day <= end_date
+            )
+        )).all()
         # 用字符串日期做key，保证类型一致
         date_dict = {str(item.date): item for item in daily_sales}
         result = []
@@ -673,50 +847,41 @@ def get_sales_trend(
             current_date += timedelta(days=1)
         return result
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(status_code=500, detail=f"获取销售趋势数据失败: {str(e)}")
 
-@app.get('/api/dashboard/category-sales', summary="获取分类销售统计")
-def get_category_sales(
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+@app.get('/api/dashboard/category-sales', summary="获取分类销售统计",
+         dependencies=[Depends(httpcache.conditional(*DASHBOARD_RESOURCES, daily=True, auth=get_current_user_async))])
+async def get_category_sales(
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(get_current_user_async)
 ):
     """获取分类销售统计"""
     try:
-        # 查询各分类的销售数据
-        category_sales = db.query(
-            Category.name,
-            func.coalesce(func.sum(SalesOrderItem.quantity), 0).label('quantity'),
-            func.coalesce(func.sum(SalesOrderItem.total_price), 0.0).label('amount')
-        ).join(
-            Product, Product.category_id == Category.id
-        ).join(
-            SalesOrderItem, SalesOrderItem.product_id == Product.id
-        ).join(
-            SalesOrder, and_(
-                SalesOrder.id == SalesOrderItem.order_id,
-                SalesOrder.status != 'cancelled'
-            )
-        ).filter(
-            Product.user_id == current_user.id
+        # 从商品每日销售汇总表按分类聚合
+        sales = select(
+            DailyProductSales.category_id,
+            func.coalesce(func.sum(DailyProductSales.quantity), 0).label('quantity'),
+            func.coalesce(func.sum(DailyProductSales.amount), 0.0).label('amount')
+        ).where(
+            DailyProductSales.user_id == current_user.id
         ).group_by(
-            Category.id, Category.name
-        ).all()
-        # 添加未分类商品的销售数据
-        uncategorized_sales = db.query(
-            func.coalesce(func.sum(SalesOrderItem.quantity), 0).label('quantity'),
-            func.coalesce(func.sum(SalesOrderItem.total_price), 0.0).label('amount')
-        ).join(
-            Product, Product.id == SalesOrderItem.product_id
-        ).join(
-            SalesOrder, and_(
-                SalesOrder.id == SalesOrderItem.order_id,
-                SalesOrder.status != 'cancelled'
-            )
-        ).filter(
-            Product.user_id == current_user.id,
-            Product.category_id == None
-        ).first()
+            DailyProductSales.category_id
+        ).subquery()
+        category_sales = (await db.execute(
+            select(
+                Category.name,
+                sales.c.quantity,
+                sales.c.amount
+            ).join(
+                sales, sales.c.category_id == Category.id
+            ).where(
+                sales.c.quantity > 0
+            ).order_by(Category.id)
+        )).all()
+        uncategorized_sales = (await db.execute(
+            select(sales.c.quantity, sales.c.amount).where(sales.c.category_id == None)
+        )).first()
         result = []
         for item in category_sales:
             result.append({
@@ -732,41 +897,25 @@ def get_category_sales(
             })
         return result
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(status_code=500, detail=f"获取分类销售统计失败: {str(e)}")
 
-@app.get('/api/dashboard/stock-status', summary="获取库存状态统计")
-def get_stock_status(
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+@app.get('/api/dashboard/stock-status', summary="获取库存状态统计",
+         dependencies=[Depends(httpcache.conditional(*DASHBOARD_RESOURCES, daily=True, auth=get_current_user_async))])
+async def get_stock_status(
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(get_current_user_async)
 ):
-    """获取库存状态统计"""
+    """获取库存状态统计（一次条件聚合查询，结果按用户短期缓存）"""
     try:
-        # 充足：库存 > 最低库存 * 2
-        sufficient = db.query(Product).filter(
-            Product.user_id == current_user.id,
-            Product.stock > Product.min_stock * 2
-        ).count()
-        
-        # 正常：最低库存 < 库存 <= 最低库存 * 2
-        normal = db.query(Product).filter(
-            Product.user_id == current_user.id,
-            Product.stock > Product.min_stock,
-            Product.stock <= Product.min_stock * 2
-        ).count()
-        
-        # 预警：0 < 库存 <= 最低库存
-        warning = db.query(Product).filter(
-            Product.user_id == current_user.id,
-            Product.stock > 0,
-            Product.stock <= Product.min_stock
-        ).count()
-        
-        # 缺货：库存 = 0
-        out_of_stock = db.query(Product).filter(
-            Product.user_id == current_user.id,
-            Product.stock == 0
-        ).count()
+        summary = await cached_async(
+            current_user.id, 'stock_status',
+            lambda: db.run_sync(product_stock_summary, current_user.id)
+        )
+        sufficient = summary.sufficient
+        normal = summary.normal
+        warning = summary.warning
+        out_of_stock = summary.out_of_stock
         
         return [
             {"name": "充足", "value": sufficient, "color": "#67C23A"},
@@ -775,33 +924,36 @@ def get_stock_status(
             {"name": "缺货", "value": out_of_stock, "color": "#F56C6C"}
         ]
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(status_code=500, detail=f"获取库存状态统计失败: {str(e)}")
 
 # ================================
 # 通知管理接口
 # ================================
 
-@app.get('/api/notifications', response_model=List[NotificationOut], summary="获取通知列表")
-def get_notifications(
+@app.get('/api/notifications', response_model=List[NotificationOut], summary="获取通知列表",
+         dependencies=[Depends(httpcache.conditional('notifications', auth=get_current_user_async))])
+async def get_notifications(
     is_read: Optional[bool] = None,
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(get_current_user_async)
 ):
     """获取通知列表"""
     try:
-        query = db.query(SystemNotification).filter(
+        query = select(*columns_for(NotificationOut, SystemNotification)).where(
             SystemNotification.user_id == current_user.id
         )
         
         if is_read is not None:
-            query = query.filter(SystemNotification.is_read == is_read)
+            query = query.where(SystemNotification.is_read == is_read)
         
-        notifications = query.order_by(desc(SystemNotification.created_at)).limit(50).all()
+        notifications = (await db.execute(
+            query.order_by(desc(SystemNotification.created_at)).limit(50)
+        )).all()
         
-        return [NotificationOut.model_validate(n) for n in notifications]
+        return FastJSONResponse(rows_to_dicts(notifications))
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(status_code=500, detail=f"获取通知列表失败: {str(e)}")
 
 @app.put('/api/notifications/{notification_id}/read', summary="标记通知为已读")
@@ -821,7 +973,9 @@ def mark_notification_read(
             raise HTTPException(status_code=404, detail='通知不存在')
         
         notification.is_read = True
+        alerts.acknowledge(db, current_user.id, notification_ids=[notification.id])
         db.commit()
+        httpcache.bump(current_user.id, 'notifications')
         
         return {"msg": "标记成功", "notification": NotificationOut.model_validate(notification)}
     except Exception as e:
@@ -839,8 +993,10 @@ def mark_all_notifications_read(
             SystemNotification.user_id == current_user.id,
             SystemNotification.is_read == False
         ).update({"is_read": True})
+        alerts.acknowledge(db, current_user.id)
         
         db.commit()
+        httpcache.bump(current_user.id, 'notifications')
         
         return {
             "msg": "全部标记成功",
@@ -848,110 +1004,183 @@ def mark_all_notifications_read(
         }
     except Exception as e:
         db.rollback()
-    db.query(SystemNotification).filter(
-        SystemNotification.user_id == current_user.id,
-        SystemNotification.is_read == False
-    ).update({"is_read": True})
-    
-    db.commit()
-    
-    return {"msg": "全部标记成功"}
+        raise HTTPException(status_code=400, detail=str(e))
+
+# ================================
+# 实时推送接口
+# ================================
+
+# SSE 心跳间隔（秒），防止代理断开空闲连接
+EVENT_HEARTBEAT_SECONDS = int(os.environ.get('ERP_EVENT_HEARTBEAT', '15'))
+
+@app.post('/api/events/token', summary="获取实时推送连接凭证")
+def create_event_stream_token(
+    token: str = Depends(oauth2_scheme),
+    current_user: User = Depends(get_current_user)
+):
+    """
+    签发短期的实时推送连接凭证（只能用于 /api/events/stream）
+    EventSource 无法设置请求头，凭证只能放在URL参数中，会被访问日志和代理记录，因此不直接传登录token
+    """
+    return {"token": create_event_token(current_user, token), "expires_in": EVENT_TOKEN_EXPIRE_SECONDS}
+
+@app.get('/api/events/stream', summary="实时事件推送（SSE）")
+async def event_stream(
+    request: Request,
+    token: str = Query(..., description="POST /api/events/token 获取的连接凭证（短期有效，不能用于其他接口）")
+):
+    """
+    推送当前用户的新通知、库存变化、订单变化，替代前端轮询
+    事件：notification / stock / order / resync(需重新拉取) / expired(登录token过期，需重新登录)
+    """
+    user, expires_at = await run_in_threadpool(authenticate_event_token, token)
+    subscriber = events.broker.subscribe(user.id)
+
+    async def stream():
+        try:
+            yield 'retry: 5000\n\n'
+            while True:
+                if await request.is_disconnected():
+                    break
+                timeout = EVENT_HEARTBEAT_SECONDS
+                if expires_at is not None:
+                    timeout = min(timeout, expires_at - time.time())
+                    if timeout <= 0:
+                        yield 'event: expired\ndata: {}\n\n'
+                        break
+                try:
+                    event_id, event_type, data = await asyncio.wait_for(subscriber.queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    yield ': ping\n\n'
+                    continue
+                payload = json.dumps(data, ensure_ascii=False, default=str)
+                yield f'id: {event_id}\nevent: {event_type}\ndata: {payload}\n\n'
+        finally:
+            events.broker.unsubscribe(subscriber)
+
+    return StreamingResponse(stream(), media_type='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'
+    })
+
+# ================================
+# 库存预警接口
+# ================================
+
+@app.get('/api/alerts', response_model=List[StockAlertOut], summary="获取库存预警")
+def get_stock_alerts(
+    state: Optional[str] = Query(None, description="raised/acknowledged/cleared，默认返回未解除的预警"),
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """获取库存预警列表"""
+    query = db.query(StockAlert).filter(StockAlert.user_id == current_user.id)
+    if state:
+        query = query.filter(StockAlert.state == state)
+    else:
+        query = query.filter(StockAlert.state != alerts.CLEARED)
+    items = query.options(joinedload(StockAlert.product).joinedload(Product.category)).order_by(desc(StockAlert.raised_at)).limit(200).all()
+    return FastJSONResponse(serialize_many(StockAlertOut, items))
+
+@app.put('/api/alerts/{alert_id}/acknowledge', summary="确认库存预警")
+def acknowledge_stock_alert(
+    alert_id: int,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """确认库存预警，同时将对应通知标记为已读"""
+    alert = db.query(StockAlert).filter(
+        StockAlert.id == alert_id,
+        StockAlert.user_id == current_user.id
+    ).first()
+    if not alert:
+        raise HTTPException(status_code=404, detail='预警不存在')
+    if alert.state == alerts.RAISED:
+        alerts.acknowledge(db, current_user.id, alert_ids=[alert.id])
+        if alert.notification_id:
+            db.query(SystemNotification).filter(
+                SystemNotification.id == alert.notification_id
+            ).update({"is_read": True})
+        db.commit()
+        httpcache.bump(current_user.id, 'notifications')
+        db.refresh(alert)
+    return {"msg": "确认成功", "alert": StockAlertOut.model_validate(alert)}
 
 # ================================
 # Excel导入导出接口
 # ================================
 
+@app.post('/api/export', summary="通用数据导出")
+def export_data(
+    request: ExportRequest,
+    current_user: User = Depends(get_current_user)
+):
+    """按导出请求导出商品/订单/库存流水数据（流式输出）"""
+    return export_response(request, current_user.id)
+
 @app.get('/api/export/products', summary="导出商品数据")
 def export_products(
     format: str = Query('excel', description="导出格式: excel/csv"),
-    db: Session = Depends(get_db),
+    category_id: Optional[int] = None,
+    stock_status: Optional[str] = Query(None, description="库存状态: sufficient/normal/warning/out"),
+    name: Optional[str] = None,
     current_user: User = Depends(get_current_user)
 ):
-    """导出商品数据为Excel或CSV"""
-    # 查询商品数据
-    products = db.query(Product).filter(
-        Product.user_id == current_user.id
-    ).options(joinedload(Product.category)).all()
-    
-    # 构建数据
-    data = []
-    for product in products:
-        data.append({
-            '商品编码': product.sku or '',
-            '商品名称': product.name,
-            '商品描述': product.description or '',
-            '分类': product.category.name if product.category else '未分类',
-            '销售价格': product.price,
-            '成本价格': product.cost_price,
-            '当前库存': product.stock,
-            '最低库存': product.min_stock,
-            '单位': product.unit,
-            '累计销量': product.sales_count,
-            '创建时间': product.created_at.strftime('%Y-%m-%d %H:%M:%S')
-        })
-    
-    df = pd.DataFrame(data)
-    
-    if format == 'csv':
-        # 导出CSV
-        output = io.StringIO()
-        df.to_csv(output, index=False, encoding='utf-8-sig')
-        output.seek(0)
-        
-        return StreamingResponse(
-            io.BytesIO(output.getvalue().encode('utf-8-sig')),
-            media_type='text/csv',
-            headers={
-                'Content-Disposition': f'attachment; filename=products_{datetime.now().strftime("%Y%m%d_%H%M%S")}.csv'
-            }
-        )
-    else:
-        # 导出Excel
-        output = io.BytesIO()
-        
-        with pd.ExcelWriter(output, engine='openpyxl') as writer:
-            df.to_excel(writer, sheet_name='商品数据', index=False)
-            
-            # 获取工作表
-            worksheet = writer.sheets['商品数据']
-            
-            # 设置列宽
-            column_widths = {
-                'A': 15,  # 商品编码
-                'B': 20,  # 商品名称
-                'C': 30,  # 商品描述
-                'D': 15,  # 分类
-                'E': 12,  # 销售价格
-                'F': 12,  # 成本价格
-                'G': 12,  # 当前库存
-                'H': 12,  # 最低库存
-                'I': 10,  # 单位
-                'J': 12,  # 累计销量
-                'K': 20   # 创建时间
-            }
-            
-            for col, width in column_widths.items():
-                worksheet.column_dimensions[col].width = width
-            
-            # 设置标题行样式
-            header_font = Font(bold=True, color="FFFFFF")
-            header_fill = PatternFill(start_color="366092", end_color="366092", fill_type="solid")
-            header_alignment = Alignment(horizontal="center", vertical="center")
-            
-            for cell in worksheet[1]:
-                cell.font = header_font
-                cell.fill = header_fill
-                cell.alignment = header_alignment
-        
-        output.seek(0)
-        
-        return StreamingResponse(
-            output,
-            media_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
-            headers={
-                'Content-Disposition': f'attachment; filename=products_{datetime.now().strftime("%Y%m%d_%H%M%S")}.xlsx'
-            }
-        )
+    """导出商品数据为Excel或CSV（流式输出，内存占用与商品数量无关）"""
+    request = ExportRequest(
+        export_type='products',
+        format=format,
+        filters={'category_id': category_id, 'stock_status': stock_status, 'name': name}
+    )
+    return export_response(request, current_user.id)
+
+@app.get('/api/export/orders', summary="导出订单数据")
+def export_orders(
+    format: str = Query('excel', description="导出格式: excel/csv"),
+    status: Optional[str] = None,
+    order_no: Optional[str] = None,
+    customer: Optional[str] = None,
+    start_date: Optional[str] = Query(None, description="开始日期 YYYY-MM-DD"),
+    end_date: Optional[str] = Query(None, description="结束日期 YYYY-MM-DD（含当天）"),
+    start_time: Optional[str] = None,
+    end_time: Optional[str] = None,
+    current_user: User = Depends(get_current_user)
+):
+    """导出订单数据（每个订单明细一行）"""
+    request = ExportRequest(
+        export_type='orders',
+        format=format,
+        filters={
+            'status': status,
+            'order_no': order_no,
+            'customer': customer,
+            'start_time': start_time or start_date,
+            'end_time': end_time or (f'{end_date} 23:59:59.999999' if end_date else None)
+        }
+    )
+    return export_response(request, current_user.id)
+
+@app.get('/api/export/stock-logs', summary="导出库存流水")
+def export_stock_logs(
+    format: str = Query('excel', description="导出格式: excel/csv"),
+    product_name: Optional[str] = None,
+    type: Optional[str] = None,
+    start_time: Optional[str] = None,
+    end_time: Optional[str] = None,
+    current_user: User = Depends(get_current_user)
+):
+    """导出库存流水数据"""
+    request = ExportRequest(
+        export_type='stock_logs',
+        format=format,
+        filters={
+            'product_name': product_name,
+            'type': type,
+            'start_time': start_time,
+            'end_time': end_time
+        }
+    )
+    return export_response(request, current_user.id)
 
 @app.get('/api/export/template', summary="下载导入模板")
 def download_import_template():
@@ -1027,82 +1256,112 @@ def download_import_template():
 
 @app.post('/api/import/products', response_model=ImportResult, summary="导入商品数据")
 async def import_products(
+    file: UploadFile = File(...),
+    current_user: User = Depends(get_current_user_async)
+):
+    """
+    从Excel文件批量导入商品数据（分块读取、向量化校验、批量写入）
+    解析和写入在线程池中执行，等待结果期间不阻塞事件循环；大文件请使用后台导入任务
+    """
+    if not file.filename.endswith(('.xlsx', '.xls')):
+        raise HTTPException(status_code=400, detail='请上传Excel文件')
+    
+    result = await import_in_thread(current_user.id, file)
+    invalidate_dashboard(current_user.id)
+    invalidate_counts(current_user.id)
+    # 导入时可能新建分类
+    httpcache.bump(current_user.id, 'products', 'notifications')
+    httpcache.bump(httpcache.GLOBAL, 'categories')
+    return result
+
+# ================================
+# 后台任务接口（大批量导入导出）
+# ================================
+
+@app.post('/api/jobs/import/products', response_model=JobOut, summary="提交商品导入任务")
+def create_import_job(
     file: UploadFile = File(...),
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
-    """从Excel文件导入商品数据"""
+    """上传Excel文件并提交后台导入任务，立即返回任务ID"""
     if not file.filename.endswith(('.xlsx', '.xls')):
         raise HTTPException(status_code=400, detail='请上传Excel文件')
-    
-    # 读取文件
-    contents = await file.read()
-    
-    try:
-        df = pd.read_excel(io.BytesIO(contents))
-    except Exception as e:
-        raise HTTPException(status_code=400, detail=f'文件读取失败: {str(e)}')
-    
-    # 验证必填字段
-    required_columns = ['商品名称*', '销售价格*', '当前库存*']
-    missing_columns = [col for col in required_columns if col not in df.columns]
-    
-    if missing_columns:
-        raise HTTPException(status_code=400, detail=f'缺少必填列: {", ".join(missing_columns)}')
-    
-    success_count = 0
-    error_count = 0
-    errors = []
-    
-    # 处理每一行数据
-    for index, row in df.iterrows():
-        try:
-            # 获取或创建分类
-            category_id = None
-            if '分类名称' in row and pd.notna(row['分类名称']):
-                category = db.query(Category).filter(
-                    Category.user_id == current_user.id,
-                    Category.name == row['分类名称']
-                ).first()
-                if not category:
-                    category = Category(
-                        user_id=current_user.id,
-                        name=row['分类名称']
-                    )
-                    db.add(category)
-                    db.flush()
-                category_id = category.id
-            
-            # 创建商品
-            product = Product(
-                user_id=current_user.id,
-                name=row['商品名称*'],
-                description=row.get('商品描述', '') if pd.notna(row.get('商品描述')) else '',
-                category_id=category_id,
-                price=float(row['销售价格*']),
-                cost_price=float(row.get('成本价格', 0)) if pd.notna(row.get('成本价格')) else 0,
-                stock=int(row['当前库存*']),
-                min_stock=int(row.get('最低库存', 10)) if pd.notna(row.get('最低库存')) else 10,
-                unit=row.get('单位', '件') if pd.notna(row.get('单位')) else '件',
-                sku=row.get('商品编码') if pd.notna(row.get('商品编码')) else f"SKU{datetime.now().strftime('%Y%m%d')}{uuid.uuid4().hex[:6].upper()}"
-            )
-            
-            db.add(product)
-            success_count += 1
-            
-        except Exception as e:
-            error_count += 1
-            errors.append(f'第{index + 2}行: {str(e)}')
-    
-    # 提交事务
-    if success_count > 0:
-        db.commit()
-    
-    return ImportResult(
-        success_count=success_count,
-        error_count=error_count,
-        errors=errors
-    )
+    job = submit_import_job(db, current_user.id, file)
+    return job_to_out(job)
+
+@app.post('/api/jobs/export', response_model=JobOut, summary="提交导出任务")
+def create_export_job(
+    request: ExportRequest,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """提交后台导出任务，立即返回任务ID"""
+    job = submit_export_job(db, current_user.id, request)
+    return job_to_out(job)
+
+@app.get('/api/jobs', response_model=List[JobOut], summary="获取任务列表")
+def get_jobs(
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """获取当前用户最近的后台任务"""
+    jobs = db.query(Job).filter(Job.user_id == current_user.id).order_by(desc(Job.created_at)).limit(50).all()
+    return [job_to_out(job) for job in jobs]
+
+@app.get('/api/jobs/{job_id}', response_model=JobOut, summary="查询任务进度")
+def get_job(
+    job_id: str,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """查询任务状态和进度（已处理行数、错误数）"""
+    return job_to_out(get_user_job(db, job_id, current_user.id))
+
+@app.get('/api/jobs/{job_id}/download', summary="下载导出文件")
+def download_job_file(
+    job_id: str,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """下载已完成导出任务生成的文件"""
+    job = get_user_job(db, job_id, current_user.id)
+    if job.status == 'expired':
+        raise HTTPException(status_code=410, detail='导出文件已过期删除，请重新导出')
+    if job.job_type != 'export' or job.status != 'completed' or not job.file_path or not os.path.exists(job.file_path):
+        raise HTTPException(status_code=400, detail='导出文件不存在或任务未完成')
+    media_type = 'text/csv' if job.format == 'csv' else 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+    return FileResponse(job.file_path, media_type=media_type, filename=job.file_name)
+
+# ================================
+# 监控指标与运维接口
+# ================================
+
+@app.get('/metrics', summary="Prometheus监控指标", include_in_schema=False)
+def get_metrics(request: Request):
+    """Prometheus 文本格式的请求与SQL统计（需启用 ERP_METRICS）"""
+    if not metrics.METRICS_ENABLED:
+        raise HTTPException(status_code=404, detail='监控未启用')
+    if metrics.METRICS_TOKEN and request.headers.get('Authorization') != f'Bearer {metrics.METRICS_TOKEN}':
+        raise HTTPException(status_code=401, detail='无效的监控令牌')
+    return Response(metrics.render(), media_type=metrics.CONTENT_TYPE)
+
+@app.get('/api/admin/slow-queries', summary="查询慢查询日志")
+def get_slow_queries(
+    route: Optional[str] = Query(None, description="路由模板，如 /api/products/query"),
+    user_id: Optional[int] = None,
+    min_ms: Optional[float] = Query(None, description="最小耗时（毫秒）"),
+    keyword: Optional[str] = Query(None, description="语句包含的文本"),
+    since: Optional[datetime] = None,
+    limit: int = Query(100, ge=1, le=1000),
+    admin_user: User = Depends(get_admin_user)
+):
+    """按条件查询慢查询记录（最新的在前），需管理员权限"""
+    return {
+        "enabled": slowlog.SLOW_QUERY_LOG_ENABLED,
+        "threshold_ms": slowlog.SLOW_QUERY_MS,
+        "items": slowlog.read_entries(route, user_id, min_ms, keyword, since, limit)
+    }
 
 # ================================
 # 原有接口保留（兼容性）
@@ -1113,12 +1372,10 @@ def get_total_stock(
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
-    """获取总库存"""
-    total = db.query(func.sum(Product.stock)).filter(
-        Product.user_id == current_user.id
-    ).scalar()
+    """获取总库存及库存金额（读取库存汇总表）"""
+    stats = stock_summary.totals(db, current_user.id)
     
-    return {"total": total or 0}
+    return {"total": stats.total_stock, "total_value": stats.stock_value, "total_cost_value": stats.cost_value}
 
 if __name__ == "__main__":
     import uvicorn
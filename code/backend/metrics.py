@@ -0,0 +1,295 @@
+"""
+请求与SQL监控（可选，环境变量 ERP_METRICS=1 时启用）
+- 每个请求记录耗时、SQL语句数、数据库耗时，按 (方法, 路由模板) 汇总为直方图/计数器
+- 同一请求内同一语句（参数不同）执行次数达到阈值时判定为 N+1 查询，计数并记录日志
+- 按采样率对请求做性能剖析（cProfile，设置 ERP_PROFILER=pyinstrument 且已安装时使用 pyinstrument），
+  只保存耗时超过慢请求阈值的剖析结果
+- GET /metrics 以 Prometheus 文本格式输出
+SQL统计通过 SQLAlchemy 引擎事件实现，累计在 context.RequestContext 上（同步接口在线程池中执行，经 contextvars 共享同一对象）
+"""
+import asyncio
+import cProfile
+import functools
+import logging
+import os
+import random
+import re
+import threading
+import time
+from datetime import datetime
+
+from fastapi.routing import APIRoute
+from sqlalchemy import event
+
+from context import current_request
+
+try:
+    import pyinstrument
+except ImportError:
+    pyinstrument = None
+
+METRICS_ENABLED = os.environ.get('ERP_METRICS', '0').lower() in ('1', 'true', 'yes')
+# 访问 /metrics 需携带的令牌（Authorization: Bearer <令牌>），为空时不校验
+METRICS_TOKEN = os.environ.get('ERP_METRICS_TOKEN', '')
+# 同一语句在一个请求中执行多少次判定为 N+1
+N_PLUS_ONE_THRESHOLD = int(os.environ.get('ERP_N_PLUS_ONE_THRESHOLD', '10'))
+# 性能剖析：采样率（0~1，0为关闭）、慢请求阈值（毫秒）、保存目录及最多保留的文件数
+PROFILE_SAMPLE_RATE = float(os.environ.get('ERP_PROFILE_SAMPLE_RATE', '0'))
+SLOW_REQUEST_MS = float(os.environ.get('ERP_SLOW_REQUEST_MS', '500'))
+PROFILER = os.environ.get('ERP_PROFILER', 'cprofile')
+PROFILE_DIR = os.environ.get('ERP_PROFILE_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'profiles'))
+PROFILE_KEEP = int(os.environ.get('ERP_PROFILE_KEEP', '100'))
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+STATEMENT_BUCKETS = (1, 2, 3, 5, 10, 20, 50, 100, 200, 500)
+
+logger = logging.getLogger('erp.metrics')
+
+# ================================
+# 指标类型
+# ================================
+
+class Counter:
+    """计数器"""
+
+    def __init__(self, name: str, help: str, labels=()):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, label_values=(), amount: float = 1):
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} counter']
+        with self._lock:
+            for label_values, value in sorted(self._values.items()):
+                lines.append(f'{self.name}{_labels(self.labels, label_values)} {value}')
+        return lines
+
+class Histogram:
+    """直方图（累计桶）"""
+
+    def __init__(self, name: str, help: str, labels=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.buckets = buckets
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def observe(self, label_values, value: float):
+        with self._lock:
+            counts, total, count = self._values.get(label_values, ([0] * len(self.buckets), 0.0, 0))
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+            self._values[label_values] = (counts, total + value, count + 1)
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} histogram']
+        bucket_labels = self.labels + ('le',)
+        with self._lock:
+            for label_values, (counts, total, count) in sorted(self._values.items()):
+                for bound, n in zip(self.buckets, counts):
+                    lines.append(f'{self.name}_bucket{_labels(bucket_labels, label_values + (str(bound),))} {n}')
+                lines.append(f'{self.name}_bucket{_labels(bucket_labels, label_values + ("+Inf",))} {count}')
+                lines.append(f'{self.name}_sum{_labels(self.labels, label_values)} {total}')
+                lines.append(f'{self.name}_count{_labels(self.labels, label_values)} {count}')
+        return lines
+
+def _labels(names, values) -> str:
+    if not names:
+        return ''
+    escaped = (str(v).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for v in values)
+    return '{' + ','.join(f'{n}="{v}"' for n, v in zip(names, escaped)) + '}'
+
+REQUEST_LABELS = ('method', 'route')
+
+requests_total = Counter('erp_http_requests_total', '请求数', REQUEST_LABELS + ('status',))
+request_duration = Histogram('erp_http_request_duration_seconds', '请求耗时（秒）', REQUEST_LABELS)
+request_statements = Histogram('erp_db_statements_per_request', '每个请求执行的SQL语句数', REQUEST_LABELS, STATEMENT_BUCKETS)
+db_time_total = Counter('erp_db_time_seconds_total', '数据库耗时合计（秒）', REQUEST_LABELS)
+statements_total = Counter('erp_db_statements_total', 'SQL语句数合计', REQUEST_LABELS)
+n_plus_one_total = Counter('erp_n_plus_one_requests_total', '判定为N+1查询的请求数', REQUEST_LABELS)
+profiles_total = Counter('erp_slow_request_profiles_total', '保存的慢请求剖析数', REQUEST_LABELS)
+
+METRICS = [requests_total, request_duration, request_statements, db_time_total,
+           statements_total, n_plus_one_total, profiles_total]
+
+def render() -> str:
+    """Prometheus 文本格式输出"""
+    import events
+    lines = []
+    for metric in METRICS:
+        lines.extend(metric.render())
+    lines += [
+        '# HELP erp_sse_connections 实时推送连接数',
+        '# TYPE erp_sse_connections gauge',
+        f'erp_sse_connections {events.broker.connection_count()}',
+    ]
+    return '\n'.join(lines) + '\n'
+
+# ================================
+# 请求上下文与SQL统计
+# ================================
+
+# IN 列表参数个数不同视为同一语句
+_IN_LIST = re.compile(r'\((?:\s*(?:\?|%\(\w+\)s|:\w+|\$\d+)\s*,)+\s*(?:\?|%\(\w+\)s|:\w+|\$\d+)\s*\)')
+
+def normalize_statement(statement: str) -> str:
+    """归一化语句文本（用于识别重复执行的同一语句）"""
+    return _IN_LIST.sub('(?)', ' '.join(statement.split()))
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('erp_query_start', []).append(time.perf_counter())
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - conn.info['erp_query_start'].pop()
+    stats = current_request.get()
+    if stats is not None:
+        stats.sql_count += 1
+        stats.sql_time += elapsed
+        stats.statements[normalize_statement(statement)] += 1
+
+def _handle_error(context):
+    """语句执行失败时不会触发 after_cursor_execute，丢弃开始时间"""
+    if context.connection is not None and context.connection.info.get('erp_query_start'):
+        context.connection.info['erp_query_start'].pop()
+
+def instrument_engine(engine):
+    """为引擎注册SQL统计事件（异步引擎传入 async_engine.sync_engine）"""
+    event.listen(engine, 'before_cursor_execute', _before_cursor_execute)
+    event.listen(engine, 'after_cursor_execute', _after_cursor_execute)
+    event.listen(engine, 'handle_error', _handle_error)
+
+# ================================
+# 性能剖析
+# ================================
+
+def _start_profiler():
+    if PROFILER == 'pyinstrument' and pyinstrument is not None:
+        profiler = pyinstrument.Profiler(async_mode='disabled')
+        profiler.start()
+    else:
+        profiler = cProfile.Profile()
+        profiler.enable()
+    return profiler
+
+def _stop_profiler(profiler):
+    if isinstance(profiler, cProfile.Profile):
+        profiler.disable()
+    else:
+        profiler.stop()
+
+def save_profile(stats, route: str, duration_ms: float):
+    """保存剖析结果（cProfile 为 .prof，可用 snakeviz/pstats 查看；pyinstrument 为 .html），超出保留数量时删除最旧的"""
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    name = re.sub(r'[^\w]+', '_', route).strip('_') or 'root'
+    base = os.path.join(PROFILE_DIR, f"{datetime.now():%Y%m%d%H%M%S%f}_{stats.method}_{name}_{duration_ms:.0f}ms")
+    if isinstance(stats.profiler, cProfile.Profile):
+        stats.profiler.dump_stats(base + '.prof')
+    else:
+        with open(base + '.html', 'w', encoding='utf-8') as f:
+            f.write(stats.profiler.output_html())
+    files = sorted(os.listdir(PROFILE_DIR))
+    for name in files[:max(0, len(files) - PROFILE_KEEP)]:
+        os.remove(os.path.join(PROFILE_DIR, name))
+
+def _profiled(func):
+    """包装接口函数：被采样的请求在接口执行的线程内开启剖析（同步接口在线程池线程中）"""
+    if asyncio.iscoroutinefunction(func):
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            stats = current_request.get()
+            if stats is None or not stats.profile:
+                return await func(*args, **kwargs)
+            stats.profiler = _start_profiler()
+            try:
+                return await func(*args, **kwargs)
+            finally:
+                _stop_profiler(stats.profiler)
+    else:
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            stats = current_request.get()
+            if stats is None or not stats.profile:
+                return func(*args, **kwargs)
+            stats.profiler = _start_profiler()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                _stop_profiler(stats.profiler)
+    return wrapper
+
+class InstrumentedRoute(APIRoute):
+    """接口函数支持采样剖析的路由类（须在声明路由前设置为 app.router.route_class）"""
+
+    def __init__(self, path, endpoint, **kwargs):
+        super().__init__(path, _profiled(endpoint), **kwargs)
+
+# ================================
+# 中间件
+# ================================
+
+class MetricsMiddleware:
+    """记录每个请求的耗时和SQL统计（ASGI中间件，流式响应计入发送完成为止的时间）"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            return await self.app(scope, receive, send)
+        stats = current_request.get()
+        if stats is None:
+            return await self.app(scope, receive, send)
+        stats.profile = PROFILE_SAMPLE_RATE > 0 and random.random() < PROFILE_SAMPLE_RATE
+        status = {'code': 500}
+
+        async def send_wrapper(message):
+            if message['type'] == 'http.response.start':
+                status['code'] = message['status']
+            await send(message)
+
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            duration = time.perf_counter() - start
+            route = scope.get('route')
+            record(stats, getattr(route, 'path', None) or 'unmatched', status['code'], duration)
+
+def record(stats, route: str, status_code: int, duration: float):
+    """汇总一个请求的统计数据（stats 为 context.RequestContext）"""
+    labels = (stats.method, route)
+    requests_total.inc(labels + (str(status_code),))
+    request_duration.observe(labels, duration)
+    request_statements.observe(labels, stats.sql_count)
+    statements_total.inc(labels, stats.sql_count)
+    db_time_total.inc(labels, stats.sql_time)
+
+    repeated = [(sql, n) for sql, n in stats.statements.items() if n >= N_PLUS_ONE_THRESHOLD]
+    if repeated:
+        n_plus_one_total.inc(labels)
+        sql, n = max(repeated, key=lambda item: item[1])
+        logger.warning('疑似N+1查询 %s %s：同一语句执行 %d 次：%s', stats.method, route, n, sql[:500])
+
+    duration_ms = duration * 1000
+    if stats.profiler is not None and duration_ms >= SLOW_REQUEST_MS:
+        try:
+            save_profile(stats, route, duration_ms)
+            profiles_total.inc(labels)
+        except OSError:
+            logger.exception('保存剖析结果失败')
+
+def install(app, engines):
+    """启用监控：设置路由类、添加中间件、注册引擎事件（须在声明路由之前、添加 RequestContextMiddleware 之前调用）"""
+    app.router.route_class = InstrumentedRoute
+    app.add_middleware(MetricsMiddleware)
+    for engine in engines:
+        instrument_engine(engine)
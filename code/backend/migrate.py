@@ -0,0 +1,144 @@
+"""
+数据库结构迁移
+- 新建数据库由 Base.metadata.create_all 创建完整结构；已有数据库（如旧版 inventory.db）通过迁移补齐
+- 迁移按版本号顺序执行，已执行的版本记录在 schema_migrations 表中，不会重复执行
+- 迁移只做增量变更（建索引、加列等），不删除数据
+- 服务启动时自动执行，也可离线执行：
+    python migrate.py status     查看迁移状态
+    python migrate.py upgrade    执行全部未执行的迁移
+新增迁移：在 MIGRATIONS 末尾追加 (版本号, 说明, 函数)，函数接收数据库连接
+"""
+import argparse
+from datetime import datetime
+
+from sqlalchemy import Table, Column, Integer, String, DateTime, MetaData, select
+
+from db import engine, Base, Product, SystemNotification, StockAlert
+import alerts
+import search
+
+migration_metadata = MetaData()
+schema_migrations = Table(
+    'schema_migrations', migration_metadata,
+    Column('version', Integer, primary_key=True),
+    Column('description', String, nullable=False),
+    Column('applied_at', DateTime, nullable=False),
+)
+
+def create_model_indexes(conn, names):
+    """按名称创建模型中定义的索引（已存在则跳过）"""
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            if index.name in names:
+                index.create(conn, checkfirst=True)
+
+def m001_hot_path_indexes(conn):
+    """为高频查询条件创建复合索引"""
+    create_model_indexes(conn, {
+        'ix_products_user_category',
+        'ix_stock_logs_user_timestamp',
+        'ix_stock_logs_product_id',
+        'ix_sales_orders_user_created',
+        'ix_sales_order_items_order_id',
+        'ix_sales_order_items_product_id',
+        'ix_system_notifications_user_read_created',
+        'ix_categories_user_name',
+    })
+
+def m002_fulltext_search(conn):
+    """创建商品、订单全文索引（仅 SQLite 且支持 trigram 分词，否则搜索回退为 LIKE；升级 SQLite 后可执行 python search.py rebuild 补建）"""
+    search.create_fts(conn)
+
+def m003_stock_alerts(conn):
+    """根据当前库存初始化库存预警：有未读预警通知的记为已触发，否则记为已确认，避免升级后重复通知"""
+    now = datetime.utcnow()
+    low = conn.execute(
+        select(Product.id, Product.user_id, Product.name, Product.stock, Product.min_stock)
+        .where(Product.stock <= Product.min_stock)
+    ).all()
+    if not low:
+        return
+    unread = {
+        (row.user_id, row.title): row.id for row in conn.execute(
+            select(SystemNotification.id, SystemNotification.user_id, SystemNotification.title).where(
+                SystemNotification.type == 'warning',
+                SystemNotification.is_read == False
+            )
+        )
+    }
+    rows = []
+    for p in low:
+        notification_id = unread.get((p.user_id, f'商品 {p.name} 库存预警'))
+        rows.append({
+            'user_id': p.user_id,
+            'product_id': p.id,
+            'alert_type': alerts.LOW_STOCK,
+            'state': alerts.RAISED if notification_id else alerts.ACKNOWLEDGED,
+            'stock': p.stock,
+            'min_stock': p.min_stock,
+            'notification_id': notification_id,
+            'raised_at': now,
+            'acknowledged_at': None if notification_id else now,
+            'updated_at': now
+        })
+    conn.execute(StockAlert.__table__.insert(), rows)
+
+# (版本号, 说明, 迁移函数)，版本号必须递增
+MIGRATIONS = [
+    (1, '高频查询复合索引', m001_hot_path_indexes),
+    (2, '商品与订单全文索引', m002_fulltext_search),
+    (3, '库存预警初始化', m003_stock_alerts),
+]
+
+def applied_versions(conn):
+    """已执行的迁移版本"""
+    migration_metadata.create_all(conn)
+    return {row.version for row in conn.execute(select(schema_migrations.c.version))}
+
+def upgrade(bind=None):
+    """执行全部未执行的迁移，每个迁移单独提交，返回本次执行的版本列表"""
+    bind = bind or engine
+    # 确保新增的表已创建
+    Base.metadata.create_all(bind)
+    executed = []
+    with bind.connect() as conn:
+        done = applied_versions(conn)
+        conn.commit()
+        for version, description, func in MIGRATIONS:
+            if version in done:
+                continue
+            func(conn)
+            conn.execute(schema_migrations.insert().values(
+                version=version,
+                description=description,
+                applied_at=datetime.now()
+            ))
+            conn.commit()
+            executed.append(version)
+    return executed
+
+def status(bind=None):
+    """返回 (版本号, 说明, 是否已执行) 列表"""
+    bind = bind or engine
+    with bind.connect() as conn:
+        done = applied_versions(conn)
+        conn.commit()
+    return [(version, description, version in done) for version, description, _ in MIGRATIONS]
+
+def main():
+    parser = argparse.ArgumentParser(description='数据库结构迁移工具')
+    parser.add_argument('command', choices=['status', 'upgrade'])
+    args = parser.parse_args()
+
+    if args.command == 'upgrade':
+        executed = upgrade()
+        if executed:
+            print(f'已执行迁移: {", ".join(str(v) for v in executed)}')
+        else:
+            print('数据库结构已是最新')
+    else:
+        for version, description, applied in status():
+            print(f'{version:04d}  {"已执行" if applied else "未执行"}  {description}')
+
+if __name__ == '__main__':
+    main()
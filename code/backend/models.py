@@ -138,6 +138,10 @@ class SalesOrderCreate(SalesOrderBase):
     class Config:
         from_attributes = True
 
+class SalesOrderBulkCreate(BaseModel):
+    """批量销售订单创建模型"""
+    orders: List[SalesOrderCreate]
+
 class SalesOrderUpdate(BaseModel):
     """销售订单更新模型"""
     status: Optional[str] = None
@@ -159,6 +163,40 @@ class SalesOrderOut(SalesOrderBase):
     class Config:
         from_attributes = True
 
+class SalesOrderLineSummary(BaseModel):
+    """订单明细摘要（列表页使用，不含完整商品信息）"""
+    product_id: int
+    product_name: Optional[str] = None
+    sku: Optional[str] = None
+    quantity: int
+    unit_price: float
+    total_price: float
+
+class SalesOrderSummaryOut(SalesOrderBase):
+    """订单列表摘要输出模型（订单头 + 明细摘要）"""
+    id: int
+    user_id: int
+    order_no: str
+    total_amount: float
+    status: str
+    created_at: datetime
+    item_count: int = 0
+    items: List[SalesOrderLineSummary] = []
+
+class SalesOrderPage(BaseModel):
+    """销售订单列表分页（页码分页含 total/page/total_pages，游标分页含 next_cursor/has_more）"""
+    items: List[SalesOrderOut] = []
+    total: Optional[int] = None
+    page: Optional[int] = None
+    page_size: int
+    total_pages: Optional[int] = None
+    next_cursor: Optional[str] = None
+    has_more: Optional[bool] = None
+
+class SalesOrderSummaryPage(SalesOrderPage):
+    """销售订单列表分页（view=summary）"""
+    items: List[SalesOrderSummaryOut] = []
+
 # 库存相关模型 - 增强版
 class StockChange(BaseModel):
     """库存变动模型"""
@@ -170,6 +208,11 @@ class StockChange(BaseModel):
     class Config:
         from_attributes = True
 
+class StockBatchChange(BaseModel):
+    """批量库存变动模型"""
+    items: List[StockChange]
+    atomic: bool = True  # 为真时任一行失败则全部不执行
+
 class StockLogOut(BaseModel):
     """库存流水输出模型"""
     id: int
@@ -199,6 +242,23 @@ class NotificationOut(BaseModel):
     class Config:
         from_attributes = True
 
+class StockAlertOut(BaseModel):
+    """库存预警输出模型"""
+    id: int
+    product_id: int
+    alert_type: str
+    state: str
+    stock: Optional[int]
+    min_stock: Optional[int]
+    notification_id: Optional[int]
+    raised_at: datetime
+    acknowledged_at: Optional[datetime]
+    cleared_at: Optional[datetime]
+    product: Optional[ProductOut] = None
+
+    class Config:
+        from_attributes = True
+
 # 查询和筛选模型
 class ProductQuery(BaseModel):
     """商品查询模型"""
@@ -212,6 +272,9 @@ class ProductQuery(BaseModel):
     sort_order: Optional[str] = "desc"
     page: int = 1
     page_size: int = 20
+    paging: str = "page"  # page 页码分页，cursor 游标分页
+    cursor: Optional[str] = None  # 游标分页时传入上一页返回的 next_cursor
+    with_total: bool = False  # 游标分页时是否统计总数
 
     class Config:
         from_attributes = True
@@ -232,11 +295,16 @@ class DashboardStats(BaseModel):
         from_attributes = True
 
 class CategoryStats(BaseModel):
-    """分类统计数据"""
+    """分类统计数据（total_value 按售价、total_cost_value 按成本价计算的库存金额）"""
     category_name: str
     product_count: int
     total_stock: int
     total_value: float
+    total_cost_value: float = 0
+    sufficient: int = 0
+    normal: int = 0
+    warning: int = 0
+    out_of_stock: int = 0
 
     class Config:
         from_attributes = True
@@ -260,5 +328,27 @@ class ExportRequest(BaseModel):
     class Config:
         from_attributes = True
 
+# 后台任务模型
+class JobOut(BaseModel):
+    """后台任务输出模型"""
+    id: str
+    job_type: str
+    target: str
+    format: Optional[str] = None
+    status: str
+    processed_rows: int = 0
+    success_count: int = 0
+    error_count: int = 0
+    errors: List[str] = []
+    # 导入任务失败但已有数据块提交（success_count 为已保存的行数）
+    partial: bool = False
+    file_name: Optional[str] = None
+    message: Optional[str] = None
+    created_at: datetime
+    finished_at: Optional[datetime] = None
+
+    class Config:
+        from_attributes = True
+
 # 自引用模型修复
 CategoryOut.update_forward_refs() 
\ No newline at end of file
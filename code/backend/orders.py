@@ -0,0 +1,182 @@
+"""
+销售订单创建
+一次查询加载并锁定订单涉及的全部商品，批量写入订单、明细、库存流水，
+库存预警在最后统一检查；只修改会话，由调用方提交（一次请求的全部订单一次提交）
+订单号由编号序列分配，格式 SO + 日期 + 8位序号，并发下不会重复
+订单列表摘要：订单头按列查询，当前页全部明细摘要一次查询加载
+"""
+from datetime import datetime
+
+from fastapi import HTTPException
+from sqlalchemy import insert
+
+from db import Product, SalesOrder, SalesOrderItem, StockLog
+from inventory import load_products
+from models import SalesOrderLineSummary, SalesOrderSummaryOut
+import alerts
+import events
+import rollup
+import sequence
+
+ORDER_NO_SEQUENCE = 'sales_order_no'
+
+def generate_order_nos(count: int):
+    """批量生成订单号"""
+    today = datetime.now().strftime('%Y%m%d')
+    return [f"SO{today}{n:08d}" for n in sequence.allocate(ORDER_NO_SEQUENCE, count)]
+
+def _reserve(order, products, remaining):
+    """
+    校验订单明细并预留库存（同一商品多行按行累计），返回 (明细, 商品, 变动前库存, 变动后库存) 列表
+    校验失败时抛出 HTTPException，remaining 不变
+    """
+    reserved = {}
+    lines = []
+    for item in order.items:
+        product = products.get(item.product_id)
+        if not product:
+            raise HTTPException(status_code=404, detail=f'商品ID {item.product_id} 不存在')
+        before_stock = reserved.get(product.id, remaining[product.id])
+        if before_stock < item.quantity:
+            raise HTTPException(status_code=400, detail=f'商品 {product.name} 库存不足，当前库存：{before_stock}')
+        reserved[product.id] = before_stock - item.quantity
+        lines.append((item, product, before_stock, reserved[product.id]))
+    remaining.update(reserved)
+    return lines
+
+def create_orders(db, user_id: int, orders, order_nos, raise_errors: bool = False):
+    """
+    批量创建销售订单并扣减库存
+    orders: SalesOrderCreate 列表，按顺序依次预留库存，校验失败的订单跳过
+    raise_errors: 为真时校验失败直接抛出 HTTPException
+    返回逐单结果列表：成功含 order_id、order_no，失败含 error
+    """
+    products = load_products(db, user_id, [item.product_id for order in orders for item in order.items])
+    remaining = {pid: p.stock for pid, p in products.items()}
+
+    results = []
+    accepted = []
+    for index, (order, order_no) in enumerate(zip(orders, order_nos)):
+        try:
+            lines = _reserve(order, products, remaining)
+        except HTTPException as e:
+            if raise_errors:
+                raise
+            results.append({"index": index, "success": False, "error": e.detail})
+            continue
+        result = {"index": index, "success": True, "order_no": order_no}
+        results.append(result)
+        accepted.append((order, order_no, lines, result))
+    if not accepted:
+        return results
+
+    now = datetime.utcnow()
+    totals = [sum(item.quantity * item.unit_price for item in order.items) for order, _, _, _ in accepted]
+    order_ids = db.execute(
+        insert(SalesOrder).returning(SalesOrder.id, sort_by_parameter_order=True),
+        [{
+            'user_id': user_id,
+            'order_no': order_no,
+            'customer_name': order.customer_name,
+            'customer_phone': order.customer_phone,
+            'notes': order.notes,
+            'status': 'pending',
+            'total_amount': total,
+            'created_at': now
+        } for (order, order_no, _, _), total in zip(accepted, totals)]
+    ).scalars().all()
+    for (_, _, _, result), order_id in zip(accepted, order_ids):
+        result["order_id"] = order_id
+
+    items = [{
+        'order_id': order_id,
+        'product_id': item.product_id,
+        'quantity': item.quantity,
+        'unit_price': item.unit_price,
+        'total_price': item.quantity * item.unit_price
+    } for (_, _, lines, _), order_id in zip(accepted, order_ids) for item, _, _, _ in lines]
+    if items:
+        db.execute(insert(SalesOrderItem), items)
+        db.execute(insert(StockLog), [{
+            'product_id': product.id,
+            'user_id': user_id,
+            'change': -item.quantity,
+            'type': '销售',
+            'before_stock': before_stock,
+            'after_stock': after_stock,
+            'reference_no': order_no,
+            'timestamp': now
+        } for _, order_no, lines, _ in accepted for item, product, before_stock, after_stock in lines])
+
+    # 更新库存和销量（同列的 UPDATE 在 flush 时批量执行）
+    touched = {}
+    for _, _, lines, _ in accepted:
+        for item, product, _, _ in lines:
+            product.sales_count = (product.sales_count or 0) + item.quantity
+            touched[product.id] = product
+    for pid, product in touched.items():
+        product.stock = remaining[pid]
+
+    # 计入每日销售汇总
+    rollup.apply_orders(db, user_id, now, [
+        (total, [
+            (product.id, product.category_id, item.quantity, item.quantity * item.unit_price)
+            for item, product, _, _ in lines
+        ])
+        for (_, _, lines, _), total in zip(accepted, totals)
+    ])
+
+    events.emit(db, user_id, 'order', [{
+        'id': result["order_id"],
+        'order_no': order_no,
+        'customer_name': order.customer_name,
+        'total_amount': total,
+        'status': 'pending'
+    } for (order, order_no, _, result), total in zip(accepted, totals)])
+    events.emit(db, user_id, 'stock', [
+        {'product_id': pid, 'type': '销售', 'stock': product.stock} for pid, product in touched.items()
+    ])
+
+    # 检查库存预警
+    alerts.evaluate(db, user_id, list(touched.values()))
+    return results
+
+def create_order(db, user_id: int, order, order_no: str) -> int:
+    """创建单个销售订单，返回订单ID；商品不存在或库存不足时抛出 HTTPException"""
+    return create_orders(db, user_id, [order], [order_no], raise_errors=True)[0]["order_id"]
+
+# 订单列表摘要的订单头字段
+# 摘要字段由输出模型 SalesOrderSummaryOut / SalesOrderLineSummary 决定，修改模型即修改接口返回
+ORDER_SUMMARY_COLUMNS = tuple(
+    getattr(SalesOrder, name) for name in SalesOrderSummaryOut.model_fields if name not in ('item_count', 'items')
+)
+# 明细摘要字段中不在订单明细表上的列（来自商品表）
+LINE_PRODUCT_COLUMNS = {'product_name': Product.name, 'sku': Product.sku}
+
+def order_line_summaries(db, order_ids):
+    """一次查询加载订单明细摘要（字段同 SalesOrderLineSummary），返回 {订单ID: [明细]}"""
+    lines = {order_id: [] for order_id in order_ids}
+    if not order_ids:
+        return lines
+    columns = [
+        LINE_PRODUCT_COLUMNS[name].label(name) if name in LINE_PRODUCT_COLUMNS else getattr(SalesOrderItem, name)
+        for name in SalesOrderLineSummary.model_fields
+    ]
+    rows = db.query(SalesOrderItem.order_id, *columns).outerjoin(
+        Product, Product.id == SalesOrderItem.product_id
+    ).filter(
+        SalesOrderItem.order_id.in_(order_ids)
+    ).order_by(SalesOrderItem.order_id, SalesOrderItem.id)
+    for row in rows:
+        line = dict(row._mapping)
+        lines[line.pop('order_id')].append(line)
+    return lines
+
+def summarize_orders(db, rows):
+    """按 ORDER_SUMMARY_COLUMNS 查询的订单头加上明细摘要，返回 SalesOrderSummaryOut 结构的字典列表"""
+    orders = [dict(row._mapping) for row in rows]
+    lines = order_line_summaries(db, [o['id'] for o in orders])
+    for order in orders:
+        order['items'] = lines[order['id']]
+        order['item_count'] = len(order['items'])
+    return orders
@@ -0,0 +1,96 @@
+"""
+分页工具
+- 游标分页（keyset）：按 (排序字段, id) 定位下一页，不使用 OFFSET，深分页耗时与页码无关
+  游标为不透明字符串，客户端只需把上一页返回的 next_cursor 原样传回
+- 页码分页的总数缓存：第一页实时统计并缓存，后续翻页复用，避免每页都执行 COUNT(*)；
+  缓存键的第二项为用户ID，写操作提交后调用 invalidate_counts 清除该用户的缓存
+"""
+import base64
+import json
+import os
+from datetime import datetime, date
+
+from fastapi import HTTPException
+from sqlalchemy import and_, or_, asc, desc
+
+from cache import TTLCache
+
+# 页码分页总数缓存时间（秒）
+COUNT_CACHE_TTL = int(os.environ.get('ERP_COUNT_CACHE_TTL', '30'))
+
+count_cache = TTLCache(maxsize=4096, ttl=COUNT_CACHE_TTL)
+
+def encode_cursor(values) -> str:
+    """将游标值编码为不透明字符串"""
+    data = [v.isoformat() if isinstance(v, (datetime, date)) else v for v in values]
+    raw = json.dumps(data, separators=(',', ':'), ensure_ascii=False).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+def decode_cursor(cursor: str, column):
+    """解析游标，返回 (排序字段值, id)"""
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        sort_value, last_id = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+        if sort_value is not None and column.type.python_type is datetime:
+            sort_value = datetime.fromisoformat(sort_value)
+        return sort_value, int(last_id)
+    except Exception:
+        raise HTTPException(status_code=400, detail='无效的分页游标')
+
+def keyset_paginate(query, model, sort_by: str, sort_order: str, cursor: str, page_size: int, allowed_sorts):
+    """
+    游标分页查询
+    参数：allowed_sorts - 允许用于游标分页的排序字段（需非空，保证顺序稳定）
+    返回：(当前页记录, 下一页游标或None)
+    """
+    if sort_by not in allowed_sorts:
+        raise HTTPException(status_code=400, detail=f'游标分页不支持按 {sort_by} 排序，可选：{", ".join(allowed_sorts)}')
+    column = getattr(model, sort_by)
+    id_column = model.id
+    descending = sort_order != 'asc'
+
+    if cursor:
+        value, last_id = decode_cursor(cursor, column)
+        if descending:
+            after = or_(column < value, and_(column == value, id_column < last_id))
+        else:
+            after = or_(column > value, and_(column == value, id_column > last_id))
+        query = query.filter(after)
+
+    direction = desc if descending else asc
+    rows = query.order_by(direction(column), direction(id_column)).limit(page_size + 1).all()
+    next_cursor = None
+    if len(rows) > page_size:
+        rows = rows[:page_size]
+        last = rows[-1]
+        next_cursor = encode_cursor([getattr(last, sort_by), last.id])
+    return rows, next_cursor
+
+def count_rows(query) -> int:
+    """统计查询结果总数（去掉排序，不加载关联）"""
+    return query.order_by(None).count()
+
+def cached_count(key, query, refresh: bool = False) -> int:
+    """读取缓存的总数，refresh 为真或未命中时重新统计"""
+    total = None if refresh else count_cache.get(key)
+    if total is None:
+        total = count_rows(query)
+        count_cache.set(key, total)
+    return total
+
+def invalidate_counts(user_id: int = None):
+    """清除指定用户（为空时清除全部用户）的总数缓存"""
+    if user_id is None:
+        count_cache.clear()
+    else:
+        count_cache.delete_where(lambda key, value: key[1] == user_id)
+
+def cursor_page(items, next_cursor, page_size: int, total=None) -> dict:
+    """游标分页响应"""
+    return {
+        "items": items,
+        "next_cursor": next_cursor,
+        "has_more": next_cursor is not None,
+        "page_size": page_size,
+        "total": total
+    }
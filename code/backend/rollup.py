@@ -0,0 +1,209 @@
+"""
+每日销售汇总（daily_sales / daily_product_sales）
+- 创建订单、订单取消/恢复时在同一事务内增量更新汇总
+- 销售趋势、分类销售统计直接读取汇总表，不再扫描订单明细
+- 提供重建命令：python rollup.py rebuild [--user-id N]
+日期按订单 created_at 的日期部分计算，与原先 func.date(created_at) 的统计口径一致
+"""
+import argparse
+from collections import defaultdict
+from datetime import date, datetime
+
+from sqlalchemy import select, update, delete, func, distinct
+from sqlalchemy.dialects import postgresql, sqlite
+
+from db import SessionLocal, Product, SalesOrder, SalesOrderItem, DailySales, DailyProductSales
+
+def _to_day(value) -> date:
+    """统一转换为 date（SQLite 的 func.date 返回字符串）"""
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, str):
+        return date.fromisoformat(value)
+    return value
+
+def upsert(db, model, key_columns, rows, add_columns, set_columns=()):
+    """
+    批量累加写入汇总行：key 已存在时 add_columns 累加、set_columns 覆盖，不存在时插入
+    SQLite/PostgreSQL 使用 INSERT ... ON CONFLICT DO UPDATE，其他数据库逐行先更新后插入
+    只执行SQL语句，不向会话添加对象，可在 flush 事件中调用
+    """
+    if not rows:
+        return
+    dialect = db.get_bind().dialect.name
+    if dialect in ('sqlite', 'postgresql'):
+        insert = sqlite.insert if dialect == 'sqlite' else postgresql.insert
+        stmt = insert(model)
+        set_ = {c: getattr(model, c) + stmt.excluded[c] for c in add_columns}
+        set_.update({c: stmt.excluded[c] for c in set_columns})
+        db.execute(stmt.on_conflict_do_update(index_elements=list(key_columns), set_=set_), rows)
+        return
+    for row in rows:
+        values = {c: getattr(model, c) + row[c] for c in add_columns}
+        values.update({c: row[c] for c in set_columns})
+        result = db.execute(
+            update(model).where(*[getattr(model, c) == row[c] for c in key_columns]).values(**values)
+        )
+        if result.rowcount == 0:
+            db.execute(model.__table__.insert().values(**row))
+
+def apply_order(db, user_id: int, created_at: datetime, total_amount: float, lines, sign: int = 1):
+    """
+    将一个订单计入（sign=1）或移出（sign=-1）汇总
+    lines: (product_id, category_id, quantity, amount) 列表
+    """
+    apply_orders(db, user_id, created_at, [(total_amount, lines)], sign)
+
+def apply_orders(db, user_id: int, created_at: datetime, orders, sign: int = 1):
+    """
+    将同一天的多个订单合并计入或移出汇总（批量下单时每张汇总表只写一次）
+    orders: (total_amount, lines) 列表
+    """
+    day = _to_day(created_at)
+    upsert(db, DailySales, ('user_id', 'day'), [{
+        'user_id': user_id,
+        'day': day,
+        'order_count': sign * len(orders),
+        'amount': sign * sum(total_amount or 0 for total_amount, _ in orders)
+    }], ('order_count', 'amount'))
+
+    # 同一订单中同一商品的多行合并，订单数只计一次
+    per_product = defaultdict(lambda: [None, 0, 0, 0.0])
+    for _, lines in orders:
+        seen = set()
+        for product_id, category_id, quantity, amount in lines:
+            entry = per_product[product_id]
+            entry[0] = category_id
+            if product_id not in seen:
+                entry[1] += 1
+                seen.add(product_id)
+            entry[2] += quantity
+            entry[3] += amount
+    upsert(db, DailyProductSales, ('user_id', 'day', 'product_id'), [{
+        'user_id': user_id,
+        'day': day,
+        'product_id': product_id,
+        'category_id': category_id,
+        'order_count': sign * order_count,
+        'quantity': sign * quantity,
+        'amount': sign * amount
+    } for product_id, (category_id, order_count, quantity, amount) in per_product.items()],
+        ('order_count', 'quantity', 'amount'), ('category_id',))
+
+def order_lines(db, order_id: int):
+    """读取订单明细（商品ID、当前分类、数量、金额）"""
+    return db.execute(
+        select(
+            SalesOrderItem.product_id,
+            Product.category_id,
+            SalesOrderItem.quantity,
+            SalesOrderItem.total_price
+        ).outerjoin(
+            Product, Product.id == SalesOrderItem.product_id
+        ).where(SalesOrderItem.order_id == order_id)
+    ).all()
+
+def on_status_change(db, order: SalesOrder, old_status: str, new_status: str):
+    """订单状态变化时维护汇总：变为已取消则移出，从已取消恢复则重新计入"""
+    was_counted = old_status != 'cancelled'
+    is_counted = new_status != 'cancelled'
+    if was_counted == is_counted:
+        return
+    apply_order(
+        db, order.user_id, order.created_at, order.total_amount,
+        order_lines(db, order.id), 1 if is_counted else -1
+    )
+
+def move_product_category(db, product_id: int, category_id):
+    """商品分类变更时同步汇总行中的分类"""
+    db.execute(
+        update(DailyProductSales).where(DailyProductSales.product_id == product_id).values(category_id=category_id)
+    )
+
+def remove_product(db, product_id: int):
+    """删除商品时删除其商品级汇总（订单级汇总保留）"""
+    db.execute(delete(DailyProductSales).where(DailyProductSales.product_id == product_id))
+
+def rebuild(db, user_id: int = None):
+    """根据订单数据重建汇总表（user_id 为空时重建全部用户）"""
+    day = func.date(SalesOrder.created_at)
+    order_filter = [SalesOrder.status != 'cancelled']
+    if user_id is not None:
+        order_filter.append(SalesOrder.user_id == user_id)
+        db.execute(delete(DailySales).where(DailySales.user_id == user_id))
+        db.execute(delete(DailyProductSales).where(DailyProductSales.user_id == user_id))
+    else:
+        db.execute(delete(DailySales))
+        db.execute(delete(DailyProductSales))
+
+    order_rows = db.execute(
+        select(
+            SalesOrder.user_id,
+            day.label('day'),
+            func.count(SalesOrder.id).label('order_count'),
+            func.coalesce(func.sum(SalesOrder.total_amount), 0).label('amount')
+        ).where(*order_filter).group_by(SalesOrder.user_id, day)
+    ).all()
+    if order_rows:
+        db.execute(DailySales.__table__.insert(), [{
+            'user_id': r.user_id,
+            'day': _to_day(r.day),
+            'order_count': r.order_count,
+            'amount': r.amount
+        } for r in order_rows])
+
+    product_rows = db.execute(
+        select(
+            SalesOrder.user_id,
+            day.label('day'),
+            SalesOrderItem.product_id,
+            Product.category_id,
+            func.count(distinct(SalesOrder.id)).label('order_count'),
+            func.coalesce(func.sum(SalesOrderItem.quantity), 0).label('quantity'),
+            func.coalesce(func.sum(SalesOrderItem.total_price), 0).label('amount')
+        ).join(
+            SalesOrderItem, SalesOrderItem.order_id == SalesOrder.id
+        ).join(
+            Product, Product.id == SalesOrderItem.product_id
+        ).where(*order_filter).group_by(
+            SalesOrder.user_id, day, SalesOrderItem.product_id, Product.category_id
+        )
+    ).all()
+    if product_rows:
+        db.execute(DailyProductSales.__table__.insert(), [{
+            'user_id': r.user_id,
+            'day': _to_day(r.day),
+            'product_id': r.product_id,
+            'category_id': r.category_id,
+            'order_count': r.order_count,
+            'quantity': r.quantity,
+            'amount': r.amount
+        } for r in product_rows])
+    return len(order_rows), len(product_rows)
+
+def ensure_built():
+    """汇总表为空但已有订单时（如升级后首次启动）自动重建"""
+    db = SessionLocal()
+    try:
+        if db.query(DailySales.id).first() is None and db.query(SalesOrder.id).first() is not None:
+            rebuild(db)
+            db.commit()
+    finally:
+        db.close()
+
+def main():
+    parser = argparse.ArgumentParser(description='每日销售汇总维护工具')
+    parser.add_argument('command', choices=['rebuild'], help='rebuild: 根据订单数据重建汇总表')
+    parser.add_argument('--user-id', type=int, default=None, help='只重建指定用户')
+    args = parser.parse_args()
+
+    db = SessionLocal()
+    try:
+        days, product_days = rebuild(db, args.user_id)
+        db.commit()
+        print(f'重建完成：每日汇总 {days} 行，商品每日汇总 {product_days} 行')
+    finally:
+        db.close()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,195 @@
+"""
+全文搜索
+- SQLite 使用 FTS5 外部内容表（products_fts、sales_orders_fts），由触发器在商品/订单增删改时同步，
+  批量导入等绕过ORM的写入同样生效
+- 使用 trigram 分词，中文名称也能按任意子串匹配（含前缀），搜索词少于3个字符时该词回退为 LIKE
+- 按 bm25 相关度排序，名称完全匹配、前缀匹配优先
+- 其他数据库、未建索引或 SQLite 不支持 trigram 分词（低于 3.34 或未编译 FTS5）时回退为 LIKE 子串匹配
+- 索引损坏或与数据不一致时可重建：python search.py rebuild
+"""
+import argparse
+import sqlite3
+
+from sqlalchemy import and_, or_, case, func, select, literal_column, text
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.sql import table, column
+
+from db import engine, Product, SalesOrder
+
+# 分词最小长度（trigram）
+MIN_TERM_LENGTH = 3
+
+# FTS 表定义：表名 -> (内容表, 索引列)
+FTS_TABLES = {
+    'products_fts': ('products', ('name', 'description', 'sku')),
+    'sales_orders_fts': ('sales_orders', ('order_no', 'customer_name', 'customer_phone')),
+}
+
+# bm25 列权重（与索引列顺序一致）：商品名称 > SKU > 描述
+PRODUCT_WEIGHTS = (10.0, 1.0, 5.0)
+
+_fts_ready = False
+
+def trigram_supported(conn) -> bool:
+    """SQLite 是否支持 FTS5 trigram 分词（需 3.34 及以上且编译了 FTS5）"""
+    try:
+        with conn.begin_nested():
+            conn.exec_driver_sql("CREATE VIRTUAL TABLE temp.fts_probe USING fts5(x, tokenize='trigram')")
+            conn.exec_driver_sql("DROP TABLE temp.fts_probe")
+    except OperationalError:
+        return False
+    return True
+
+def create_fts(conn) -> bool:
+    """
+    创建 FTS5 表与同步触发器并重建索引（仅 SQLite，已存在则跳过）
+    不支持 trigram 分词时不建表和触发器，返回 False，搜索使用 LIKE
+    """
+    if conn.dialect.name != 'sqlite' or not trigram_supported(conn):
+        return False
+    for name, (content, columns) in FTS_TABLES.items():
+        cols = ', '.join(columns)
+        new_values = ', '.join(f'new.{c}' for c in columns)
+        old_values = ', '.join(f'old.{c}' for c in columns)
+        statements = [
+            f"CREATE VIRTUAL TABLE IF NOT EXISTS {name} USING fts5("
+            f"{cols}, content='{content}', content_rowid='id', tokenize='trigram')",
+            f"CREATE TRIGGER IF NOT EXISTS {name}_ai AFTER INSERT ON {content} BEGIN "
+            f"INSERT INTO {name}(rowid, {cols}) VALUES (new.id, {new_values}); END",
+            f"CREATE TRIGGER IF NOT EXISTS {name}_ad AFTER DELETE ON {content} BEGIN "
+            f"INSERT INTO {name}({name}, rowid, {cols}) VALUES ('delete', old.id, {old_values}); END",
+            f"CREATE TRIGGER IF NOT EXISTS {name}_au AFTER UPDATE OF {cols} ON {content} BEGIN "
+            f"INSERT INTO {name}({name}, rowid, {cols}) VALUES ('delete', old.id, {old_values}); "
+            f"INSERT INTO {name}(rowid, {cols}) VALUES (new.id, {new_values}); END",
+            f"INSERT INTO {name}({name}) VALUES ('rebuild')",
+        ]
+        for statement in statements:
+            conn.exec_driver_sql(statement)
+    return True
+
+def rebuild(conn):
+    """根据内容表重建全部 FTS 索引"""
+    for name in FTS_TABLES:
+        conn.exec_driver_sql(f"INSERT INTO {name}({name}) VALUES ('rebuild')")
+
+def fts_enabled() -> bool:
+    """当前数据库是否可用 FTS（SQLite 且已执行迁移建表）"""
+    global _fts_ready
+    if _fts_ready:
+        return True
+    if engine.dialect.name != 'sqlite':
+        return False
+    with engine.connect() as conn:
+        _fts_ready = conn.execute(
+            text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'products_fts'")
+        ).first() is not None
+    return _fts_ready
+
+def split_terms(keyword: str):
+    """按空白拆分搜索词，多个词之间为“且”关系"""
+    return [t for t in (keyword or '').split() if t]
+
+def _phrase(term: str) -> str:
+    """转义为 FTS5 短语"""
+    return '"' + term.replace('"', '""') + '"'
+
+def _fts_query(terms, columns) -> str:
+    """生成 MATCH 表达式，columns 限定匹配列"""
+    prefix = '{' + ' '.join(columns) + '} : '
+    return ' AND '.join(prefix + _phrase(t) for t in terms)
+
+def _split_by_index(terms):
+    """拆分为可走索引的词和需回退 LIKE 的短词"""
+    if not fts_enabled():
+        return [], terms
+    indexed = [t for t in terms if len(t) >= MIN_TERM_LENGTH]
+    short = [t for t in terms if len(t) < MIN_TERM_LENGTH]
+    return indexed, short
+
+def _match_ids(fts_name: str, query: str):
+    """FTS 匹配的行ID子查询"""
+    fts = table(fts_name, column('rowid'))
+    return select(fts.c.rowid).where(literal_column(fts_name).op('MATCH')(query))
+
+def _search_condition(model, fts_name, columns, keyword):
+    """在指定列中搜索关键词：长词走 FTS，短词回退 LIKE"""
+    terms = split_terms(keyword)
+    if not terms:
+        return None
+    indexed, short = _split_by_index(terms)
+    conditions = []
+    if indexed:
+        conditions.append(model.id.in_(_match_ids(fts_name, _fts_query(indexed, columns))))
+    for term in short:
+        conditions.append(or_(*[getattr(model, c).contains(term) for c in columns]))
+    return and_(*conditions)
+
+def product_search_condition(keyword: str):
+    """商品搜索条件（名称、描述、SKU）"""
+    return _search_condition(Product, 'products_fts', FTS_TABLES['products_fts'][1], keyword)
+
+def order_search_condition(keyword: str, columns):
+    """订单搜索条件，columns 为 order_no/customer_name/customer_phone 的子集"""
+    return _search_condition(SalesOrder, 'sales_orders_fts', columns, keyword)
+
+def _prefix_rank(column, keyword: str):
+    """完全匹配 0，前缀匹配 1，其他 2"""
+    return case((column == keyword, 0), (column.startswith(keyword), 1), else_=2)
+
+def _rank_by_fts(query, model, fts_name, query_text, weights=()):
+    """关联 FTS 匹配结果并按 bm25 排序（分值越小越相关）"""
+    fts = table(fts_name, column('rowid'))
+    ranked = select(
+        fts.c.rowid.label('id'),
+        func.bm25(literal_column(fts_name), *weights).label('rank')
+    ).where(literal_column(fts_name).op('MATCH')(query_text)).subquery()
+    return query.join(ranked, ranked.c.id == model.id), ranked.c.rank
+
+def order_products_by_relevance(query, keyword: str):
+    """按相关度排序商品查询（Query 需已包含搜索条件）"""
+    terms = split_terms(keyword)
+    if not terms:
+        return query
+    order = [_prefix_rank(Product.name, keyword.strip())]
+    indexed, _ = _split_by_index(terms)
+    if indexed:
+        query_text = _fts_query(indexed, FTS_TABLES['products_fts'][1])
+        query, rank = _rank_by_fts(query, Product, 'products_fts', query_text, PRODUCT_WEIGHTS)
+        order.append(rank)
+    return query.order_by(*order, Product.id.desc())
+
+def order_orders_by_relevance(query, order_no: str = None, customer: str = None):
+    """按相关度排序订单查询：订单号/客户名前缀匹配优先，再按 bm25"""
+    order = []
+    fts_parts = []
+    for keyword, columns in ((order_no, ('order_no',)), (customer, ('customer_name', 'customer_phone'))):
+        terms = split_terms(keyword)
+        if not terms:
+            continue
+        for c in columns:
+            order.append(_prefix_rank(getattr(SalesOrder, c), keyword.strip()))
+        indexed, _ = _split_by_index(terms)
+        if indexed:
+            fts_parts.append(_fts_query(indexed, columns))
+    if fts_parts:
+        query, rank = _rank_by_fts(query, SalesOrder, 'sales_orders_fts', ' AND '.join(fts_parts))
+        order.append(rank)
+    return query.order_by(*order, SalesOrder.created_at.desc(), SalesOrder.id.desc())
+
+def main():
+    parser = argparse.ArgumentParser(description='全文搜索索引维护工具')
+    parser.add_argument('command', choices=['rebuild'], help='rebuild: 根据商品/订单数据重建全文索引')
+    parser.parse_args()
+
+    if engine.dialect.name != 'sqlite':
+        print('当前数据库不使用 FTS 索引，无需重建')
+        return
+    with engine.begin() as conn:
+        if not create_fts(conn):
+            print(f'当前 SQLite（{sqlite3.sqlite_version}）不支持 FTS5 trigram 分词，搜索使用 LIKE')
+            return
+        rebuild(conn)
+    print('全文索引重建完成')
+
+if __name__ == '__main__':
+    main()
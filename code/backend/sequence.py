@@ -0,0 +1,31 @@
+"""
+编号序列
+在独立的短事务中按块分配递增编号，与业务事务互不阻塞；
+业务事务回滚时已分配的编号作废（允许出现空号，与数据库序列语义一致）
+"""
+from sqlalchemy import select, update
+from sqlalchemy.dialects import postgresql, sqlite
+
+from db import engine, NumberSequence
+
+def allocate(name: str, count: int = 1, bind=None) -> range:
+    """分配 count 个连续编号，返回编号区间"""
+    bind = bind or engine
+    with bind.begin() as conn:
+        dialect = conn.dialect.name
+        if dialect in ('sqlite', 'postgresql'):
+            insert = sqlite.insert if dialect == 'sqlite' else postgresql.insert
+            stmt = insert(NumberSequence).values(name=name, value=count)
+            stmt = stmt.on_conflict_do_update(
+                index_elements=['name'],
+                set_={'value': NumberSequence.value + stmt.excluded.value}
+            ).returning(NumberSequence.value)
+            last = conn.execute(stmt).scalar_one()
+        else:
+            result = conn.execute(
+                update(NumberSequence).where(NumberSequence.name == name).values(value=NumberSequence.value + count)
+            )
+            if result.rowcount == 0:
+                conn.execute(NumberSequence.__table__.insert().values(name=name, value=count))
+            last = conn.execute(select(NumberSequence.value).where(NumberSequence.name == name)).scalar_one()
+    return range(last - count + 1, last + 1)
@@ -0,0 +1,101 @@
+"""
+列表接口快速序列化
+- 按输出模型（models.py 中的 XxxOut）的字段预先生成转换函数，ORM对象直接转为字典，
+  不逐行执行 model_validate，嵌套模型（订单明细 -> 商品 -> 分类）同样处理
+- 只含简单字段的模型可按列查询（columns_for），结果行直接转为字典，不创建ORM对象
+- FastJSONResponse 使用 orjson（未安装时回退到标准库 json）直接输出，
+  接口返回该响应时 FastAPI 不再按 response_model 重复校验，仅用于来自数据库的可信数据
+"""
+import json
+import typing
+from datetime import date, datetime
+from decimal import Decimal
+
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+def _default(value):
+    """标准库 json 不支持的类型"""
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return float(value)
+    if isinstance(value, BaseModel):
+        return value.model_dump(mode='json')
+    raise TypeError(f'无法序列化的类型: {type(value).__name__}')
+
+def dumps(content) -> bytes:
+    """序列化为JSON字节串"""
+    if orjson is not None:
+        return orjson.dumps(content, default=_default, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(content, ensure_ascii=False, separators=(',', ':'), default=_default).encode('utf-8')
+
+class FastJSONResponse(JSONResponse):
+    """orjson 输出的JSON响应"""
+    def render(self, content) -> bytes:
+        return dumps(content)
+
+def _nested_model(annotation):
+    """字段类型中的嵌套输出模型，返回 (模型, 是否列表)"""
+    origin = typing.get_origin(annotation)
+    if origin in (list, typing.List):
+        inner, _ = _nested_model(typing.get_args(annotation)[0])
+        return inner, inner is not None
+    if origin is typing.Union:
+        for arg in typing.get_args(annotation):
+            inner, many = _nested_model(arg)
+            if inner is not None:
+                return inner, many
+        return None, False
+    if isinstance(annotation, type) and issubclass(annotation, BaseModel):
+        return annotation, False
+    return None, False
+
+_serializers = {}
+
+def serializer_for(model: typing.Type[BaseModel]):
+    """生成按模型字段把ORM对象转为字典的函数（按模型缓存）"""
+    if model in _serializers:
+        return _serializers[model]
+    simple = []
+    nested = []
+    for name, field in model.model_fields.items():
+        inner, many = _nested_model(field.annotation)
+        if inner is None:
+            simple.append(name)
+        else:
+            nested.append((name, inner, many))
+
+    def serialize(obj):
+        # 已加载的属性直接从实例字典读取，未加载的再经 getattr（可能触发延迟加载）
+        loaded = obj.__dict__
+        data = {name: loaded[name] if name in loaded else getattr(obj, name) for name in simple}
+        for name, inner, many in nested:
+            value = loaded[name] if name in loaded else getattr(obj, name)
+            convert = serializer_for(inner)
+            if many:
+                data[name] = [convert(v) for v in value or ()]
+            else:
+                data[name] = convert(value) if value is not None else None
+        return data
+
+    _serializers[model] = serialize
+    return serialize
+
+def serialize_many(model: typing.Type[BaseModel], objects) -> list:
+    """ORM对象列表转为字典列表"""
+    convert = serializer_for(model)
+    return [convert(obj) for obj in objects]
+
+def columns_for(model: typing.Type[BaseModel], table):
+    """简单输出模型对应的数据库列（按列查询时使用）"""
+    return [getattr(table, name) for name in model.model_fields]
+
+def rows_to_dicts(rows) -> list:
+    """按列查询的结果行转为字典"""
+    return [dict(row._mapping) for row in rows]
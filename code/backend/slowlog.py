@@ -0,0 +1,168 @@
+"""
+慢查询日志（可选，环境变量 ERP_SLOW_QUERY_LOG=1 时启用）
+- 通过 SQLAlchemy 引擎事件记录执行耗时超过阈值（ERP_SLOW_QUERY_MS，默认200毫秒）的语句，
+  包含参数、请求路由、方法和用户
+- 在同一连接上用原语句和参数获取执行计划：SQLite 为 EXPLAIN QUERY PLAN；
+  PostgreSQL 的查询语句为 EXPLAIN ANALYZE（会再执行一次该查询），写语句为 EXPLAIN，在保存点中执行，失败不影响业务事务
+- 每条记录一行JSON，写入按大小轮转的本地文件，可通过 GET /api/admin/slow-queries 查询
+"""
+import json
+import logging
+import os
+import time
+from datetime import datetime
+from logging.handlers import RotatingFileHandler
+
+from sqlalchemy import event
+
+from context import current_request
+
+SLOW_QUERY_LOG_ENABLED = os.environ.get('ERP_SLOW_QUERY_LOG', '0').lower() in ('1', 'true', 'yes')
+SLOW_QUERY_MS = float(os.environ.get('ERP_SLOW_QUERY_MS', '200'))
+# 是否获取执行计划
+SLOW_QUERY_EXPLAIN = os.environ.get('ERP_SLOW_QUERY_EXPLAIN', '1').lower() in ('1', 'true', 'yes')
+SLOW_QUERY_FILE = os.environ.get(
+    'ERP_SLOW_QUERY_FILE', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'logs', 'slow_queries.log')
+)
+# 单个文件大小上限与保留的历史文件数
+SLOW_QUERY_MAX_BYTES = int(os.environ.get('ERP_SLOW_QUERY_MAX_BYTES', str(10 * 1024 * 1024)))
+SLOW_QUERY_BACKUPS = int(os.environ.get('ERP_SLOW_QUERY_BACKUPS', '5'))
+# 记录的语句和参数长度上限
+MAX_STATEMENT_LENGTH = 10000
+MAX_PARAMETERS = 100
+
+# 可获取执行计划的语句
+EXPLAINABLE = ('select', 'with', 'insert', 'update', 'delete')
+
+logger = logging.getLogger('erp.slowlog')
+logger.propagate = False
+_handler = None
+
+def _get_logger():
+    """首次写入时创建轮转文件处理器"""
+    global _handler
+    if _handler is None:
+        os.makedirs(os.path.dirname(SLOW_QUERY_FILE), exist_ok=True)
+        _handler = RotatingFileHandler(SLOW_QUERY_FILE, maxBytes=SLOW_QUERY_MAX_BYTES,
+                                       backupCount=SLOW_QUERY_BACKUPS, encoding='utf-8')
+        _handler.setFormatter(logging.Formatter('%(message)s'))
+        logger.addHandler(_handler)
+        logger.setLevel(logging.INFO)
+    return logger
+
+def _sqlite_plan(rows):
+    """EXPLAIN QUERY PLAN 结果按父子关系缩进"""
+    depth = {0: -1}
+    plan = []
+    for row in rows:
+        node_id, parent, detail = row[0], row[1], row[-1]
+        depth[node_id] = depth.get(parent, -1) + 1
+        plan.append('  ' * depth[node_id] + detail)
+    return plan
+
+def explain(conn, statement: str, parameters):
+    """获取语句的执行计划，不支持或失败时返回 None"""
+    keyword = statement.lstrip().split(None, 1)[0].lower() if statement.strip() else ''
+    if keyword not in EXPLAINABLE:
+        return None
+    dialect = conn.dialect.name
+    raw = conn.connection
+    cursor = raw.cursor()
+    try:
+        if dialect == 'sqlite':
+            cursor.execute('EXPLAIN QUERY PLAN ' + statement, parameters)
+            return _sqlite_plan(cursor.fetchall())
+        prefix = 'EXPLAIN ANALYZE ' if dialect == 'postgresql' and keyword in ('select', 'with') else 'EXPLAIN '
+        if dialect != 'postgresql':
+            cursor.execute(prefix + statement, parameters)
+            return [str(row[0]) for row in cursor.fetchall()]
+        # PostgreSQL 中语句出错会中止整个事务，在保存点中执行
+        cursor.execute('SAVEPOINT erp_slowlog_explain')
+        try:
+            cursor.execute(prefix + statement, parameters)
+            plan = [str(row[0]) for row in cursor.fetchall()]
+            cursor.execute('RELEASE SAVEPOINT erp_slowlog_explain')
+            return plan
+        except Exception:
+            cursor.execute('ROLLBACK TO SAVEPOINT erp_slowlog_explain')
+            raise
+    except Exception as e:
+        return [f'执行计划获取失败: {e}']
+    finally:
+        cursor.close()
+
+def _json_parameters(parameters, executemany: bool):
+    """参数转换为可写入JSON的形式（批量执行只保留前若干组）"""
+    if executemany:
+        parameters = list(parameters[:MAX_PARAMETERS])
+    elif isinstance(parameters, (list, tuple)):
+        parameters = list(parameters[:MAX_PARAMETERS])
+    return json.loads(json.dumps(parameters, ensure_ascii=False, default=str))
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if context is not None:
+        context._erp_slowlog_start = time.perf_counter()
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    start = getattr(context, '_erp_slowlog_start', None)
+    if start is None:
+        return
+    duration_ms = (time.perf_counter() - start) * 1000
+    if duration_ms < SLOW_QUERY_MS:
+        return
+    request = current_request.get()
+    entry = {
+        'time': datetime.now().isoformat(timespec='milliseconds'),
+        'duration_ms': round(duration_ms, 2),
+        'statement': statement[:MAX_STATEMENT_LENGTH],
+        'parameters': _json_parameters(parameters, executemany),
+        'executemany': executemany,
+        'rowcount': cursor.rowcount,
+        'method': request.method if request else None,
+        'route': request.route if request else None,
+        'path': request.path if request else None,
+        'user_id': request.user_id if request else None,
+        'plan': explain(conn, statement, parameters) if SLOW_QUERY_EXPLAIN and not executemany else None,
+    }
+    _get_logger().info(json.dumps(entry, ensure_ascii=False))
+
+def install(engines):
+    """为引擎注册慢查询记录事件（异步引擎传入 async_engine.sync_engine）"""
+    for engine in engines:
+        event.listen(engine, 'before_cursor_execute', _before_cursor_execute)
+        event.listen(engine, 'after_cursor_execute', _after_cursor_execute)
+
+def log_files():
+    """当前文件和轮转出的历史文件，按从新到旧排列"""
+    files = [SLOW_QUERY_FILE] + [f'{SLOW_QUERY_FILE}.{i}' for i in range(1, SLOW_QUERY_BACKUPS + 1)]
+    return [f for f in files if os.path.exists(f)]
+
+def read_entries(route: str = None, user_id: int = None, min_ms: float = None, keyword: str = None,
+                 since: datetime = None, limit: int = 100):
+    """按条件读取慢查询记录，最新的在前"""
+    if _handler is not None:
+        _handler.flush()
+    items = []
+    for path in log_files():
+        with open(path, encoding='utf-8') as f:
+            lines = f.readlines()
+        for line in reversed(lines):
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                continue
+            if route is not None and entry.get('route') != route:
+                continue
+            if user_id is not None and entry.get('user_id') != user_id:
+                continue
+            if min_ms is not None and entry.get('duration_ms', 0) < min_ms:
+                continue
+            if keyword and keyword.lower() not in entry.get('statement', '').lower():
+                continue
+            if since is not None and entry.get('time', '') < since.isoformat():
+                # 文件按时间顺序写入，更早的记录无需再读
+                return items
+            items.append(entry)
+            if len(items) >= limit:
+                return items
+    return items
@@ -0,0 +1,83 @@
+"""
+仪表盘统计
+- 商品数量及各库存状态数量读取库存汇总表（stock_summary）；一次条件聚合查询得到订单数量及各时间段销售额
+- 时间条件使用区间比较（created_at >= 起始时间），不对列使用函数，可以利用索引
+- 结果按用户缓存，商品、库存、订单写入时失效
+"""
+import os
+from datetime import datetime, date, time, timedelta
+
+from sqlalchemy import func, case, select
+
+from cache import TTLCache
+from db import SalesOrder, StockSummary
+
+# 仪表盘结果缓存时间（秒）
+DASHBOARD_CACHE_TTL = int(os.environ.get('ERP_DASHBOARD_CACHE_TTL', '30'))
+
+dashboard_cache = TTLCache(maxsize=4096, ttl=DASHBOARD_CACHE_TTL)
+
+def invalidate_dashboard(user_id: int = None):
+    """清除指定用户（为空时清除全部用户）的仪表盘缓存"""
+    if user_id is None:
+        dashboard_cache.clear()
+    else:
+        dashboard_cache.delete_where(lambda key, value: key[0] == user_id)
+
+def cached(user_id: int, name: str, compute):
+    """按 (用户, 统计项) 读取缓存，未命中时计算并写入"""
+    key = (user_id, name)
+    value = dashboard_cache.get(key)
+    if value is None:
+        value = compute()
+        dashboard_cache.set(key, value)
+    return value
+
+async def cached_async(user_id: int, name: str, compute):
+    """cached 的异步版本，compute 为返回可等待对象的函数"""
+    key = (user_id, name)
+    value = dashboard_cache.get(key)
+    if value is None:
+        value = await compute()
+        dashboard_cache.set(key, value)
+    return value
+
+def product_stock_summary(db, user_id: int):
+    """
+    商品总数及各库存状态数量，读取库存汇总表（按分类求和，不扫描商品表）
+    充足：库存 > 最低库存*2；正常：最低库存 < 库存 <= 最低库存*2；
+    预警：0 < 库存 <= 最低库存；缺货：库存 = 0；低库存：库存 <= 最低库存
+    """
+    def total(column):
+        return func.coalesce(func.sum(column), 0)
+
+    row = db.execute(
+        select(
+            total(StockSummary.product_count).label('total'),
+            total(StockSummary.low_stock_count).label('low_stock'),
+            total(StockSummary.sufficient_count).label('sufficient'),
+            total(StockSummary.normal_count).label('normal'),
+            total(StockSummary.warning_count).label('warning'),
+            total(StockSummary.out_of_stock_count).label('out_of_stock')
+        ).where(StockSummary.user_id == user_id)
+    ).one()
+    return row
+
+def order_sales_summary(db, user_id: int):
+    """一次查询统计订单总数、总销售额、今日销售额和本月销售额"""
+    today_start = datetime.combine(date.today(), time.min)
+    tomorrow_start = today_start + timedelta(days=1)
+    month_start = today_start.replace(day=1)
+
+    def amount_if(condition):
+        return func.coalesce(func.sum(case((condition, SalesOrder.total_amount), else_=0)), 0)
+
+    row = db.execute(
+        select(
+            func.count(SalesOrder.id).label('total_orders'),
+            func.coalesce(func.sum(SalesOrder.total_amount), 0).label('total_sales'),
+            amount_if((SalesOrder.created_at >= today_start) & (SalesOrder.created_at < tomorrow_start)).label('today_sales'),
+            amount_if(SalesOrder.created_at >= month_start).label('month_sales')
+        ).where(SalesOrder.user_id == user_id)
+    ).one()
+    return row
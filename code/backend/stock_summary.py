@@ -0,0 +1,233 @@
+"""
+库存汇总（stock_summary）
+- 按 (用户, 分类) 保存商品数、总库存、库存金额（售价/成本价）和各库存状态商品数，未分类商品记在分类0下
+- 会话 flush 前根据商品的新增、删除和库存/价格/分类等字段的变化计算增量，在同一事务内累加到汇总表；
+  用 insert() 批量写入商品（导入）时调用 add_inserted
+- 汇总只通过ORM感知商品变化：对商品表执行 Core update()/delete()（包括 Query.update/delete）
+  或直接写SQL不会更新汇总，这类批量写入须在同一事务内调用 rebuild（基准测试的数据准备即如此）
+- 分类统计、总库存、库存状态和仪表盘的商品统计直接读取汇总表，不再扫描商品表
+- 提供校验与重建命令：python stock_summary.py verify|rebuild [--user-id N]
+库存状态口径与原先的条件聚合一致：充足 库存>最低库存*2；正常 最低库存<库存<=最低库存*2；
+预警 0<库存<=最低库存；缺货 库存=0；低库存 库存<=最低库存
+"""
+import argparse
+from collections import defaultdict
+
+from sqlalchemy import case, delete, event, func, inspect, select
+from sqlalchemy.orm import Session
+
+from db import SessionLocal, Product, StockSummary
+from rollup import upsert
+
+# 汇总的计数字段
+COUNTERS = (
+    'product_count', 'total_stock', 'stock_value', 'cost_value', 'sufficient_count',
+    'normal_count', 'warning_count', 'out_of_stock_count', 'low_stock_count',
+)
+# 影响汇总的商品字段
+TRACKED = ('user_id', 'category_id', 'stock', 'min_stock', 'price', 'cost_price')
+# 校验时金额允许的误差（增量累加的浮点误差）
+VALUE_TOLERANCE = 0.01
+
+def contribution(stock, min_stock, price, cost_price) -> dict:
+    """单个商品对汇总各字段的贡献（空值与SQL比较一样视为不满足条件）"""
+    known = stock is not None and min_stock is not None
+    return {
+        'product_count': 1,
+        'total_stock': stock or 0,
+        'stock_value': (stock or 0) * (price or 0),
+        'cost_value': (stock or 0) * (cost_price or 0),
+        'sufficient_count': int(known and stock > min_stock * 2),
+        'normal_count': int(known and min_stock < stock <= min_stock * 2),
+        'warning_count': int(known and 0 < stock <= min_stock),
+        'out_of_stock_count': int(stock == 0),
+        'low_stock_count': int(known and stock <= min_stock),
+    }
+
+def _add(deltas, values: dict, sign: int):
+    key = (values['user_id'], values['category_id'] or 0)
+    counters = contribution(values['stock'], values['min_stock'], values['price'], values['cost_price'])
+    for name, value in counters.items():
+        deltas[key][name] += sign * value
+
+def apply(db, deltas):
+    """将 {(用户, 分类): {字段: 增量}} 累加到汇总表"""
+    rows = [
+        {'user_id': user_id, 'category_id': category_id, **counters}
+        for (user_id, category_id), counters in deltas.items()
+        if any(counters.values())
+    ]
+    upsert(db, StockSummary, ('user_id', 'category_id'), rows, COUNTERS)
+
+def add_inserted(db, records):
+    """insert() 批量写入商品后计入汇总（records 为写入的字典列表）"""
+    deltas = defaultdict(lambda: dict.fromkeys(COUNTERS, 0))
+    for record in records:
+        _add(deltas, {name: record[name] if record.get(name) is not None else _column_default(name)
+                      for name in TRACKED}, 1)
+    apply(db, deltas)
+
+def _column_default(name: str):
+    """列的标量默认值（新商品未赋值的字段在 flush 时才取默认值）"""
+    default = Product.__table__.c[name].default
+    return default.arg if default is not None and default.is_scalar else None
+
+def _current_values(product, new: bool = False) -> dict:
+    values = {name: getattr(product, name) for name in TRACKED}
+    if new:
+        for name, value in values.items():
+            if value is None:
+                values[name] = _column_default(name)
+    return values
+
+def _previous_values(session, product) -> dict:
+    """商品修改前的字段值；修改前未加载的字段从数据库读取（flush 前数据库中仍为旧值）"""
+    state = inspect(product)
+    values = {}
+    for name in TRACKED:
+        history = state.attrs[name].history
+        if history.deleted:
+            values[name] = history.deleted[0]
+        elif history.unchanged:
+            values[name] = history.unchanged[0]
+        elif history.added:
+            row = session.execute(
+                select(*[getattr(Product, n) for n in TRACKED]).where(Product.id == product.id)
+            ).one()
+            return dict(row._mapping)
+        else:
+            values[name] = getattr(product, name)
+    return values
+
+@event.listens_for(Session, 'before_flush')
+def _track_products(session, flush_context, instances):
+    """flush 前按商品的新增、删除、修改计算汇总增量并写入"""
+    deltas = defaultdict(lambda: dict.fromkeys(COUNTERS, 0))
+    for obj in session.new:
+        if isinstance(obj, Product):
+            _add(deltas, _current_values(obj, new=True), 1)
+    for obj in session.deleted:
+        if isinstance(obj, Product):
+            _add(deltas, _previous_values(session, obj), -1)
+    for obj in session.dirty:
+        if not isinstance(obj, Product) or obj in session.deleted:
+            continue
+        state = inspect(obj)
+        if any(state.attrs[name].history.has_changes() for name in TRACKED):
+            _add(deltas, _previous_values(session, obj), -1)
+            _add(deltas, _current_values(obj), 1)
+    if deltas:
+        apply(session, deltas)
+
+def _count_if(condition):
+    return func.coalesce(func.sum(case((condition, 1), else_=0)), 0)
+
+def compute(db, user_id: int = None):
+    """从商品表实时统计汇总，返回 {(用户, 分类): {字段: 值}}"""
+    category = func.coalesce(Product.category_id, 0)
+    query = select(
+        Product.user_id,
+        category.label('category_id'),
+        func.count(Product.id).label('product_count'),
+        func.coalesce(func.sum(Product.stock), 0).label('total_stock'),
+        func.coalesce(func.sum(Product.stock * Product.price), 0).label('stock_value'),
+        func.coalesce(func.sum(Product.stock * Product.cost_price), 0).label('cost_value'),
+        _count_if(Product.stock > Product.min_stock * 2).label('sufficient_count'),
+        _count_if((Product.stock > Product.min_stock) & (Product.stock <= Product.min_stock * 2)).label('normal_count'),
+        _count_if((Product.stock > 0) & (Product.stock <= Product.min_stock)).label('warning_count'),
+        _count_if(Product.stock == 0).label('out_of_stock_count'),
+        _count_if(Product.stock <= Product.min_stock).label('low_stock_count'),
+    ).group_by(Product.user_id, category)
+    if user_id is not None:
+        query = query.where(Product.user_id == user_id)
+    return {
+        (row.user_id, row.category_id): {name: getattr(row, name) for name in COUNTERS}
+        for row in db.execute(query)
+    }
+
+def stored(db, user_id: int = None):
+    """读取汇总表，返回 {(用户, 分类): {字段: 值}}"""
+    query = select(StockSummary.user_id, StockSummary.category_id, *[getattr(StockSummary, name) for name in COUNTERS])
+    if user_id is not None:
+        query = query.where(StockSummary.user_id == user_id)
+    return {
+        (row.user_id, row.category_id): {name: getattr(row, name) or 0 for name in COUNTERS}
+        for row in db.execute(query)
+    }
+
+def totals(db, user_id: int, category_id: int = None):
+    """用户（或用户某个分类）的汇总值"""
+    query = select(*[func.coalesce(func.sum(getattr(StockSummary, name)), 0).label(name) for name in COUNTERS]).where(
+        StockSummary.user_id == user_id
+    )
+    if category_id is not None:
+        query = query.where(StockSummary.category_id == category_id)
+    return db.execute(query).one()
+
+def verify(db, user_id: int = None):
+    """比较汇总表与实时统计，返回不一致的 [(用户, 分类, 字段, 汇总值, 实际值)]"""
+    expected = compute(db, user_id)
+    actual = stored(db, user_id)
+    zero = dict.fromkeys(COUNTERS, 0)
+    mismatches = []
+    for key in sorted(set(expected) | set(actual)):
+        want, have = expected.get(key, zero), actual.get(key, zero)
+        for name in COUNTERS:
+            tolerance = VALUE_TOLERANCE if name in ('stock_value', 'cost_value') else 0
+            if abs((have[name] or 0) - (want[name] or 0)) > tolerance:
+                mismatches.append((key[0], key[1], name, have[name], want[name]))
+    return mismatches
+
+def rebuild(db, user_id: int = None):
+    """
+    根据商品表重建汇总（user_id 为空时重建全部用户），返回写入行数
+    db 可为会话或连接；绕过ORM批量修改商品后在同一事务内调用
+    """
+    if user_id is not None:
+        db.execute(delete(StockSummary).where(StockSummary.user_id == user_id))
+    else:
+        db.execute(delete(StockSummary))
+    rows = [
+        {'user_id': uid, 'category_id': category_id, **counters}
+        for (uid, category_id), counters in compute(db, user_id).items()
+    ]
+    if rows:
+        db.execute(StockSummary.__table__.insert(), rows)
+    return len(rows)
+
+def ensure_built():
+    """汇总表为空但已有商品时（如升级后首次启动）自动重建"""
+    db = SessionLocal()
+    try:
+        if db.query(StockSummary.id).first() is None and db.query(Product.id).first() is not None:
+            rebuild(db)
+            db.commit()
+    finally:
+        db.close()
+
+def main():
+    parser = argparse.ArgumentParser(description='库存汇总维护工具')
+    parser.add_argument('command', choices=['verify', 'rebuild'],
+                        help='verify: 校验汇总表与商品表是否一致；rebuild: 根据商品表重建汇总表')
+    parser.add_argument('--user-id', type=int, default=None, help='只处理指定用户')
+    args = parser.parse_args()
+
+    db = SessionLocal()
+    try:
+        if args.command == 'rebuild':
+            count = rebuild(db, args.user_id)
+            db.commit()
+            print(f'重建完成：库存汇总 {count} 行')
+            return
+        mismatches = verify(db, args.user_id)
+        for user_id, category_id, name, have, want in mismatches:
+            print(f'用户 {user_id} 分类 {category_id} {name}: 汇总 {have}，实际 {want}')
+        if mismatches:
+            print(f'发现 {len(mismatches)} 处不一致，可执行 python stock_summary.py rebuild 重建')
+            raise SystemExit(1)
+        print('库存汇总与商品表一致')
+    finally:
+        db.close()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,57 @@
+"""
+测试公共设置
+- 测试使用临时目录中的独立 SQLite 数据库，须在导入 db 之前设置 ERP_DATABASE_URL
+- 数据按用户隔离，每个测试注册新用户，测试之间互不影响
+"""
+import os
+import sys
+import tempfile
+import uuid
+
+import pytest
+
+TEST_DIR = tempfile.mkdtemp(prefix='erp_test_')
+os.environ['ERP_DATABASE_URL'] = 'sqlite:///' + os.path.join(TEST_DIR, 'test.db')
+os.environ['ERP_JOB_DIR'] = os.path.join(TEST_DIR, 'jobs')
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+@pytest.fixture(scope='session')
+def app():
+    """执行迁移和启动初始化后的应用"""
+    import main
+    main.on_startup()
+    yield main.app
+    main.on_shutdown()
+
+@pytest.fixture(scope='session')
+def client(app):
+    from fastapi.testclient import TestClient
+    return TestClient(app)
+
+@pytest.fixture
+def user(client):
+    """注册并登录一个新用户，返回 (用户ID, 请求头)"""
+    username = f'test_{uuid.uuid4().hex[:8]}'
+    user_id = client.post('/api/register', json={'username': username, 'password': 'p'}).json()['user_id']
+    token = client.post('/api/token', data={'username': username, 'password': 'p'}).json()['access_token']
+    return user_id, {'Authorization': f'Bearer {token}'}
+
+@pytest.fixture
+def db(app):
+    from db import SessionLocal
+    session = SessionLocal()
+    yield session
+    session.close()
+
+@pytest.fixture
+def create_product(client, user):
+    """通过接口创建当前用户的商品，返回商品ID"""
+    _, headers = user
+
+    def create(**fields):
+        body = {'name': f'商品{uuid.uuid4().hex[:6]}', 'price': 10, 'cost_price': 6, 'stock': 20, 'min_stock': 5}
+        body.update(fields)
+        response = client.post('/api/products', json=body, headers=headers)
+        assert response.status_code == 200, response.text
+        return response.json()['id']
+    return create
@@ -0,0 +1,29 @@
+"""库存预警状态流转：触发 -> 确认 -> 解除 -> 再次触发，期间不重复通知"""
+
+def alert_states(client, headers, state=None):
+    params = {'state': state} if state else {}
+    return [a['state'] for a in client.get('/api/alerts', params=params, headers=headers).json()]
+
+def warning_count(client, headers):
+    return sum(1 for n in client.get('/api/notifications', headers=headers).json() if n['type'] == 'warning')
+
+def test_alert_lifecycle(client, user, create_product):
+    _, headers = user
+    product_id = create_product(stock=3, min_stock=5)
+    assert alert_states(client, headers) == ['raised']
+    assert warning_count(client, headers) == 1
+
+    # 仍低于最低库存，不重复通知
+    client.post('/api/stock', json={'product_id': product_id, 'change': 1, 'type': '出库'}, headers=headers)
+    assert warning_count(client, headers) == 1
+
+    client.put('/api/notifications/read-all', headers=headers)
+    assert alert_states(client, headers) == ['acknowledged']
+
+    client.post('/api/stock', json={'product_id': product_id, 'change': 10, 'type': '入库'}, headers=headers)
+    assert alert_states(client, headers) == []
+    assert alert_states(client, headers, 'cleared') == ['cleared']
+
+    client.post('/api/stock', json={'product_id': product_id, 'change': 2, 'type': '调整'}, headers=headers)
+    assert alert_states(client, headers) == ['raised']
+    assert warning_count(client, headers) == 2
@@ -0,0 +1,53 @@
+"""压测工具：百分位数、场景统计和基线对比"""
+import asyncio
+
+from bench import concurrency
+from bench.load import compare, percentile, run_scenario
+
+def test_percentile_nearest_rank():
+    values = list(range(1, 101))
+    assert percentile(values, 50) == 50
+    assert percentile(values, 95) == 95
+    assert percentile(values, 99) == 99
+    assert percentile(values, 7) == 7
+    assert percentile([3, 1, 2], 50) == 2
+    assert percentile([7], 99) == 7
+    assert percentile([], 95) == 0.0
+    assert [concurrency.percentile(values, p) for p in (50, 95, 99)] == [50, 95, 99]
+
+class FakeResponse:
+    def __init__(self, status_code):
+        self.status_code = status_code
+        self.text = 'error' if status_code >= 400 else ''
+
+def test_run_scenario_counts_requests_and_errors():
+    calls = []
+
+    async def scenario(client, ctx):
+        calls.append(1)
+        # 每5个请求失败1个（预热请求不计入）
+        return FakeResponse(500 if len(calls) % 5 == 0 else 200)
+
+    result = asyncio.run(run_scenario(None, {}, scenario, requests=20, concurrency=4, warmup=2, server_pid=-1))
+    assert len(calls) == 22
+    assert result['requests'] == 20
+    assert result['errors'] == 4
+    assert result['first_error'].startswith('500')
+    assert result['throughput'] > 0
+    assert result['p50'] <= result['p95'] <= result['p99'] <= result['max']
+
+def _result(p95, throughput, errors=0):
+    return {'p95': p95, 'throughput': throughput, 'errors': errors}
+
+def test_compare_flags_regressions_beyond_threshold():
+    baseline = {'fast': _result(10, 100), 'slow': _result(10, 100), 'failing': _result(10, 100), 'new': None}
+    results = {
+        'fast': _result(11, 95),
+        'slow': _result(13, 70),
+        'failing': _result(10, 100, errors=2),
+        'new': _result(5, 10),
+    }
+    regressions = dict(compare(results, baseline, 0.2))
+    assert 'fast' not in regressions and 'new' not in regressions
+    assert regressions['slow'] == ['p95变慢', '吞吐下降']
+    assert regressions['failing'] == ['失败增加']
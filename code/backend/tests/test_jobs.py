@@ -0,0 +1,53 @@
+"""后台任务清理：过期导出文件删除、任务标记为 expired 且下载返回 410，过期任务记录删除"""
+import os
+import uuid
+from datetime import datetime, timedelta
+
+import jobs
+from db import Job
+
+def add_export_job(db, user_id, finished_hours_ago, created_days_ago=0):
+    """写入一个已完成的导出任务及其文件，返回 (任务ID, 文件路径)"""
+    job_id = uuid.uuid4().hex
+    os.makedirs(jobs.JOB_DIR, exist_ok=True)
+    path = os.path.join(jobs.JOB_DIR, f'{job_id}.csv')
+    with open(path, 'w') as f:
+        f.write('id\n1\n')
+    now = datetime.now()
+    db.add(Job(
+        id=job_id, user_id=user_id, job_type='export', target='products', format='csv', status='completed',
+        file_path=path, file_name='products.csv',
+        created_at=now - timedelta(days=created_days_ago, hours=finished_hours_ago),
+        finished_at=now - timedelta(hours=finished_hours_ago)
+    ))
+    db.commit()
+    return job_id, path
+
+def test_expired_export_removed_and_gone(client, user, db):
+    user_id, headers = user
+    fresh_id, fresh_path = add_export_job(db, user_id, finished_hours_ago=1)
+    old_id, old_path = add_export_job(db, user_id, finished_hours_ago=jobs.JOB_RETENTION_HOURS + 1)
+
+    jobs.cleanup_expired_jobs()
+
+    assert os.path.exists(fresh_path) and not os.path.exists(old_path)
+    assert client.get(f'/api/jobs/{fresh_id}/download', headers=headers).status_code == 200
+    response = client.get(f'/api/jobs/{old_id}/download', headers=headers)
+    assert response.status_code == 410
+    job = client.get(f'/api/jobs/{old_id}', headers=headers).json()
+    assert job['status'] == 'expired'
+
+def test_old_job_records_deleted(client, user, db):
+    user_id, headers = user
+    job_id, path = add_export_job(db, user_id, finished_hours_ago=1, created_days_ago=jobs.JOB_HISTORY_DAYS + 1)
+    running = Job(id=uuid.uuid4().hex, user_id=user_id, job_type='import', target='products', status='running',
+                  created_at=datetime.now() - timedelta(days=jobs.JOB_HISTORY_DAYS + 1))
+    db.add(running)
+    db.commit()
+
+    jobs.cleanup_expired_jobs()
+
+    assert not os.path.exists(path)
+    assert client.get(f'/api/jobs/{job_id}', headers=headers).status_code == 404
+    # 进行中的任务保留
+    assert client.get(f'/api/jobs/{running.id}', headers=headers).status_code == 200
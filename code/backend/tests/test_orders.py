@@ -0,0 +1,42 @@
+"""订单列表：view=summary 的返回结构与声明的 SalesOrderSummaryPage / SalesOrderSummaryOut 一致"""
+from models import SalesOrderLineSummary, SalesOrderPage, SalesOrderSummaryOut, SalesOrderSummaryPage
+
+def create_order(client, headers, items):
+    response = client.post('/api/sales-orders', json={
+        'customer_name': '客户',
+        'items': [{'product_id': p, 'quantity': q, 'unit_price': price} for p, q, price in items]
+    }, headers=headers)
+    assert response.status_code == 200, response.text
+    return response.json()['id']
+
+def test_summary_view_matches_declared_models(client, user, create_product):
+    _, headers = user
+    a = create_product(sku='SUM-A', stock=100)
+    b = create_product(stock=100)
+    order_id = create_order(client, headers, [(a, 2, 10), (b, 1, 5)])
+
+    for params in ({'view': 'summary'}, {'view': 'summary', 'paging': 'cursor', 'with_total': True}):
+        body = client.get('/api/sales-orders', params=params, headers=headers).json()
+        # 字段必须与模型完全一致，不多不少
+        assert all(set(item) == set(SalesOrderSummaryOut.model_fields) for item in body['items'])
+        assert all(set(line) == set(SalesOrderLineSummary.model_fields) for item in body['items'] for line in item['items'])
+        page = SalesOrderSummaryPage.model_validate(body)
+        assert page.total == 1
+        order = page.items[0]
+        assert order.id == order_id and order.item_count == 2
+        assert [(line.product_id, line.quantity) for line in order.items] == [(a, 2), (b, 1)]
+        assert order.items[0].sku == 'SUM-A'
+
+def test_full_view_matches_declared_model(client, user, create_product):
+    _, headers = user
+    product_id = create_product(stock=100)
+    create_order(client, headers, [(product_id, 3, 10)])
+    page = SalesOrderPage.model_validate(client.get('/api/sales-orders', headers=headers).json())
+    assert page.total == 1 and page.items[0].order_items[0].product_id == product_id
+
+def test_list_response_declared_in_openapi(client):
+    schema = client.get('/openapi.json').json()
+    response = schema['paths']['/api/sales-orders']['get']['responses']['200']['content']['application/json']['schema']
+    refs = {option['$ref'].rsplit('/', 1)[-1] for option in response['anyOf']}
+    assert refs == {'SalesOrderPage', 'SalesOrderSummaryPage'}
+    assert {'SalesOrderSummaryOut', 'SalesOrderLineSummary'} <= set(schema['components']['schemas'])
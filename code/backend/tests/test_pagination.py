@@ -0,0 +1,72 @@
+"""游标分页：逐页翻完的结果与一次性排序查询一致，不重复不遗漏"""
+import pytest
+from fastapi import HTTPException
+
+from db import Product
+from pagination import decode_cursor, encode_cursor, keyset_paginate
+
+def walk(client, headers, **params):
+    """按 next_cursor 翻完全部页，返回商品ID列表"""
+    ids, cursor = [], None
+    while True:
+        query = dict(params, page_size=3, fields='id,price')
+        if cursor:
+            query['cursor'] = cursor
+        page = client.get('/api/products', params=query, headers=headers).json()
+        ids.extend(item['id'] for item in page['items'])
+        cursor = page['next_cursor']
+        assert page['has_more'] == (cursor is not None)
+        if cursor is None:
+            return ids
+
+@pytest.mark.parametrize('sort_order', ['asc', 'desc'])
+def test_cursor_round_trip(client, user, create_product, sort_order):
+    _, headers = user
+    # 价格有重复，验证按 id 打破平局
+    prices = [5, 3, 5, 8, 3, 5, 1, 8, 5, 2]
+    ids = [create_product(price=price) for price in prices]
+    expected = [pid for _, pid in sorted(zip(prices, ids), reverse=sort_order == 'desc')]
+    assert walk(client, headers, sort_by='price', sort_order=sort_order) == expected
+    assert walk(client, headers, sort_by='id', sort_order=sort_order) == sorted(ids, reverse=sort_order == 'desc')
+
+def test_cursor_encoding():
+    from datetime import datetime
+    moment = datetime(2024, 5, 1, 12, 30, 15, 123456)
+    assert decode_cursor(encode_cursor([moment, 42]), Product.created_at) == (moment, 42)
+    assert decode_cursor(encode_cursor([9.5, 7]), Product.price) == (9.5, 7)
+    with pytest.raises(HTTPException) as error:
+        decode_cursor('不是游标', Product.price)
+    assert error.value.status_code == 400
+
+def test_unsupported_sort_rejected(db):
+    with pytest.raises(HTTPException) as error:
+        keyset_paginate(db.query(Product), Product, 'description', 'asc', None, 10, ('id', 'price'))
+    assert error.value.status_code == 400
+
+def test_cached_total_cleared_on_write(client, user, create_product):
+    _, headers = user
+    product_id = create_product(stock=100)
+
+    def order_total(page):
+        return client.get('/api/sales-orders', params={'page': page, 'page_size': 1}, headers=headers).json()['total']
+
+    def create_order():
+        response = client.post('/api/sales-orders', json={
+            'customer_name': '客户', 'items': [{'product_id': product_id, 'quantity': 1, 'unit_price': 10}]
+        }, headers=headers)
+        assert response.status_code == 200, response.text
+
+    create_order()
+    assert order_total(1) == 1
+    create_order()
+    # 第二页复用缓存的总数，下单后缓存已清除
+    assert order_total(2) == 2
+
+    def stock_in():
+        response = client.post('/api/stock', json={'product_id': product_id, 'change': 5, 'type': '入库'}, headers=headers)
+        assert response.status_code == 200, response.text
+
+    stock_in()
+    logs = client.get('/api/stock_logs', params={'page': 1, 'page_size': 1}, headers=headers).json()['total']
+    stock_in()
+    assert client.get('/api/stock_logs', params={'page': 2, 'page_size': 1}, headers=headers).json()['total'] == logs + 1
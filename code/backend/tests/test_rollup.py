@@ -0,0 +1,64 @@
+"""每日销售汇总：下单、取消、恢复后与订单数据重新统计的结果一致"""
+from sqlalchemy import func, select
+
+from db import DailyProductSales, DailySales, SalesOrder, SalesOrderItem
+
+def daily_totals(db, user_id):
+    """汇总表中的 (订单数, 销售额)"""
+    row = db.execute(select(
+        func.coalesce(func.sum(DailySales.order_count), 0), func.coalesce(func.sum(DailySales.amount), 0)
+    ).where(DailySales.user_id == user_id)).one()
+    return row[0], round(row[1], 2)
+
+def product_quantities(db, user_id):
+    """汇总表中各商品的销售数量"""
+    return dict(db.execute(
+        select(DailyProductSales.product_id, func.sum(DailyProductSales.quantity))
+        .where(DailyProductSales.user_id == user_id).group_by(DailyProductSales.product_id)
+    ).all())
+
+def expected_totals(db, user_id):
+    """按未取消的订单实时统计"""
+    orders = db.execute(select(func.count(SalesOrder.id), func.coalesce(func.sum(SalesOrder.total_amount), 0)).where(
+        SalesOrder.user_id == user_id, SalesOrder.status != 'cancelled'
+    )).one()
+    quantities = dict(db.execute(
+        select(SalesOrderItem.product_id, func.sum(SalesOrderItem.quantity))
+        .join(SalesOrder, SalesOrder.id == SalesOrderItem.order_id)
+        .where(SalesOrder.user_id == user_id, SalesOrder.status != 'cancelled')
+        .group_by(SalesOrderItem.product_id)
+    ).all())
+    return (orders[0], round(orders[1], 2)), quantities
+
+def assert_consistent(db, user_id):
+    db.expire_all()
+    totals, quantities = expected_totals(db, user_id)
+    assert daily_totals(db, user_id) == totals
+    assert {pid: q for pid, q in product_quantities(db, user_id).items() if q} == quantities
+
+def test_rollup_follows_cancel_and_restore(client, user, db, create_product):
+    user_id, headers = user
+    a = create_product(stock=100)
+    b = create_product(stock=100)
+    order_ids = []
+    for items in ([(a, 2, 10)], [(a, 1, 10), (b, 3, 5)], [(b, 4, 5), (b, 1, 5)]):
+        response = client.post('/api/sales-orders', json={
+            'customer_name': '客户',
+            'items': [{'product_id': p, 'quantity': q, 'unit_price': price} for p, q, price in items]
+        }, headers=headers)
+        assert response.status_code == 200, response.text
+        order_ids.append(response.json()['id'])
+    assert_consistent(db, user_id)
+    assert daily_totals(db, user_id) == (3, 20 + 25 + 25)
+
+    client.put(f'/api/sales-orders/{order_ids[1]}', json={'status': 'cancelled'}, headers=headers)
+    assert_consistent(db, user_id)
+    assert daily_totals(db, user_id) == (2, 45)
+
+    # 重复取消不会再次扣减
+    client.put(f'/api/sales-orders/{order_ids[1]}', json={'status': 'cancelled'}, headers=headers)
+    assert_consistent(db, user_id)
+
+    client.put(f'/api/sales-orders/{order_ids[1]}', json={'status': 'completed'}, headers=headers)
+    assert_consistent(db, user_id)
+    assert daily_totals(db, user_id) == (3, 70)
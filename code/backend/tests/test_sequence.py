@@ -0,0 +1,43 @@
+"""编号序列：分配的编号连续、不重复，并发分配也不重复"""
+import threading
+import uuid
+
+import sequence
+
+def test_allocate_contiguous_ranges(app):
+    name = f'test_{uuid.uuid4().hex}'
+    assert list(sequence.allocate(name)) == [1]
+    assert list(sequence.allocate(name, 3)) == [2, 3, 4]
+    assert list(sequence.allocate(name, 2)) == [5, 6]
+    # 不同序列互不影响
+    assert list(sequence.allocate(name + '_other', 2)) == [1, 2]
+
+def test_concurrent_allocation_unique(app):
+    name = f'test_{uuid.uuid4().hex}'
+    allocated = []
+    lock = threading.Lock()
+
+    def worker():
+        for _ in range(20):
+            numbers = sequence.allocate(name, 2)
+            with lock:
+                allocated.extend(numbers)
+
+    threads = [threading.Thread(target=worker) for _ in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert sorted(allocated) == list(range(1, 4 * 20 * 2 + 1))
+
+def test_order_numbers_unique(client, user, create_product):
+    _, headers = user
+    product_id = create_product(stock=100)
+    response = client.post('/api/sales-orders/bulk', json={'orders': [
+        {'customer_name': f'客户{i}', 'items': [{'product_id': product_id, 'quantity': 1, 'unit_price': 1}]}
+        for i in range(5)
+    ]}, headers=headers)
+    assert response.status_code == 200, response.text
+    orders = client.get('/api/sales-orders', params={'page_size': 50}, headers=headers).json()['items']
+    order_nos = [o['order_no'] for o in orders]
+    assert len(order_nos) == 5 and len(set(order_nos)) == 5
@@ -0,0 +1,59 @@
+"""库存汇总：各写入途径增量维护后与商品表实时统计一致"""
+import io
+
+from openpyxl import Workbook
+from sqlalchemy import update
+
+import stock_summary
+from db import Product
+
+def test_incremental_maintenance_matches_products(client, user, db, create_product):
+    user_id, headers = user
+    category_id = client.post('/api/categories', json={'name': '测试分类'}, headers=headers).json()['id']
+    ids = [create_product(stock=stock, min_stock=10, category_id=category_id if i % 2 else None)
+           for i, stock in enumerate([0, 5, 15, 30])]
+    assert stock_summary.verify(db, user_id) == []
+
+    # 修改价格、库存和分类
+    client.put(f'/api/products/{ids[0]}', json={
+        'name': '改名', 'price': 3, 'cost_price': 1, 'stock': 50, 'min_stock': 5, 'category_id': category_id
+    }, headers=headers)
+    client.delete(f'/api/products/{ids[3]}', headers=headers)
+    client.post('/api/stock', json={'product_id': ids[1], 'change': 5, 'type': '出库'}, headers=headers)
+    client.post('/api/stock/batch', json={'items': [
+        {'product_id': ids[2], 'change': 3, 'type': '入库'},
+        {'product_id': ids[0], 'change': 7, 'type': '调整'},
+    ]}, headers=headers)
+    client.post('/api/sales-orders', json={
+        'customer_name': '客户', 'items': [{'product_id': ids[2], 'quantity': 4, 'unit_price': 10}]
+    }, headers=headers)
+    db.expire_all()
+    assert stock_summary.verify(db, user_id) == []
+
+    totals = stock_summary.totals(db, user_id, category_id)
+    assert totals.product_count == 2
+    assert totals.total_stock == 7
+    assert stock_summary.totals(db, user_id).total_stock == 7 + 14
+
+def test_bulk_import_counted(client, user, db):
+    user_id, headers = user
+    wb = Workbook()
+    ws = wb.active
+    ws.append(['商品名称*', '销售价格*', '当前库存*', '分类名称'])
+    for i in range(30):
+        ws.append([f'导入{i}', 2.5, i, '导入分类' if i % 2 else None])
+    buf = io.BytesIO()
+    wb.save(buf)
+    response = client.post('/api/import/products', files={'file': ('p.xlsx', buf.getvalue())}, headers=headers)
+    assert response.json()['success_count'] == 30
+    assert stock_summary.verify(db, user_id) == []
+    assert client.get('/api/total_stock', headers=headers).json()['total'] == sum(range(30))
+
+def test_core_update_requires_rebuild(user, db, create_product):
+    user_id, _ = user
+    create_product(stock=1)
+    db.execute(update(Product).where(Product.user_id == user_id).values(stock=100))
+    assert stock_summary.verify(db, user_id) != []
+    stock_summary.rebuild(db, user_id)
+    assert stock_summary.verify(db, user_id) == []
+    db.rollback()
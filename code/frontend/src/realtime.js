@@ -0,0 +1,76 @@
+import { ref } from 'vue'
+import axios from 'axios'
+
+// 实时推送连接（SSE），推送新通知、库存变化、订单变化，替代定时轮询
+// 事件：notification / stock / order / resync(需重新拉取数据)
+const EVENT_TYPES = ['notification', 'stock', 'order', 'resync']
+
+// 是否已连接，未连接时各页面回退为定时轮询
+export const connected = ref(false)
+
+const handlers = {}
+let source = null
+
+function dispatch(type, data) {
+  (handlers[type] || []).forEach(handler => handler(data))
+}
+
+// 订阅事件，返回取消订阅函数
+export function on(type, handler) {
+  if (!handlers[type]) handlers[type] = []
+  handlers[type].push(handler)
+  return () => {
+    handlers[type] = handlers[type].filter(h => h !== handler)
+  }
+}
+
+// 连接凭证过期后 EventSource 重连会被拒绝，间隔后重新获取凭证连接
+const RECONNECT_DELAY = 5000
+
+let reconnectTimer = null
+
+// 建立连接（登录后调用），浏览器不支持 EventSource 时保持轮询
+// 登录token不放在URL中（会被访问日志和代理记录），先获取只能用于推送连接的短期凭证
+export async function connect() {
+  if (!localStorage.getItem('token') || !window.EventSource) return
+  disconnect()
+  let ticket
+  try {
+    const res = await axios.post('/api/events/token')
+    ticket = res.data.token
+  } catch (error) {
+    console.error('获取推送连接凭证失败:', error)
+    return
+  }
+  // 等待凭证期间已退出登录或重新连接
+  if (source || !localStorage.getItem('token')) return
+  const url = `${axios.defaults.baseURL || ''}/api/events/stream?token=${encodeURIComponent(ticket)}`
+  const es = new EventSource(url)
+  source = es
+  es.onopen = () => {
+    connected.value = true
+  }
+  // 连接断开时 EventSource 会自动重连，期间回退为轮询；凭证过期导致重连失败时重新获取凭证
+  es.onerror = () => {
+    connected.value = false
+    if (source === es && es.readyState === EventSource.CLOSED) {
+      source = null
+      reconnectTimer = setTimeout(connect, RECONNECT_DELAY)
+    }
+  }
+  EVENT_TYPES.forEach(type => {
+    es.addEventListener(type, event => dispatch(type, JSON.parse(event.data)))
+  })
+  // 登录token过期，服务端关闭连接
+  es.addEventListener('expired', () => disconnect())
+}
+
+export function disconnect() {
+  clearTimeout(reconnectTimer)
+  reconnectTimer = null
+  if (source) {
+    source.close()
+    source = null
+  }
+  connected.value = false
+}